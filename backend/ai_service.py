@@ -1,13 +1,77 @@
 import os
 import re
 import json
+import asyncio
+import inspect
 from dotenv import load_dotenv
-from groq import Groq
-import base64
+from llm_cache import create_cache, make_cache_key
+from image_ingest import prepare_image_for_vision, decode_image
+from image_cache import PerceptualImageCache, dhash, IMAGE_CACHE_SIZE
+from rule_classifier import classify_department_rules, assign_priority_rules, RULE_CONFIDENCE_THRESHOLD
+from llm_scheduler import LLMScheduler, estimate_tokens, time_left
+from llm_backends import create_backend
+from model_cascade import ModelCascade, MODEL_TIERS
+from metrics import stage_seconds, llm_call_seconds, fallbacks, cache_requests, errors, timed
+from prompt_builder import (
+    PromptTemplate,
+    truncate_to_budget,
+    report_digest,
+    CITIZEN_TEXT_TOKENS,
+    RESOLUTION_TEXT_TOKENS
+)
 load_dotenv()
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Live Groq, recorded fixtures or an offline fake (LLM_BACKEND env var)
+llm_backend = create_backend()
+
+# Rate limits, concurrency cap, retries and priority lanes for all calls
+scheduler = LLMScheduler()
+
+# Response cache for text calls (see llm_cache.py, LLM_CACHE env var)
+llm_cache = create_cache()
+
+# First tier answers; see model_cascade.py (MODEL_TIERS env var)
+TEXT_MODEL = MODEL_TIERS[0] if MODEL_TIERS else "llama-3.1-8b-instant"
+
+# Small model first, larger ones only for invalid / doubtful answers
+cascade = ModelCascade(MODEL_TIERS or [TEXT_MODEL])
+
+# Rule confidence at which a disagreeing model answer counts as doubtful
+CASCADE_RULE_DISAGREEMENT = float(os.getenv("CASCADE_RULE_DISAGREEMENT", "0.5"))
+
+# Near-duplicate photo index for vision results (IMAGE_CACHE_SIZE=0 disables)
+image_cache = PerceptualImageCache() if IMAGE_CACHE_SIZE > 0 else None
+
+VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+TEXT_TEMPERATURE = 0.2
+SYSTEM_PROMPT = (
+    "You are an AI system for Indian public grievance redressal. "
+    "Your job is to convert informal citizen complaints into "
+    "structured, professional grievance reports suitable for government systems. "
+    "Respond directly without markdown formatting or code blocks."
+)
+
+# Stream single-label answers and stop reading at the first valid label
+STREAM_LABELS = os.getenv("LLM_STREAM_LABELS", "true").lower() == "true"
+
+# "sequential" = structure / classify / priority as three calls,
+# "fused" = one JSON call producing all three
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "sequential")
+
+DEPARTMENTS = [
+    "Health",
+    "Infrastructure",
+    "Electricity",
+    "Water Supply",
+    "Sanitation",
+    "Transport",
+    "Police",
+    "Municipal Services",
+    "Education",
+    "Other",
+]
+
+PRIORITY_LEVELS = ["high", "medium", "low"]
 
 # -----------------------------
 # Utility: Clean Markdown
@@ -49,65 +113,225 @@ def clean_json_response(text):
 # -----------------------------
 # Core LLM Call
 # -----------------------------
-def generate_content(prompt, response_format="text"):
+def _text_request(prompt, json_mode, model, max_tokens):
+    """Model, extra request parameters and messages for a text call"""
+    model = model or TEXT_MODEL
+    extra = {}
+    if json_mode:
+        extra["response_format"] = {"type": "json_object"}
+    if max_tokens:
+        extra["max_tokens"] = max_tokens
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    return model, extra, messages
+
+
+def _cache_lookup(use_cache, model, prompt, extra):
+    """(cache key, cached result) - both None when the cache is not used"""
+    if not (use_cache and llm_cache):
+        return None, None
+    cache_key = make_cache_key(model, SYSTEM_PROMPT, prompt, TEXT_TEMPERATURE, **extra)
+    result = llm_cache.get(cache_key)
+    cache_requests.inc(cache="llm", result="miss" if result is None else "hit")
+    return cache_key, result
+
+
+def _clean_result(result, response_format):
+    if response_format == "json":
+        return clean_json_response(result)
+    return clean_markdown(result)
+
+
+def generate_content(prompt, response_format="text", json_mode=False, use_cache=True, model=None, max_tokens=None,
+                     stream=False, labels=None, on_delta=None):
     """
     Centralized LLM call using Groq + LLaMA 3
     
     Args:
         prompt: The prompt to send
         response_format: "text" or "json"
+        json_mode: Ask Groq to constrain the output to a JSON object
+        use_cache: Look up / store the response in the LLM cache
+        model: Override TEXT_MODEL (used by the model cascade)
+        max_tokens: Completion cap, see TASK_MAX_TOKENS in prompt_builder.py
+        stream: Consume the completion incrementally
+        labels: With stream, stop reading as soon as the text is one of these
+        on_delta: With stream, called with each piece of text as it arrives
     """
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an AI system for Indian public grievance redressal. "
-                    "Your job is to convert informal citizen complaints into "
-                    "structured, professional grievance reports suitable for government systems. "
-                    "Respond directly without markdown formatting or code blocks."
-                )
-            },
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.2
-    )
-    
-    result = response.choices[0].message.content.strip()
-    
+    model, extra, messages = _text_request(prompt, json_mode, model, max_tokens)
+    cache_key, result = _cache_lookup(use_cache, model, prompt, extra)
+
+    if result is None:
+        with llm_call_seconds.time(model=model):
+            response = scheduler.call(
+                lambda: llm_backend.complete(
+                    model=model,
+                    messages=messages,
+                    temperature=TEXT_TEMPERATURE,
+                    stream=stream,
+                    **extra
+                ),
+                model=model,
+                tokens=estimate_tokens(messages, max_tokens)
+            )
+
+            if stream:
+                result = consume_stream(response, labels, on_delta)
+            else:
+                result = response.choices[0].message.content.strip()
+        if cache_key:
+            llm_cache.set(cache_key, result)
+    elif on_delta:
+        on_delta(result)
+
     # Clean based on expected format
-    if response_format == "json":
-        result = clean_json_response(result)
-    else:
-        result = clean_markdown(result)
-    
-    return result
+    return _clean_result(result, response_format)
+
+
+async def agenerate_content(prompt, response_format="text", json_mode=False, use_cache=True, model=None,
+                            max_tokens=None, stream=False, labels=None, on_delta=None):
+    """generate_content() for the async serving path; waits without holding a thread"""
+    model, extra, messages = _text_request(prompt, json_mode, model, max_tokens)
+    cache_key, result = _cache_lookup(use_cache, model, prompt, extra)
+
+    if result is None:
+        with llm_call_seconds.time(model=model):
+            response = await scheduler.acall(
+                lambda: llm_backend.acomplete(
+                    model=model,
+                    messages=messages,
+                    temperature=TEXT_TEMPERATURE,
+                    stream=stream,
+                    **extra
+                ),
+                model=model,
+                tokens=estimate_tokens(messages, max_tokens)
+            )
+
+            if stream:
+                result = await aconsume_stream(response, labels, on_delta)
+            else:
+                result = response.choices[0].message.content.strip()
+        if cache_key:
+            llm_cache.set(cache_key, result)
+    elif on_delta:
+        on_delta(result)
+
+    return _clean_result(result, response_format)
+
+
+def match_label(text, labels):
+    """
+    The label text spells out, once no longer label could still follow
+    (so "Water" waits for "Water Supply"). None otherwise.
+    """
+    text = text.strip().strip('"\'*.').strip().lower()
+    if not text:
+        return None
+    candidates = [label for label in labels if label.lower().startswith(text)]
+    if len(candidates) == 1 and candidates[0].lower() == text:
+        return candidates[0]
+    return None
+
+
+def _take_chunk(parts, chunk, labels, on_delta):
+    """Adds a stream chunk's text to parts; True once a complete label has arrived"""
+    if not chunk.choices:
+        return False
+    delta = chunk.choices[0].delta.content or ""
+    if not delta:
+        return False
+    parts.append(delta)
+    if on_delta:
+        on_delta(delta)
+    return bool(labels and match_label("".join(parts), labels))
+
+
+def consume_stream(response, labels=None, on_delta=None):
+    """
+    Reads a streamed completion. With labels, stops and closes the
+    connection as soon as a complete label has arrived instead of
+    waiting for the model to finish.
+    """
+    parts = []
+    try:
+        for chunk in response:
+            if _take_chunk(parts, chunk, labels, on_delta):
+                break
+            left = time_left()
+            if left is not None and left <= 0:
+                # The stage has given up on this answer; stop reading it
+                raise TimeoutError("Stream outlived its deadline")
+    finally:
+        close = getattr(response, "close", None)
+        if close:
+            close()
+    return "".join(parts).strip()
+
+
+async def aconsume_stream(response, labels=None, on_delta=None):
+    """consume_stream() for async streams"""
+    parts = []
+    try:
+        async for chunk in response:
+            if _take_chunk(parts, chunk, labels, on_delta):
+                break
+    finally:
+        close = getattr(response, "close", None)
+        if close:
+            closing = close()
+            if inspect.isawaitable(closing):
+                await closing
+    return "".join(parts).strip()
+
+
+def get_cache_stats():
+    """Hit/miss counters for the LLM response cache"""
+    if not llm_cache:
+        return {"enabled": False}
+    return llm_cache.stats()
+
+
+def get_scheduler_stats():
+    """Throughput, retries and queueing of provider calls"""
+    return scheduler.stats()
+
+
+def get_backend_stats():
+    """Which LLM backend is serving calls, with its counters"""
+    return llm_backend.stats()
+
+
+def get_cascade_stats():
+    """Per-task escalation rate and per-tier latency of the model cascade"""
+    return cascade.stats()
+
+
+def get_image_cache_stats():
+    """Hit rate of the perceptual-hash image analysis cache"""
+    if not image_cache:
+        return {"enabled": False}
+    return image_cache.stats()
 
 
 # -----------------------------
 # 1️⃣ Structure Grievance
 # -----------------------------
-def structure_grievance(informal_text, location_data=None):
-    location_block = ""
-    if location_data:
-        location_block = f"""
-City: {location_data.get('city', 'Not specified')}
+def location_block(location_data):
+    if not location_data:
+        return "Not provided"
+    return f"""City: {location_data.get('city', 'Not specified')}
 Area: {location_data.get('area', 'Not specified')}
 Pincode: {location_data.get('pincode', 'Not specified')}
-Specific Location: {location_data.get('specificLocation', 'Not specified')}
-"""
+Specific Location: {location_data.get('specificLocation', 'Not specified')}"""
 
-    prompt = f"""
-Convert the following informal grievance into a structured professional grievance report.
 
-Grievance Text:
-"{informal_text}"
-
-Location Details (if provided):
-{location_block}
-
-Format the response with these sections:
+# Static instructions first, grievance last
+STRUCTURE_PROMPT = PromptTemplate("structure", """
+Convert the informal grievance below into a structured professional grievance report.
+Respond with plain text only, no markdown, code blocks or asterisks, using these sections:
 
 Issue Summary:
 [One-line summary]
@@ -133,61 +357,180 @@ Urgency Indicators:
 Expected Resolution:
 [What action is needed]
 
-IMPORTANT: Respond with plain text only. Do not use markdown formatting, code blocks, or asterisks for bold/italic.
-"""
+Location Details (if provided):
+{location}
+
+Grievance Text:
+"{grievance}"
+""")
+
+
+@timed(stage_seconds, stage="structure")
+def structure_grievance(informal_text, location_data=None, on_delta=None):
+    """
+    on_delta, if given, receives the report text as it is generated, and
+    None whenever an escalation restarts it on a larger model.
+    """
+    prompt = _structure_prompt(informal_text, location_data)
+
+    def generate(model):
+        if on_delta:
+            on_delta(None)
+        return generate_content(prompt, response_format="text", model=model,
+                                max_tokens=STRUCTURE_PROMPT.max_tokens,
+                                stream=on_delta is not None, on_delta=on_delta)
+
+    report = cascade.run("structure", generate, validate_structured_report)
+    return _structure_result(report, informal_text)
 
-    return generate_content(prompt, response_format="text")
+
+@timed(stage_seconds, stage="structure")
+async def astructure_grievance(informal_text, location_data=None, on_delta=None):
+    prompt = _structure_prompt(informal_text, location_data)
+
+    async def generate(model):
+        if on_delta:
+            on_delta(None)
+        return await agenerate_content(prompt, response_format="text", model=model,
+                                       max_tokens=STRUCTURE_PROMPT.max_tokens,
+                                       stream=on_delta is not None, on_delta=on_delta)
+
+    report = await cascade.arun("structure", generate, validate_structured_report)
+    return _structure_result(report, informal_text)
+
+
+def _structure_prompt(informal_text, location_data):
+    return STRUCTURE_PROMPT.render(
+        location=location_block(location_data),
+        grievance=truncate_to_budget(informal_text, CITIZEN_TEXT_TOKENS)
+    )
+
+
+def _structure_result(report, informal_text):
+    if not report:
+        fallbacks.inc(kind="structure_raw_text")
+    return report or informal_text
+
+
+# Sections a usable report must contain
+REQUIRED_SECTIONS = ("Issue Summary:", "Expected Resolution:")
+
+
+def validate_structured_report(result):
+    """A report missing its core sections escalates; a shaky one is still usable"""
+    if not result or not result.strip():
+        return None, False
+    return result, all(section in result for section in REQUIRED_SECTIONS)
 
 
 # -----------------------------
 # 2️⃣ Classify Department
 # -----------------------------
-def classify_department(informal_text, structured_text=None):
-    context = structured_text if structured_text else informal_text
-    
-    prompt = f"""
-Based on the grievance below, classify the responsible government department.
-
-Available Departments:
-- Health
-- Infrastructure
-- Electricity
-- Water Supply
-- Sanitation
-- Transport
-- Police
-- Municipal Services
-- Education
-- Other
+def department_from_rules(informal_text, rule_match=None):
+    """
+    Department from the keyword lexicon if it is confident enough, else
+    None. rule_match reuses an earlier classify_department_rules() result.
+    """
+    department, confidence, terms = rule_match or classify_department_rules(informal_text)
+    if department and confidence >= RULE_CONFIDENCE_THRESHOLD:
+        print(f"📏 Rule department: {department} ({confidence}, {terms})")
+        return department
+    return None
 
-Grievance:
-{context}
 
+DEPARTMENT_PROMPT = PromptTemplate("department", """
+Classify the government department responsible for the grievance below.
+Available Departments: """ + ", ".join(DEPARTMENTS) + """
 Respond with ONLY the department name, nothing else. No explanation, no formatting.
-"""
 
-    result = generate_content(prompt, response_format="text")
-    
-    # Extra cleaning: remove any quotes or extra text
-    result = result.strip('"\'').strip()
-    
-    return result
+Grievance:
+{grievance}
+""")
+
+
+@timed(stage_seconds, stage="classify")
+def classify_department(informal_text, structured_text=None, use_rules=True, rule_match=None):
+    rule_match = rule_match or classify_department_rules(informal_text)
+    if use_rules:
+        department = department_from_rules(informal_text, rule_match)
+        if department:
+            return department
+
+    prompt, validate = _department_task(informal_text, structured_text, rule_match)
+    department = cascade.run(
+        "department",
+        lambda model: generate_content(prompt, response_format="text", model=model,
+                                       max_tokens=DEPARTMENT_PROMPT.max_tokens,
+                                       stream=STREAM_LABELS, labels=DEPARTMENTS),
+        validate
+    )
+    return _department_result(department)
+
+
+@timed(stage_seconds, stage="classify")
+async def aclassify_department(informal_text, structured_text=None, use_rules=True, rule_match=None):
+    rule_match = rule_match or classify_department_rules(informal_text)
+    if use_rules:
+        department = department_from_rules(informal_text, rule_match)
+        if department:
+            return department
+
+    prompt, validate = _department_task(informal_text, structured_text, rule_match)
+    department = await cascade.arun(
+        "department",
+        lambda model: agenerate_content(prompt, response_format="text", model=model,
+                                        max_tokens=DEPARTMENT_PROMPT.max_tokens,
+                                        stream=STREAM_LABELS, labels=DEPARTMENTS),
+        validate
+    )
+    return _department_result(department)
+
+
+def _department_task(informal_text, structured_text, rule_match):
+    """Prompt and answer validator for the department call"""
+    # The report's summary / description is enough to pick a department
+    if structured_text:
+        context = report_digest(structured_text)
+    else:
+        context = truncate_to_budget(informal_text, CITIZEN_TEXT_TOKENS)
+    prompt = DEPARTMENT_PROMPT.render(grievance=context)
+
+    rule_department, rule_confidence, _ = rule_match
+
+    def validate(result):
+        # Extra cleaning: remove any quotes or extra text
+        result = result.strip('"\'').strip()
+        department = normalize_department(result)
+        if department is None:
+            return None, False
+        exact = result.strip(".").lower() == department.lower()
+        disagrees = (rule_department and rule_confidence >= CASCADE_RULE_DISAGREEMENT
+                     and rule_department != department)
+        # Small models fall back to "Other" when unsure
+        return department, exact and department != "Other" and not disagrees
+
+    return prompt, validate
+
+
+def _department_result(department):
+    if not department:
+        fallbacks.inc(kind="department_other")
+    return department or "Other"
 
 
 # -----------------------------
 # 3️⃣ Assign Priority
 # -----------------------------
-def assign_priority(informal_text, location_data=None):
-    location_hint = ""
-    if location_data and location_data.get('specificLocation'):
-        location_hint = f"""
-Location Context:
-City: {location_data.get('city')}
-Area: {location_data.get('area')}
-Specific Location: {location_data.get('specificLocation')}
-"""
+def priority_from_rules(informal_text):
+    """Priority from the keyword lexicon if it is confident enough, else None"""
+    priority, confidence, terms = assign_priority_rules(informal_text)
+    if priority and confidence >= RULE_CONFIDENCE_THRESHOLD:
+        print(f"📏 Rule priority: {priority} ({confidence}, {terms})")
+        return priority
+    return None
 
-    prompt = f"""
+
+PRIORITY_PROMPT = PromptTemplate("priority", """
 Determine the priority level of the grievance below.
 
 Priority Levels:
@@ -195,52 +538,111 @@ Priority Levels:
 - medium: Service delays, moderate impact, no immediate danger
 - low: Minor inconvenience, cosmetic issues, affects few people
 
+Respond with ONLY one word: high, medium, or low. No explanation, no formatting.
+
 Grievance:
-"{informal_text}"
+"{grievance}"
+
+{location}
+""")
+
+
+@timed(stage_seconds, stage="priority")
+def assign_priority(informal_text, location_data=None, use_rules=True):
+    if use_rules:
+        priority = priority_from_rules(informal_text)
+        if priority:
+            return priority
+
+    prompt, validate = _priority_task(informal_text, location_data)
+    result = cascade.run(
+        "priority",
+        lambda model: generate_content(prompt, response_format="text", model=model,
+                                       max_tokens=PRIORITY_PROMPT.max_tokens,
+                                       stream=STREAM_LABELS, labels=PRIORITY_LEVELS),
+        validate
+    )
 
-{location_hint}
+    # Fallback if no tier returns something usable
+    return result or fallback_priority(informal_text)
 
-Respond with ONLY one word: high, medium, or low
-No explanation, no formatting.
-"""
 
-    result = generate_content(prompt, response_format="text")
-    
-    # Ensure lowercase and clean
-    result = result.lower().strip('"\'').strip()
-    
-    # Validate
-    if result not in ['high', 'medium', 'low']:
-        # Fallback if AI returns something unexpected
-        if any(word in informal_text.lower() for word in ['urgent', 'danger', 'emergency', 'critical']):
-            result = 'high'
-        else:
-            result = 'medium'
-    
-    return result
+@timed(stage_seconds, stage="priority")
+async def aassign_priority(informal_text, location_data=None, use_rules=True):
+    if use_rules:
+        priority = priority_from_rules(informal_text)
+        if priority:
+            return priority
 
+    prompt, validate = _priority_task(informal_text, location_data)
+    result = await cascade.arun(
+        "priority",
+        lambda model: agenerate_content(prompt, response_format="text", model=model,
+                                        max_tokens=PRIORITY_PROMPT.max_tokens,
+                                        stream=STREAM_LABELS, labels=PRIORITY_LEVELS),
+        validate
+    )
+    return result or fallback_priority(informal_text)
 
-# -----------------------------
-# 4️⃣ Verify Closure
-# -----------------------------
-def verify_closure(grievance_text, resolution_text, location_data=None):
-    location_check = ""
+
+def _priority_task(informal_text, location_data):
+    """Prompt and answer validator for the priority call"""
+    location_hint = ""
     if location_data and location_data.get('specificLocation'):
-        location_check = f"""
-Expected Location Reference:
-The resolution should confirm action at: {location_data.get('specificLocation')}, {location_data.get('area')}, {location_data.get('city')}
-"""
+        location_hint = f"""Location Context:
+City: {location_data.get('city')}
+Area: {location_data.get('area')}
+Specific Location: {location_data.get('specificLocation')}"""
 
-    prompt = f"""
-Verify whether the grievance has been satisfactorily resolved.
+    prompt = PRIORITY_PROMPT.render(
+        grievance=truncate_to_budget(informal_text, CITIZEN_TEXT_TOKENS),
+        location=location_hint
+    )
 
-Original Grievance:
-{grievance_text}
+    rule_priority, rule_confidence, _ = assign_priority_rules(informal_text)
 
-{location_check}
+    def validate(result):
+        # Ensure lowercase and clean
+        result = result.lower().strip('"\'. ').strip()
+        if result not in PRIORITY_LEVELS:
+            return None, False
+        disagrees = (rule_priority and rule_confidence >= CASCADE_RULE_DISAGREEMENT
+                     and rule_priority != result)
+        return result, not disagrees
 
-Resolution Provided:
-{resolution_text}
+    return prompt, validate
+
+
+def fallback_priority(informal_text):
+    """Keyword-based priority used when the model output is unusable"""
+    fallbacks.inc(kind="priority_keywords")
+    if any(word in informal_text.lower() for word in ['urgent', 'danger', 'emergency', 'critical']):
+        return 'high'
+    return 'medium'
+
+
+def normalize_department(value):
+    """
+    Maps a model answer onto the fixed department list.
+    Returns None if it can't be matched.
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip().strip('"\'.').strip()
+    for dept in DEPARTMENTS:
+        if value.lower() == dept.lower():
+            return dept
+    for dept in DEPARTMENTS:
+        if dept.lower() in value.lower():
+            return dept
+    return None
+
+
+# -----------------------------
+# 4️⃣ Verify Closure
+# -----------------------------
+VERIFY_CLOSURE_PROMPT = PromptTemplate("verify_closure", """
+Verify whether a grievance has been satisfactorily resolved.
 
 Evaluation Criteria:
 1. Does it address the specific issue?
@@ -248,42 +650,298 @@ Evaluation Criteria:
 3. Does it provide specific details (dates, actions taken, work order numbers)?
 4. Is it more than just a vague promise?
 
-Inadequate Examples:
-- "We will look into it"
-- "Issue noted"
-- "All areas covered" (without specific location)
-
-Adequate Examples:
-- "Streetlight at XYZ Road repaired on Jan 23. Work order #123."
-- "Hospital ABC received 3 ventilators on Jan 22. Invoice #456."
+Inadequate: "We will look into it", "Issue noted", "All areas covered" (without specific location)
+Adequate: "Streetlight at XYZ Road repaired on Jan 23. Work order #123."
 
 Respond ONLY with valid JSON (no markdown, no code blocks):
 {{"approved": true, "reason": "brief explanation"}}
 OR
 {{"approved": false, "reason": "what's missing"}}
-"""
 
-    result = generate_content(prompt, response_format="json")
-    
-    # Parse JSON
+Original Grievance:
+{grievance}
+
+{location}
+
+Resolution Provided:
+{resolution}
+""")
+
+
+def verify_closure(grievance_text, resolution_text, location_data=None):
+    location_check = ""
+    if location_data and location_data.get('specificLocation'):
+        location_check = f"""Expected Location Reference:
+The resolution should confirm action at: {location_data.get('specificLocation')}, {location_data.get('area')}, {location_data.get('city')}"""
+
+    # A digest of the report, not the whole thing
+    prompt = VERIFY_CLOSURE_PROMPT.render(
+        grievance=report_digest(grievance_text),
+        location=location_check,
+        resolution=truncate_to_budget(resolution_text, RESOLUTION_TEXT_TOKENS)
+    )
+
+    parsed = cascade.run(
+        "verify_closure",
+        lambda model: generate_content(prompt, response_format="json", model=model,
+                                       max_tokens=VERIFY_CLOSURE_PROMPT.max_tokens),
+        validate_closure
+    )
+    if parsed is not None:
+        return parsed
+
+    # Fallback
+    fallbacks.inc(kind="verify_closure_default")
+    return {
+        "approved": False,
+        "reason": "Unable to verify resolution. Please provide specific details including location and actions taken."
+    }
+
+
+def validate_closure(result):
+    """The verdict must parse as JSON with approved and reason"""
     try:
         parsed = json.loads(result)
-        
-        # Validate structure
-        if "approved" in parsed and "reason" in parsed:
-            return parsed
-        else:
-            raise ValueError("Invalid JSON structure")
-            
-    except (json.JSONDecodeError, ValueError) as e:
+    except json.JSONDecodeError as e:
         print(f"JSON parsing error: {e}")
         print(f"Raw response: {result}")
-        
-        # Fallback
-        return {
-            "approved": False,
-            "reason": "Unable to verify resolution. Please provide specific details including location and actions taken."
-        }
+        fallbacks.inc(kind="verify_closure_parse")
+        return None, False
+
+    # Validate structure
+    if not isinstance(parsed, dict) or "approved" not in parsed or "reason" not in parsed:
+        print(f"Invalid JSON structure: {result}")
+        fallbacks.inc(kind="verify_closure_parse")
+        return None, False
+    return parsed, isinstance(parsed["approved"], bool)
+
+
+# -----------------------------
+# 5️⃣ Fused Pipeline (single call)
+# -----------------------------
+FUSED_SCHEMA = {
+    "issue_summary": "string - one-line summary",
+    "detailed_description": "string - clear explanation",
+    "location": {
+        "city": "string",
+        "area": "string",
+        "specific_location": "string or \"Not specified\"",
+        "pincode": "string or \"Not specified\""
+    },
+    "impact": "string - who is affected and how",
+    "urgency_indicators": {
+        "duration": "string",
+        "safety_risk": "string - yes/no and details",
+        "vulnerable_population": "string",
+        "confirmed_incidents": "string"
+    },
+    "expected_resolution": "string - what action is needed",
+    "department": "one of: " + ", ".join(DEPARTMENTS),
+    "priority": "one of: " + ", ".join(PRIORITY_LEVELS)
+}
+
+
+def _field(data, key, default="Not specified"):
+    value = data.get(key) if isinstance(data, dict) else None
+    if isinstance(value, (int, float)):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        return default
+    return clean_markdown(value)
+
+
+def render_structured_report(data, location_data=None):
+    """
+    Renders the fused JSON fields into the same plain-text report
+    format produced by structure_grievance.
+    """
+    location_data = location_data or {}
+    location = data.get("location") if isinstance(data.get("location"), dict) else {}
+    urgency = data.get("urgency_indicators") if isinstance(data.get("urgency_indicators"), dict) else {}
+
+    city = _field(location, "city", location_data.get("city") or "Not specified")
+    area = _field(location, "area", location_data.get("area") or "Not specified")
+    specific = _field(location, "specific_location", location_data.get("specificLocation") or "Not specified")
+    pincode = _field(location, "pincode", location_data.get("pincode") or "Not specified")
+
+    return f"""Issue Summary:
+{_field(data, "issue_summary")}
+
+Detailed Description:
+{_field(data, "detailed_description")}
+
+Location Details:
+City: {city}
+Area: {area}
+Specific Location: {specific}
+Pincode: {pincode}
+
+Impact:
+{_field(data, "impact")}
+
+Urgency Indicators:
+- Duration of Issue: {_field(urgency, "duration")}
+- Safety Risk: {_field(urgency, "safety_risk")}
+- Vulnerable Population: {_field(urgency, "vulnerable_population")}
+- Confirmed Incidents: {_field(urgency, "confirmed_incidents")}
+
+Expected Resolution:
+{_field(data, "expected_resolution")}"""
+
+
+def basic_structured_report(informal_text, location_data=None):
+    """
+    The report format built from the citizen's own words without a model
+    call, for grievances linked to an existing cluster
+    """
+    text = " ".join((informal_text or "").split())
+    summary = re.split(r"(?<=[.!?।])\s", text, maxsplit=1)[0]
+    if len(summary) > 120:
+        summary = summary[:117].rsplit(" ", 1)[0] + "..."
+    return render_structured_report({
+        "issue_summary": summary,
+        "detailed_description": text,
+        "expected_resolution": "Inspection and resolution by the responsible department"
+    }, location_data)
+
+
+# The schema is serialized once; braces are doubled for the template
+FUSED_PROMPT = PromptTemplate("fused", """
+Convert the informal grievance below into a structured professional grievance report,
+classify the responsible government department and determine its priority.
+
+Priority Levels:
+- high: Safety risk, medical emergency, crime, infrastructure failure, affects many people urgently
+- medium: Service delays, moderate impact, no immediate danger
+- low: Minor inconvenience, cosmetic issues, affects few people
+
+Respond ONLY with a JSON object with exactly these keys:
+""" + json.dumps(FUSED_SCHEMA, indent=2).replace("{", "{{").replace("}", "}}") + """
+
+Use plain text values without markdown.
+
+Location Details (if provided):
+{location}
+
+Grievance Text:
+"{grievance}"
+""")
+
+
+@timed(stage_seconds, stage="fused")
+def process_grievance_fused(informal_text, location_data=None):
+    """
+    Produces the structured report, department and priority from a
+    single JSON-mode call instead of three sequential ones.
+
+    Each field is validated separately: an unknown department becomes
+    "Other", an invalid priority uses the keyword fallback. If the
+    response isn't usable JSON at all, falls back to the three-call path.
+    """
+    prompt = _fused_prompt(informal_text, location_data)
+    try:
+        data = cascade.run(
+            "fused",
+            lambda model: generate_content(prompt, response_format="json", json_mode=True, model=model,
+                                           max_tokens=FUSED_PROMPT.max_tokens),
+            validate_fused
+        )
+        if data is None:
+            raise ValueError("No usable JSON from any model tier")
+    except Exception as e:
+        print(f"⚠️ Fused pipeline failed, using sequential path: {e}")
+        fallbacks.inc(kind="fused_sequential")
+        return process_grievance_sequential(informal_text, location_data)
+
+    return _fused_result(data, informal_text, location_data)
+
+
+@timed(stage_seconds, stage="fused")
+async def aprocess_grievance_fused(informal_text, location_data=None):
+    prompt = _fused_prompt(informal_text, location_data)
+    try:
+        data = await cascade.arun(
+            "fused",
+            lambda model: agenerate_content(prompt, response_format="json", json_mode=True, model=model,
+                                            max_tokens=FUSED_PROMPT.max_tokens),
+            validate_fused
+        )
+        if data is None:
+            raise ValueError("No usable JSON from any model tier")
+    except Exception as e:
+        print(f"⚠️ Fused pipeline failed, using sequential path: {e}")
+        fallbacks.inc(kind="fused_sequential")
+        return await aprocess_grievance_sequential(informal_text, location_data)
+
+    return _fused_result(data, informal_text, location_data)
+
+
+def _fused_prompt(informal_text, location_data):
+    return FUSED_PROMPT.render(
+        location=location_block(location_data),
+        grievance=truncate_to_budget(informal_text, CITIZEN_TEXT_TOKENS)
+    )
+
+
+def validate_fused(result):
+    """The fused answer must be a JSON object; confident when its labels are known"""
+    try:
+        data = json.loads(result)
+    except json.JSONDecodeError:
+        return None, False
+    if not isinstance(data, dict):
+        return None, False
+    # Answers outside the enumerated labels mean the model lost the plot
+    confident = (
+        normalize_department(data.get("department")) is not None
+        and str(data.get("priority", "")).lower().strip('"\'. ') in PRIORITY_LEVELS
+    )
+    return data, confident
+
+
+def _fused_result(data, informal_text, location_data):
+    department = normalize_department(data.get("department")) or "Other"
+
+    priority = str(data.get("priority", "")).lower().strip('"\'. ')
+    if priority not in PRIORITY_LEVELS:
+        priority = fallback_priority(informal_text)
+
+    return {
+        "structured": render_structured_report(data, location_data),
+        "department": department,
+        "priority": priority,
+        "mode": "fused"
+    }
+
+
+def process_grievance_sequential(informal_text, location_data=None):
+    """The original three-call path: structure → department, priority"""
+    structured = structure_grievance(informal_text, location_data)
+    department = classify_department(informal_text, structured)
+    priority = assign_priority(informal_text, location_data)
+
+    return {
+        "structured": structured,
+        "department": department,
+        "priority": priority,
+        "mode": "sequential"
+    }
+
+
+async def aprocess_grievance_sequential(informal_text, location_data=None):
+    """process_grievance_sequential() with department and priority run concurrently"""
+    structured = await astructure_grievance(informal_text, location_data)
+    department, priority = await asyncio.gather(
+        aclassify_department(informal_text, structured),
+        aassign_priority(informal_text, location_data)
+    )
+
+    return {
+        "structured": structured,
+        "department": department,
+        "priority": priority,
+        "mode": "sequential"
+    }
 
 
 # -----------------------------
@@ -352,42 +1010,15 @@ OR
     # Add to backend/ai_service.py
 # FREE Image Analysis using Groq Vision (Same API key!)
 
-def encode_image(image_path):
-    """Convert image to base64"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-
-def analyze_image(image_path, structured_grievance):
-    """
-    Analyze image using Groq Vision and check if it matches the grievance.
-    """
-    try:
-        if not os.path.exists(image_path):
-            return {
-                "success": False,
-                "error": "Image file not found"
-            }
+def encode_image(image_path, decoded=None):
+    """Convert image to base64 JPEG, downscaled for the vision model"""
+    return prepare_image_for_vision(image_path, decoded)
 
-        # Encode image
-        base64_image = encode_image(image_path)
-
-        # Vision + grievance alignment prompt
-        response = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"""
+VISION_PROMPT = PromptTemplate("vision", """
 You are given:
 1) An image uploaded by a citizen
 2) A structured public grievance
 
-Grievance Text:
-{structured_grievance}
-
 Your task:
 - Analyze what is visible in the image
 - Decide whether the image VISUALLY SUPPORTS the grievance
@@ -405,58 +1036,172 @@ Respond ONLY in valid JSON:
   "text_found": "any visible text or none",
   "safety_concern": "yes/no with brief reason"
 }}
-"""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            temperature=0.2,
-            max_tokens=500
-        )
 
-        result_text = response.choices[0].message.content.strip()
-        result_text = clean_json_response(result_text)
+Grievance Text:
+{grievance}
+""")
 
-        try:
-            analysis = json.loads(result_text)
-        except Exception:
-            analysis = {
-                "description": result_text[:200],
-                "issue": "Unable to parse model response",
-                "matches_grievance": False,
-                "severity": "medium",
-                "text_found": "",
-                "safety_concern": "unknown"
+
+@timed(stage_seconds, stage="vision")
+def analyze_image(image_path, structured_grievance):
+    """
+    Analyze image using Groq Vision and check if it matches the grievance.
+    """
+    decoded = None
+    try:
+        if not os.path.exists(image_path):
+            return {
+                "success": False,
+                "error": "Image file not found"
             }
 
-        return {
-            "success": True,
-            "analysis": analysis,
-            "method": "groq-vision"
-        }
+        # Decoded once for the hash, the vision payload and the fallback
+        decoded = decode_image(image_path)
+
+        # Reuse the analysis of a near-identical photo for a similar grievance
+        cached, image_hash = _image_cache_lookup(decoded, structured_grievance)
+        if cached:
+            return cached
+
+        messages = _vision_messages(encode_image(image_path, decoded), structured_grievance)
+        with llm_call_seconds.time(model=VISION_MODEL):
+            response = scheduler.call(
+                lambda: llm_backend.complete(
+                    model=VISION_MODEL,
+                    messages=messages,
+                    temperature=0.2,
+                    max_tokens=VISION_PROMPT.max_tokens
+                ),
+                model=VISION_MODEL,
+                tokens=estimate_tokens(messages, VISION_PROMPT.max_tokens)
+            )
+        return _vision_result(response, image_hash, structured_grievance)
+
+    except Exception as e:
+        print(f"Groq vision error: {e}")
+        errors.inc(component="vision", type=type(e).__name__)
+        return analyze_image_basic(image_path, decoded)
+
+
+@timed(stage_seconds, stage="vision")
+async def aanalyze_image(image_path, structured_grievance):
+    """analyze_image() with decoding, hashing and encoding moved off the event loop"""
+    decoded = None
+    try:
+        if not os.path.exists(image_path):
+            return {
+                "success": False,
+                "error": "Image file not found"
+            }
+
+        decoded = await asyncio.to_thread(decode_image, image_path)
+        cached, image_hash = await asyncio.to_thread(_image_cache_lookup, decoded, structured_grievance)
+        if cached:
+            return cached
+
+        base64_image = await asyncio.to_thread(encode_image, image_path, decoded)
+        messages = _vision_messages(base64_image, structured_grievance)
+        with llm_call_seconds.time(model=VISION_MODEL):
+            response = await scheduler.acall(
+                lambda: llm_backend.acomplete(
+                    model=VISION_MODEL,
+                    messages=messages,
+                    temperature=0.2,
+                    max_tokens=VISION_PROMPT.max_tokens
+                ),
+                model=VISION_MODEL,
+                tokens=estimate_tokens(messages, VISION_PROMPT.max_tokens)
+            )
+        return _vision_result(response, image_hash, structured_grievance)
 
     except Exception as e:
         print(f"Groq vision error: {e}")
-        return analyze_image_basic(image_path)
+        errors.inc(component="vision", type=type(e).__name__)
+        return await asyncio.to_thread(analyze_image_basic, image_path, decoded)
 
 
-def analyze_image_basic(image_path):
+def _image_cache_lookup(decoded, structured_grievance):
+    """(cached result or None, image hash or None) for a decode_image() result"""
+    if not image_cache or decoded is None:
+        return None, None
+    try:
+        image_hash = dhash(decoded["image"])
+        cached, distance = image_cache.lookup(image_hash, structured_grievance)
+    except Exception as e:
+        print(f"⚠️ Perceptual hash failed: {e}")
+        return None, None
+
+    cache_requests.inc(cache="image", result="miss" if cached is None else "hit")
+    if cached is None:
+        return None, image_hash
+    print(f"♻️ Image analysis reused (hash distance {distance})")
+    return {
+        "success": True,
+        "analysis": cached,
+        "method": "phash-cache",
+        "hash_distance": distance
+    }, image_hash
+
+
+def _vision_messages(base64_image, structured_grievance):
+    """Vision + grievance alignment prompt"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": VISION_PROMPT.render(grievance=report_digest(structured_grievance))
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}"
+                    }
+                }
+            ]
+        }
+    ]
+
+
+def _vision_result(response, image_hash, structured_grievance):
+    result_text = response.choices[0].message.content.strip()
+    result_text = clean_json_response(result_text)
+
+    try:
+        analysis = json.loads(result_text)
+        if image_hash is not None:
+            image_cache.add(image_hash, structured_grievance, analysis)
+    except Exception:
+        fallbacks.inc(kind="vision_unparsed")
+        analysis = {
+            "description": result_text[:200],
+            "issue": "Unable to parse model response",
+            "matches_grievance": False,
+            "severity": "medium",
+            "text_found": "",
+            "safety_concern": "unknown"
+        }
+
+    return {
+        "success": True,
+        "analysis": analysis,
+        "method": "groq-vision"
+    }
+
+
+def analyze_image_basic(image_path, decoded=None):
     """
     Fallback: Basic analysis without AI
     Just confirms image is uploaded
     """
+    fallbacks.inc(kind="image_basic")
     try:
-        from PIL import Image
-        
-        img = Image.open(image_path)
-        width, height = img.size
-        format_name = img.format
+        decoded = decoded or decode_image(image_path)
+        if decoded is None:
+            raise ValueError("Unreadable image")
+        width, height = decoded["width"], decoded["height"]
+        format_name = decoded["format"]
         
         return {
             "success": True,
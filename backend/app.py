@@ -1,24 +1,60 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, Response, g
 from flask_cors import CORS
 from ai_service import (
-    structure_grievance,
-    classify_department,
-    assign_priority,
-    analyze_image,
-    verify_closure
+    get_cache_stats,
+    get_image_cache_stats,
+    get_scheduler_stats,
+    get_cascade_stats,
+    get_backend_stats
 )
-from twilio.rest import Client
+from clients import twilio_client, groq_client
+from metrics import registry, render_metrics, request_seconds, stage_seconds, errors, timed
+from job_queue import JobQueue
+from grievance_service import (
+    grievance_store,
+    duplicate_index,
+    geo_index,
+    notification_outbox,
+    process_or_link,
+    record_grievance,
+    start_services
+)
+from geo_index import pincode_table, parse_coordinate, GEO_MAX_RADIUS_KM
+from notification_messages import grievance_registered, whatsapp_registered, processing_failed_message
+from notification_outbox import SenderNotConfigured
+from grievance_id import new_grievance_id, normalize_grievance_id
+from grievance_store import normalize_status, GRIEVANCE_STATUSES
+from image_ingest import save_upload, download_image, ImageTooLarge, MAX_IMAGE_BYTES
+from batch_import import run_batch, save_batch_upload, BATCH_DIR, BATCH_MAX_BYTES
+from message_router import (
+    route_message,
+    format_status_reply,
+    is_command,
+    NEW_GRIEVANCE,
+    STATUS_QUERY,
+    GREETING,
+    HELP,
+    EMPTY
+)
+from session_store import create_session_store
+from whatsapp_intake import inbound_message, receive as receive_intake_message, WHATSAPP_INTAKE
 from twilio.twiml.messaging_response import MessagingResponse
+from twilio.request_validator import RequestValidator
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-import requests
-import tempfile
+import hmac
+import time
 from dotenv import load_dotenv
-import random
 from datetime import datetime
 import json
+import queue
+import threading
 
 app = Flask(__name__)
 CORS(app)
+# Reject oversized bodies before they are parsed; images are still capped
+# while streaming to disk. The batch upload route raises its own limit
+app.config["MAX_CONTENT_LENGTH"] = MAX_IMAGE_BYTES + 1024 * 1024
 
 # Load environment variables
 load_dotenv()
@@ -26,19 +62,78 @@ load_dotenv()
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+# Public URL of /webhook/twilio/status; Twilio posts delivery updates there
+TWILIO_STATUS_CALLBACK_URL = os.getenv("TWILIO_STATUS_CALLBACK_URL")
+# Reject webhook calls without a valid X-Twilio-Signature; on whenever
+# there is an auth token to check against. The signature covers the public
+# URL, so a proxy in front must pass the original scheme and host through
+TWILIO_VALIDATE_SIGNATURE = os.getenv(
+    "TWILIO_VALIDATE_SIGNATURE", "true" if TWILIO_AUTH_TOKEN else "false"
+).lower() == "true"
+
+# Key for the staff routes (listing grievances, full records, status
+# updates), sent as X-API-Key or "Authorization: Bearer <key>". Unset, those
+# routes refuse every request and grievance lookups return the public view
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# WhatsApp conversation state (intake drafts), keyed by sender
+user_sessions = create_session_store()
 
-# Initialize Twilio client
-try:
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    # Test the connection
-    client.api.accounts(TWILIO_ACCOUNT_SID).fetch()
-    print("✅ Twilio client initialized and verified")
-except Exception as e:
-    print(f"❌ Twilio client initialization failed: {e}")
-    client = None
+# "sync" answers /process_grievance after the full pipeline,
+# "async" returns a queued grievance ID immediately
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "sync")
 
-# Store user conversation state
-user_sessions = {}
+# Idle seconds between keep-alive comments on /process_grievance/stream
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Development server only; production runs under gunicorn.conf.py
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "false").lower() == "true"
+SERVER_HOST = os.getenv("HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("PORT", "5000"))
+
+# Durable background queue for accepted-then-processed submissions
+job_queue = JobQueue()
+
+
+# ------------------------
+# Metrics
+# ------------------------
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        # The route pattern, not the path, so IDs don't explode the label set
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        request_seconds.observe(
+            time.perf_counter() - started,
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+
+registry.gauge(
+    "nyaya_jobs", "Background jobs by status", ("status",),
+    collect=lambda: {(status,): count for status, count in job_queue.counts().items()}
+)
+registry.gauge(
+    "nyaya_llm_in_flight", "Provider calls running, by lane", ("lane",),
+    collect=lambda: {(lane,): count for lane, count in get_scheduler_stats()["in_flight"].items()}
+)
+registry.gauge(
+    "nyaya_llm_waiting", "Provider calls waiting for a slot, by lane", ("lane",),
+    collect=lambda: {(lane,): count for lane, count in get_scheduler_stats()["waiting"].items()}
+)
+registry.gauge(
+    "nyaya_notifications", "Outbox messages by status", ("status",),
+    collect=lambda: {(status,): count for status, count in notification_outbox.counts().items()}
+)
 
 # ------------------------
 # API Routes
@@ -49,180 +144,422 @@ def index():
         "status": "ok",
         "message": "Nyaya Grievance Backend API",
         "time": datetime.now().isoformat(),
-        "twilio_status": "configured" if client else "not configured",
+        "twilio_status": "configured" if twilio_client.configured else "not configured",
         "endpoints": {
-            "/process_grievance": "POST - Submit grievance",
+            "/process_grievance": "POST - Submit grievance (async=1 to queue)",
+            "/process_grievance/stream": "POST - Submit grievance, stream the report (SSE)",
+            "/process_grievances/batch": "POST - Bulk import a JSONL / CSV file",
+            "/process_grievances/batch/<id>": "GET - Bulk import progress",
+            "/grievance/<id>/status": "GET - Processing status of a queued grievance, POST - Set its workflow status (admin)",
+            "/grievance/<id>": "GET - Stored grievance (phone and location masked without the admin key)",
+            "/grievances": "GET - List grievances (phone, department, priority, status) (admin)",
             "/webhook/whatsapp": "POST - WhatsApp webhook",
+            "/webhook/twilio/status": "POST - Twilio message delivery callbacks",
             "/health": "GET - Health check",
+            "/metrics": "GET - Prometheus metrics",
             "/test_twilio": "GET - Test Twilio connection"
         }
     })
 
 @app.route("/test_twilio", methods=["GET"])
 def test_twilio():
-    """Test endpoint to verify Twilio is working"""
-    if not client:
+    """
+    Twilio status from the background health probe (no API call).
+    refresh=1 probes now instead of returning the cached result.
+    """
+    if not twilio_client.configured:
         return jsonify({
             "status": "error",
             "message": "Twilio not configured. Check .env file."
         }), 500
-    
-    try:
-        # Get account info
-        account = client.api.accounts(TWILIO_ACCOUNT_SID).fetch()
+
+    if request.args.get("refresh", "").lower() in ("1", "true", "yes"):
+        health = twilio_client.check()
+    else:
+        health = twilio_client.health()
+
+    if health["ok"] is None:
         return jsonify({
-            "status": "success",
-            "account_sid": account.sid,
-            "account_status": account.status,
-            "friendly_name": account.friendly_name,
-            "message": "Twilio is configured correctly!"
-        })
-    except Exception as e:
+            "status": "pending",
+            "message": "Twilio has not been probed yet. Retry shortly or pass refresh=1."
+        }), 503
+    if not health["ok"]:
         return jsonify({
             "status": "error",
-            "message": str(e)
+            "message": health.get("error"),
+            "checked_at": health["checked_at"]
         }), 500
 
-@app.route("/process_grievance", methods=["POST"])
-@app.route("/process_grievance", methods=["POST"])
-def process_grievance():
+    details = health.get("details", {})
+    return jsonify({
+        "status": "success",
+        "account_sid": details.get("account_sid"),
+        "account_status": details.get("account_status"),
+        "friendly_name": details.get("friendly_name"),
+        "checked_at": health["checked_at"],
+        "probe_latency_ms": health["latency_ms"],
+        "message": "Twilio is configured correctly!"
+    })
+
+
+# ------------------------
+# Notifications
+# ------------------------
+def send_whatsapp_message(to_number, body):
+    """
+    Sends a WhatsApp message through the REST API. Returns the message SID.
+    Called by the outbox senders; request handlers queue messages instead.
+    """
+    client = twilio_client.get()
+    if not client:
+        raise SenderNotConfigured("Twilio not configured")
+    options = {"status_callback": TWILIO_STATUS_CALLBACK_URL} if TWILIO_STATUS_CALLBACK_URL else {}
     try:
-        grievance_text = request.form.get("grievance_text") or request.form.get("grievance")
-        phone_number = request.form.get("phone", "")
-        
-        if not grievance_text:
-            return jsonify({
-                "status": "error",
-                "message": "Grievance text is required"
-            }), 400
+        with stage_seconds.time(stage="twilio_send"):
+            message = client.messages.create(
+                from_=TWILIO_WHATSAPP_NUMBER,
+                to=to_number,
+                body=body,
+                **options
+            )
+    except Exception as e:
+        errors.inc(component="twilio", type=type(e).__name__)
+        raise
+    print(f"✅ WhatsApp sent to {to_number}. SID: {message.sid}, Status: {message.status}")
+    return message.sid
 
-        location_data = {
-            "city": request.form.get("city", ""),
-            "state": request.form.get("state", ""),
-            "area": request.form.get("area", ""),
-            "place": request.form.get("place", ""),
-            "pincode": request.form.get("pincode", ""),
-            "specificLocation": request.form.get("specificLocation", "")
-        }
 
-        print(f"\n📝 Processing grievance:")
-        print(f"   Text: {grievance_text[:50]}...")
-        print(f"   Location: {location_data.get('city')}, {location_data.get('state')}")
-        print(f"   Phone: {phone_number}")
+# ------------------------
+# Grievance Processing
+# ------------------------
+def handle_grievance(payload, on_delta=None):
+    """
+    Runs the AI pipeline and queues the WhatsApp notification for one
+    submission. Used inline by /process_grievance and by the background
+    job workers. on_delta receives the structured report as it streams in.
+    """
+    # -------------------------------
+    # AI processing (independent stages run concurrently)
+    # -------------------------------
+    result = process_or_link(
+        payload["grievance_text"],
+        payload["location_data"],
+        image_path=payload.get("image_path"),
+        mode=payload.get("mode"),
+        on_delta=on_delta
+    )
 
-        # -------------------------------
-        # AI processing
-        # -------------------------------
-        structured = structure_grievance(grievance_text, location_data)
-        department = classify_department(grievance_text, structured)
-        priority = assign_priority(grievance_text, location_data)
+    # -------------------------------
+    # Stored together with its WhatsApp confirmation (sent by the outbox)
+    # -------------------------------
+    confirmation, whatsapp_error = grievance_confirmation(payload, result)
+    record_grievance(grievance_record(payload, result), [confirmation] if confirmation else None)
 
-        print(f"✅ AI Processing complete:")
-        print(f"   Department: {department}")
-        print(f"   Priority: {priority}")
+    return grievance_response(payload, result, confirmation is not None, whatsapp_error)
 
-        # -------------------------------
-        # Image Handling
-        # -------------------------------
-        image_file = request.files.get("image")
-        image_analysis = None
-        if image_file:
-            os.makedirs("uploads", exist_ok=True)
-            # Unique filename
-            image_path = f"uploads/{int(datetime.now().timestamp())}_{image_file.filename}"
-            image_file.save(image_path)
-            print(f"📷 Image saved: {image_path}")
-            image_analysis = analyze_image(image_path, structured)
-
-        grievance_id = f"GRV{random.randint(100000, 999999)}"
 
-        # -------------------------------
-        # WhatsApp Notification (Safe)
-        # -------------------------------
-        whatsapp_sent = False
-        whatsapp_error = None
+def grievance_confirmation(payload, result):
+    """Outbox entry confirming a web submission: (entry, None) or (None, reason)"""
+    confirmation, whatsapp_error = grievance_registered(
+        payload.get("phone_number", ""), payload["grievance_id"], result["structured"], result["department"],
+        result["priority"], payload["location_data"], result["image_analysis"]
+    )
+    if whatsapp_error:
+        print(f"❌ WhatsApp not queued: {whatsapp_error}")
+    return confirmation, whatsapp_error
 
-        try:
-            phone_number = str(phone_number).strip()  # Force string
 
-            if not phone_number:
-                whatsapp_error = "Phone number missing"
-                print("❌ WhatsApp not sent: phone number missing")
-            else:
-                import re
-                clean_number = re.sub(r"[^\d+]", "", phone_number)
+def grievance_record(payload, result):
+    """The stored grievance for a web submission and its pipeline result"""
+    print(f"✅ AI Processing complete ({result['mode']}):")
+    print(f"   Department: {result['department']}")
+    print(f"   Priority: {result['priority']}")
+    print(f"   Stages: {result['stages']}")
 
-                # Add +91 fallback
-                if not clean_number.startswith("+"):
-                    if clean_number.startswith("91"):
-                        clean_number = "+" + clean_number
-                    else:
-                        clean_number = "+91" + clean_number
+    return {
+        "grievance_id": payload["grievance_id"],
+        "phone": payload.get("phone_number", ""),
+        "source": "web",
+        "grievance_text": payload["grievance_text"],
+        "structured": result["structured"],
+        "department": result["department"],
+        "priority": result["priority"],
+        "location": payload["location_data"],
+        "image_analysis": result["image_analysis"],
+        "cluster_id": result["cluster_id"]
+    }
 
-                to_number = f"whatsapp:{clean_number}"
 
-                location_parts = []
-                if location_data.get('area'):
-                    location_parts.append(location_data['area'])
-                if location_data.get('place'):
-                    location_parts.append(location_data['place'])
-                if location_data.get('city'):
-                    location_parts.append(location_data['city'])
-                if location_data.get('state'):
-                    location_parts.append(location_data['state'])
-                location_str = ", ".join(location_parts) if location_parts else "Not specified"
+def grievance_response(payload, result, whatsapp_queued, whatsapp_error):
+    """
+    JSON body returned for a processed web submission. The confirmation
+    is delivered in the background; whatsapp_status is "queued" or
+    "not_sent", and /grievance/<id>/status reports its delivery.
+    """
+    grievance_id = payload["grievance_id"]
+    return {
+        "status": "success",
+        "grievance_id": grievance_id,
+        "structured": result["structured"],
+        "department": result["department"],
+        "priority": result["priority"],
+        "pipeline_mode": result["mode"],
+        "stage_timings": result["stages"],
+        "cluster_id": result["cluster_id"] or grievance_id,
+        "duplicate_similarity": result["similarity"],
+        "image_analysis": result["image_analysis"],
+        "whatsapp_status": "queued" if whatsapp_queued else "not_sent",
+        "whatsapp_error": whatsapp_error,
+        "phone_number": str(payload.get("phone_number", "")).strip()
+    }
 
-                whatsapp_msg = f"""✅ *Grievance Registered Successfully*
 
-🆔 *Grievance ID:* {grievance_id}
+@timed(stage_seconds, stage="image_download")
+def download_whatsapp_media(media_url):
+    """Streams a Twilio media attachment to a temp file and returns its path"""
+    print(f"📷 Processing image: {media_url}")
+    saved = download_image(media_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+    print(f"📷 Media saved: {saved['path']} ({saved['size']} bytes)")
+    return saved["path"]
 
-📝 *Summary:*
-{structured[:400]}
 
-🏢 *Department:* {department}
-⚠️ *Priority:* {priority}
+def handle_whatsapp_message(payload):
+    """
+    Processes an acknowledged WhatsApp message and replies through the
+    REST API. Never raises after the pipeline has run, so a failed reply
+    doesn't cause the job to be retried through the whole pipeline again.
+    """
+    sender = payload["sender"]
+    body = payload["body"]
+    media_url = payload.get("media_url")
 
-📍 *Location:*
-{location_str}"""
+    print(f"\n🔄 Processing grievance from {sender}")
 
-                if image_analysis:
-    # Safely include analysis as JSON string (first 200 chars)
-                    analysis_text = json.dumps(image_analysis.get("analysis", {}))
-                    whatsapp_msg += f"\n\n📷 *Image Analysis:*\n{analysis_text[:200]}"
+    # Collected by the guided intake; direct messages carry no location fields
+    location_data = payload.get("location_data") or {
+        "city": "",
+        "state": "",
+        "area": "",
+        "place": "",
+        "pincode": "",
+        "specificLocation": body[:100]
+    }
 
-                whatsapp_msg += "\n\n---\n💬 *Track your grievance:*\nSend your Grievance ID anytime to check status.\n\nThank you for using Nyaya! 🙏"
+    try:
+        print("🤖 Calling AI services...")
 
-                print(f"📤 Sending WhatsApp to: {to_number}")
-                print(f"📤 Message length: {len(whatsapp_msg)}")
+        result = process_or_link(
+            body,
+            location_data,
+            fetch_image=(lambda: download_whatsapp_media(media_url)) if media_url else None
+        )
+        structured = result["structured"]
+        print(f"✅ Structured ({result['mode']}): {structured[:100]}...")
 
-                message = client.messages.create(
-                    from_=TWILIO_WHATSAPP_NUMBER,
-                    to=to_number,
-                    body=whatsapp_msg
-                )
+        department = result["department"]
+        print(f"✅ Department: {department}")
 
-                whatsapp_sent = True
-                print(f"✅ WhatsApp sent successfully! SID: {message.sid}, Status: {message.status}")
+        priority = result["priority"]
+        print(f"✅ Priority: {priority}")
 
-        except Exception as e:
-            whatsapp_error = str(e)
-            whatsapp_sent = False
-            print(f"❌ WhatsApp sending failed: {whatsapp_error}")
+        image_analysis = result["image_analysis"]
+        if image_analysis:
+            print(f"✅ Image analyzed")
 
-        # -------------------------------
-        # Return JSON
-        # -------------------------------
-        return jsonify({
-            "status": "success",
+        grievance_id = new_grievance_id()
+        print(f"🆔 ID: {grievance_id}")
+
+        reply = whatsapp_registered(
+            sender, grievance_id, structured, department, priority, image_analysis, result["cluster_id"]
+        )
+        record_grievance({
             "grievance_id": grievance_id,
+            "phone": sender,
+            "source": "whatsapp",
+            "grievance_text": body,
             "structured": structured,
             "department": department,
             "priority": priority,
+            "location": location_data,
             "image_analysis": image_analysis,
-            "whatsapp_sent": whatsapp_sent,
-            "whatsapp_error": whatsapp_error,
-            "phone_number": phone_number
-        })
+            "cluster_id": result["cluster_id"]
+        }, [reply])
+        print(f"📤 Reply queued ({len(reply['body'])} chars)")
+
+    except Exception as process_err:
+        print(f"❌ Processing error: {process_err}")
+        import traceback
+        traceback.print_exc()
+
+        grievance_id = None
+        # Twilio retries of the same message collapse onto one apology
+        message_sid = payload.get("message_sid")
+        notification_outbox.enqueue(
+            sender, processing_failed_message(), "processing_failed",
+            ref=message_sid, collapse_key=f"failed:{message_sid}" if message_sid else None
+        )
+
+    return {
+        "grievance_id": grievance_id,
+        "reply": "queued"
+    }
+
+
+def handle_batch(payload):
+    """
+    Runs a bulk import. A retried or reclaimed job resumes from the rows
+    already in its results file.
+    """
+    return run_batch(
+        payload["input_path"],
+        payload["output_path"],
+        fmt=payload.get("format"),
+        mode=payload.get("mode"),
+        progress=job_queue.heartbeat
+    )
+
+
+job_queue.register("grievance", handle_grievance)
+job_queue.register("whatsapp", handle_whatsapp_message)
+job_queue.register("batch", handle_batch)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def start_background_services():
+    """
+    Starts this process's worker threads: the store flusher and duplicate
+    index, job workers, outbox senders and health probes. Threads don't
+    survive a fork, so this runs in each server process - from __main__,
+    gunicorn's post_fork hook and the ASGI lifespan - never at import.
+    Idempotent.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    start_services()
+    job_queue.start()
+    notification_outbox.start(send_whatsapp_message)
+
+    # Clients are built on first use; probes keep /health current without
+    # a network call at startup or per request
+    twilio_client.start_probing()
+    if get_backend_stats()["backend"] in ("groq", "record"):
+        groq_client.start_probing()
+
+
+def grievance_payload_from_form():
+    """
+    Builds the processing payload from the submission form, saving any
+    attached image. Returns (payload, None) or (None, error response).
+    """
+    try:
+        form, files = request.form, request.files
+    except RequestEntityTooLarge:
+        return None, (jsonify({
+            "status": "error",
+            "message": f"Request exceeds {app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024):.1f} MB limit"
+        }), 413)
+    payload, error = build_grievance_payload(form, files)
+    if error:
+        body, status = error
+        return None, (jsonify(body), status)
+    return payload, None
+
+
+def build_grievance_payload(form, files):
+    """
+    grievance_payload_from_form() on already parsed form and file
+    multidicts, so the ASGI app can share it. Returns (payload, None) or
+    (None, (error body, status)).
+    """
+    grievance_text = form.get("grievance_text") or form.get("grievance")
+    phone_number = form.get("phone", "")
+
+    if not grievance_text:
+        return None, ({
+            "status": "error",
+            "message": "Grievance text is required"
+        }, 400)
+
+    location_data = {
+        "city": form.get("city", ""),
+        "state": form.get("state", ""),
+        "area": form.get("area", ""),
+        "place": form.get("place", ""),
+        "pincode": form.get("pincode", ""),
+        "specificLocation": form.get("specificLocation", "")
+    }
+
+    print(f"\n📝 Processing grievance:")
+    print(f"   Text: {grievance_text[:50]}...")
+    print(f"   Location: {location_data.get('city')}, {location_data.get('state')}")
+    print(f"   Phone: {phone_number}")
+
+    # -------------------------------
+    # Image Handling
+    # -------------------------------
+    image_file = files.get("image")
+    image_path = None
+    if image_file and image_file.filename:
+        try:
+            saved = save_upload(image_file, "uploads")
+        except ImageTooLarge as e:
+            return None, ({
+                "status": "error",
+                "message": str(e)
+            }, 413)
+        image_path = saved["path"]
+        print(f"📷 Image saved: {image_path} ({saved['size']} bytes)")
+
+    return {
+        "grievance_id": new_grievance_id(),
+        "grievance_text": grievance_text,
+        "location_data": location_data,
+        "phone_number": phone_number,
+        "image_path": image_path,
+        "mode": form.get("mode")
+    }, None
+
+
+def queue_requested(form, args):
+    """True when the submission should be accepted now and processed in the background"""
+    async_requested = form.get("async", args.get("async", ""))
+    return PROCESSING_MODE == "async" or async_requested.lower() in ("1", "true", "yes")
+
+
+def enqueue_grievance(payload):
+    """Queues a submission; returns the 202 body"""
+    grievance_id = payload["grievance_id"]
+    job_queue.enqueue("grievance", payload, ref=grievance_id)
+    print(f"📥 Queued grievance {grievance_id}")
+    return {
+        "status": "queued",
+        "grievance_id": grievance_id,
+        "status_url": f"/grievance/{grievance_id}/status"
+    }
+
+
+@app.route("/process_grievance", methods=["POST"])
+def process_grievance():
+    try:
+        payload, error = grievance_payload_from_form()
+        if error:
+            return error
+
+        # -------------------------------
+        # Accept now, process in the background
+        # -------------------------------
+        if queue_requested(request.form, request.args):
+            return jsonify(enqueue_grievance(payload)), 202
+
+        # -------------------------------
+        # Return JSON
+        # -------------------------------
+        return jsonify(handle_grievance(payload))
 
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -233,9 +570,491 @@ def process_grievance():
             "message": str(e)
         }), 500
 
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/process_grievance/stream", methods=["POST"])
+def process_grievance_stream():
+    """
+    Same submission as /process_grievance, answered as Server-Sent Events:
+
+        accepted  {"grievance_id"}
+        reset     {}                 discard the report so far (model escalated)
+        delta     {"text"}           next piece of the structured report
+        result    {...}              the full /process_grievance response
+        error     {"message"}
+
+    Processing runs on its own thread, so a client that disconnects
+    doesn't abandon the grievance.
+    """
+    payload, error = grievance_payload_from_form()
+    if error:
+        return error
+    # Only the three-call path produces a plain-text report to stream
+    payload["mode"] = "sequential"
+
+    events = queue.Queue()
+
+    def on_delta(text):
+        events.put(("reset", {}) if text is None else ("delta", {"text": text}))
+
+    def run():
+        try:
+            events.put(("result", handle_grievance(payload, on_delta=on_delta)))
+        except Exception as e:
+            print(f"❌ Streaming grievance failed: {e}")
+            events.put(("error", {"message": str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, name=f"sse-{payload['grievance_id']}", daemon=True).start()
+
+    def stream():
+        yield sse_event("accepted", {"grievance_id": payload["grievance_id"]})
+        while True:
+            try:
+                item = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                return
+            yield sse_event(*item)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@app.route("/process_grievances/batch", methods=["POST"])
+def process_grievances_batch():
+    """
+    Accepts a JSONL or CSV dump (multipart field "file", or the raw body)
+    and queues it for background processing. Uploading the same file
+    again returns the existing batch.
+    """
+    # Batch dumps are the only uploads allowed past the app-wide limit
+    request.max_content_length = BATCH_MAX_BYTES
+    upload = request.files.get("file")
+    try:
+        if upload and upload.filename:
+            saved = save_batch_upload(upload.stream, upload.filename)
+        else:
+            extension = ".csv" if "csv" in (request.content_type or "") else ".jsonl"
+            saved = save_batch_upload(request.stream, "upload" + extension)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
+
+    if not saved["size"]:
+        os.remove(saved["path"])
+        return jsonify({
+            "status": "error",
+            "message": "Batch file is empty"
+        }), 400
+
+    batch_id = "BATCH" + saved["sha256"][:16].upper()
+    payload = {
+        "batch_id": batch_id,
+        "input_path": saved["path"],
+        "output_path": os.path.join(BATCH_DIR, f"{saved['sha256'][:32]}.results.jsonl"),
+        "format": request.form.get("format") or request.args.get("format") or saved["format"],
+        "mode": request.form.get("mode") or request.args.get("mode")
+    }
+    job_id = job_queue.enqueue("batch", payload, ref=batch_id, dedupe_key=f"batch:{saved['sha256']}")
+    print(f"📥 {'Queued' if job_id else 'Already have'} batch {batch_id} ({saved['size']} bytes)")
+
+    return jsonify({
+        "status": "queued" if job_id else "exists",
+        "batch_id": batch_id,
+        "status_url": f"/process_grievances/batch/{batch_id}",
+        "results_url": f"/process_grievances/batch/{batch_id}/results"
+    }), 202 if job_id else 200
+
+
+@app.route("/process_grievances/batch/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    """Progress of a bulk import, from the counters its worker last reported"""
+    job = job_queue.get_by_ref(batch_id)
+    if not job or job["kind"] != "batch":
+        return jsonify({
+            "status": "error",
+            "message": "Batch not found"
+        }), 404
+
+    response = {
+        "batch_id": batch_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "progress": {key: (job["result"] or {}).get(key, 0) for key in ("ok", "errors", "degraded")},
+        "submitted_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat()
+    }
+    if job["status"] == "done":
+        response["result"] = job["result"]
+    elif job["error"]:
+        response["error"] = job["error"]
+    return jsonify(response)
+
+
+@app.route("/process_grievances/batch/<batch_id>/results", methods=["GET"])
+def batch_results(batch_id):
+    """
+    Results written so far, one JSON line per input row. A row may also
+    have an earlier {"status": "pending"} line from just before it was stored.
+    """
+    job = job_queue.get_by_ref(batch_id)
+    if not job or job["kind"] != "batch" or not os.path.exists(job["payload"]["output_path"]):
+        return jsonify({
+            "status": "error",
+            "message": "No results for this batch yet"
+        }), 404
+    return send_file(
+        os.path.abspath(job["payload"]["output_path"]),
+        mimetype="application/x-ndjson",
+        as_attachment=True,
+        download_name=f"{batch_id}.results.jsonl"
+    )
+
+
+@app.route("/grievance/<grievance_id>/status", methods=["GET"])
+def grievance_status(grievance_id):
+    """Poll the processing state of a queued grievance and its WhatsApp confirmation"""
+    grievance_id = normalize_grievance_id(grievance_id)
+    job = job_queue.get_by_ref(grievance_id)
+    if not job:
+        # Processed synchronously - no job, but the grievance is stored
+        grievance = grievance_store.get(grievance_id)
+        if grievance:
+            return jsonify({
+                "grievance_id": grievance_id,
+                "status": "done",
+                "grievance_status": grievance["status"],
+                "notification": notification_status(grievance_id)
+            })
+        return jsonify({
+            "status": "error",
+            "message": "Grievance not found"
+        }), 404
+
+    response = {
+        "grievance_id": grievance_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "submitted_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat()
+    }
+    if job["status"] == "done":
+        response["result"] = job["result"]
+        response["notification"] = notification_status(grievance_id)
+    elif job["error"]:
+        response["error"] = job["error"]
+    return jsonify(response)
+
+
+@app.route("/grievance/<grievance_id>/status", methods=["POST"])
+def update_grievance_status(grievance_id):
+    """Moves a grievance through its workflow; "status" as a JSON or form field"""
+    denied = admin_required()
+    if denied:
+        return denied
+    grievance_id = normalize_grievance_id(grievance_id)
+    data = request.get_json(silent=True) or request.form
+    status = normalize_status(data.get("status"))
+    if not status:
+        return jsonify({
+            "status": "error",
+            "message": f"status must be one of: {', '.join(GRIEVANCE_STATUSES)}"
+        }), 400
+
+    if not grievance_store.update_status(grievance_id, status):
+        return jsonify({
+            "status": "error",
+            "message": "Grievance not found"
+        }), 404
+    print(f"📝 Grievance {grievance_id} marked {status}")
+    return jsonify({
+        "status": "success",
+        "grievance_id": grievance_id,
+        "grievance_status": status
+    })
+
+
+def notification_status(grievance_id):
+    """Outbox state of the latest message about a grievance, or None"""
+    entry = notification_outbox.get_by_ref(grievance_id)
+    if not entry:
+        return None
+    return {
+        "status": entry["status"],
+        "delivery_status": entry["delivery_status"],
+        "attempts": entry["attempts"],
+        "error": entry["error"],
+        "sent_at": datetime.fromtimestamp(entry["sent_at"]).isoformat() if entry["sent_at"] else None
+    }
+
+
+def is_admin_request():
+    """True when the request carries ADMIN_API_KEY as X-API-Key or a Bearer token"""
+    if not ADMIN_API_KEY:
+        return False
+    supplied = request.headers.get("X-API-Key", "")
+    authorization = request.headers.get("Authorization", "")
+    if not supplied and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    return hmac.compare_digest(supplied.encode(), ADMIN_API_KEY.encode())
+
+
+def admin_required():
+    """Error response for a staff route called without the admin key, else None"""
+    if is_admin_request():
+        return None
+    if not ADMIN_API_KEY:
+        return jsonify({
+            "status": "error",
+            "message": "Admin API is disabled; set ADMIN_API_KEY"
+        }), 403
+    return jsonify({
+        "status": "error",
+        "message": "Admin API key required"
+    }), 401
+
+
+def mask_phone(phone):
+    """Last two digits only, e.g. ********10"""
+    if not phone:
+        return phone
+    return "*" * max(len(phone) - 2, 0) + phone[-2:]
+
+
+def serialize_grievance(grievance, full=True):
+    """
+    Shapes a stored grievance for API responses. The public view (full=False)
+    masks the phone number and leaves out the exact location and the report
+    that repeats it; area, city, state and pincode stay.
+    """
+    serialized = {
+        **grievance,
+        "created_at": datetime.fromtimestamp(grievance["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(grievance["updated_at"]).isoformat()
+    }
+    if not full:
+        serialized["phone"] = mask_phone(serialized.get("phone"))
+        serialized.pop("location", None)
+        serialized.pop("structured", None)
+    return serialized
+
+
+@app.route("/grievance/<grievance_id>", methods=["GET"])
+def get_grievance(grievance_id):
+    """Stored grievance; the full record with the admin key, else the public view"""
+    grievance = grievance_store.get(normalize_grievance_id(grievance_id))
+    if not grievance:
+        return jsonify({
+            "status": "error",
+            "message": "Grievance not found"
+        }), 404
+    return jsonify({
+        "status": "success",
+        "grievance": serialize_grievance(grievance, full=is_admin_request())
+    })
+
+
+def int_arg(name, default, minimum=0, maximum=500):
+    """Integer query parameter clamped to [minimum, maximum]; ValueError if it isn't one"""
+    value = request.args.get(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    value = max(minimum, value)
+    return min(value, maximum) if maximum is not None else value
+
+
+def bad_argument(error):
+    return jsonify({
+        "status": "error",
+        "message": str(error)
+    }), 400
+
+
+@app.route("/grievances", methods=["GET"])
+def list_grievances():
+    """List grievances by phone, or filtered by department / priority / status"""
+    denied = admin_required()
+    if denied:
+        return denied
+    try:
+        limit = int_arg("limit", 50, minimum=1)
+        offset = int_arg("offset", 0, maximum=None)
+    except ValueError as e:
+        return bad_argument(e)
+
+    if request.args.get("phone"):
+        grievances = grievance_store.find_by_phone(request.args["phone"], limit=limit)
+    else:
+        grievances = grievance_store.find(
+            department=request.args.get("department"),
+            priority=request.args.get("priority"),
+            status=request.args.get("status"),
+            cluster_id=request.args.get("cluster_id"),
+            limit=limit,
+            offset=offset
+        )
+
+    return jsonify({
+        "status": "success",
+        "count": len(grievances),
+        "grievances": [serialize_grievance(g) for g in grievances]
+    })
+
+
+@app.route("/grievances/nearby", methods=["GET"])
+def nearby_grievances():
+    """
+    Open grievances within radius_km of lat/lon (or of a pincode's
+    centroid), nearest first. include_closed=1 adds resolved ones.
+    """
+    lat = parse_coordinate(request.args.get("lat"), 90)
+    lon = parse_coordinate(request.args.get("lon"), 180)
+    if lat is None or lon is None:
+        entry = pincode_table.lookup(request.args.get("pincode"))
+        if not entry:
+            return jsonify({
+                "status": "error",
+                "message": "Pass lat and lon, or a known pincode"
+            }), 400
+        lat, lon = entry["latitude"], entry["longitude"]
+
+    try:
+        limit = int_arg("limit", 50, minimum=1)
+    except ValueError as e:
+        return bad_argument(e)
+    try:
+        radius_km = float(request.args.get("radius_km", 2))
+    except ValueError:
+        radius_km = 0
+    if not 0 < radius_km <= GEO_MAX_RADIUS_KM:
+        return jsonify({
+            "status": "error",
+            "message": f"radius_km must be between 0 and {GEO_MAX_RADIUS_KM:g}"
+        }), 400
+
+    grievance_store.flush()
+    matches = geo_index.nearby(
+        lat, lon, radius_km,
+        open_only=request.args.get("include_closed") != "1",
+        department=request.args.get("department"),
+        limit=limit
+    )
+    full = is_admin_request()
+    grievances = []
+    for match in matches:
+        grievance = grievance_store.get(match["grievance_id"])
+        if grievance:
+            latitude, longitude = match["latitude"], match["longitude"]
+            distance_km = match["distance_km"]
+            if not full and match["precision"] == "exact":
+                # A shared pin is someone's doorstep; ~1 km is enough for a map
+                latitude, longitude = round(latitude, 2), round(longitude, 2)
+                distance_km = round(distance_km)
+            grievances.append(dict(
+                serialize_grievance(grievance, full=full),
+                distance_km=distance_km,
+                latitude=latitude,
+                longitude=longitude,
+                location_precision=match["precision"]
+            ))
+
+    return jsonify({
+        "status": "success",
+        "center": {"latitude": lat, "longitude": lon},
+        "radius_km": radius_km,
+        "count": len(grievances),
+        "grievances": grievances
+    })
+
+
+@app.route("/grievances/hotspots", methods=["GET"])
+def grievance_hotspots():
+    """Pincodes with the most open grievances, optionally for one department"""
+    try:
+        limit = int_arg("limit", 20, minimum=1)
+    except ValueError as e:
+        return bad_argument(e)
+    grievance_store.flush()
+    hotspots = geo_index.hotspots(
+        limit=limit,
+        department=request.args.get("department"),
+        open_only=request.args.get("include_closed") != "1"
+    )
+    return jsonify({
+        "status": "success",
+        "count": len(hotspots),
+        "hotspots": hotspots
+    })
+
+
 # ------------------------
 # WhatsApp Webhook - ENHANCED WITH MORE LOGGING
 # ------------------------
+WELCOME_MESSAGE = """👋 *Welcome to Nyaya Grievance Portal!*
+
+To submit a grievance:
+1. Describe your issue
+2. Tell us where it is (area and pincode)
+3. Optionally attach a photo
+
+Example: "There is a pothole on MG Road"
+
+How can I help you today?"""
+
+HELP_MESSAGE = """ℹ️ *Nyaya Help*
+
+📝 *New grievance:* describe the problem and its location, optionally with a photo
+🔎 *Check status:* send your Grievance ID (e.g. GRV02M4AC2B1RJ0002)
+📋 *Your grievances:* send "status"
+🗑️ *Discard a draft:* send "cancel"
+"""
+
+
+def answer_status_query(sender, grievance_ids):
+    """Builds a status reply from the grievance store - no LLM calls"""
+    if not grievance_ids:
+        recent = grievance_store.find_by_phone(sender, limit=5)
+        if not recent:
+            return "📭 You have no registered grievances yet. Describe your issue to submit one."
+        lines = ["📋 *Your recent grievances:*", ""]
+        for g in recent:
+            lines.append(f"🆔 {g['grievance_id']} - {g['status']} ({g.get('department') or 'Pending'})")
+        return "\n".join(lines)
+
+    replies = []
+    for grievance_id in grievance_ids[:3]:
+        grievance = grievance_store.get(grievance_id)
+        job = None if grievance else job_queue.get_by_ref(grievance_id)
+        replies.append(format_status_reply(grievance_id, grievance, job))
+    return "\n\n".join(replies)
+
+
+def is_valid_twilio_request():
+    """Checks the X-Twilio-Signature header against the request URL and form"""
+    validator = RequestValidator(TWILIO_AUTH_TOKEN or "")
+    return validator.validate(
+        request.url,
+        request.form,
+        request.headers.get("X-Twilio-Signature", "")
+    )
+
+
 @app.route("/webhook/whatsapp", methods=["POST", "GET"])
 def whatsapp_webhook():
     """Handle incoming WhatsApp messages"""
@@ -254,7 +1073,7 @@ def whatsapp_webhook():
         return jsonify({
             "status": "ok",
             "message": "Webhook is active and listening",
-            "twilio_configured": client is not None,
+            "twilio_configured": twilio_client.configured,
             "time": datetime.now().isoformat()
         })
     
@@ -264,6 +1083,10 @@ def whatsapp_webhook():
         for key, value in request.form.items():
             print(f"   {key}: {value}")
         
+        if TWILIO_VALIDATE_SIGNATURE and not is_valid_twilio_request():
+            print("❌ Invalid Twilio signature")
+            return "Invalid signature", 403
+
         # Extract Twilio parameters
         sender = request.form.get("From", "")
         body = request.form.get("Body", "").strip()
@@ -277,99 +1100,63 @@ def whatsapp_webhook():
         print(f"   Media URL: {media_url}")
         print(f"   Num Media: {num_media}")
         print(f"   Message SID: {message_sid}")
+
+        if not sender:
+            return "Missing sender", 400
         
         # Create TwiML response
         resp = MessagingResponse()
 
-        # Handle empty message
-        if not body and num_media == 0:
-            print("⚠️  Empty message - sending welcome")
-            welcome_msg = """👋 *Welcome to Nyaya Grievance Portal!*
-
-To submit a grievance:
-1. Describe your issue
-2. Optionally attach a photo
+        # Route cheap intents without touching the AI pipeline
+        intent, grievance_ids = route_message(body, num_media)
+        # Location replies during an intake ("Near check naka, Andheri")
+        # look like status queries; with a draft open, only a grievance
+        # ID or a bare command word leaves the conversation
+        if (intent in (HELP, STATUS_QUERY) and not grievance_ids and not is_command(body)
+                and WHATSAPP_INTAKE != "direct" and user_sessions.get(sender) is not None):
+            intent = NEW_GRIEVANCE
+        print(f"🧭 Intent: {intent}")
 
-Example: "There is a pothole on MG Road"
+        if intent == HELP:
+            resp.message(HELP_MESSAGE)
+            return str(resp), 200
 
-How can I help you today?"""
-            resp.message(welcome_msg)
-            print(f"📤 Response: {welcome_msg[:50]}...")
+        if intent == STATUS_QUERY:
+            resp.message(answer_status_query(sender, grievance_ids))
             return str(resp), 200
 
-        # Process the grievance
-        print(f"\n🔄 Processing grievance from {sender}")
-        
-        location_data = {
-            "city": "Mumbai",
-            "state": "Maharashtra",
-            "area": "",
-            "place": "",
-            "pincode": "",
-            "specificLocation": body[:100]
-        }
+        if WHATSAPP_INTAKE == "direct":
+            if intent in (EMPTY, GREETING):
+                print("⚠️  No grievance in message - sending welcome")
+                resp.message(WELCOME_MESSAGE)
+                return str(resp), 200
+            submission = {"body": body, "media_url": media_url, "message_sid": message_sid}
+        else:
+            # Collect location, photo and a confirmation over several
+            # messages; only a confirmed draft reaches the AI pipeline
+            reply, submission = receive_intake_message(user_sessions, sender, inbound_message(request.form), intent)
+            if reply is None:
+                print("⚠️  No grievance in message - sending welcome")
+                reply = WELCOME_MESSAGE
+            if reply:
+                resp.message(reply)
+            if not submission:
+                return str(resp), 200
+            message_sid = submission["message_sid"]
 
-        try:
-            print("🤖 Calling AI services...")
-            
-            structured = structure_grievance(body, location_data)
-            print(f"✅ Structured: {structured[:100]}...")
-            
-            department = classify_department(body, structured)
-            print(f"✅ Department: {department}")
-            
-            priority = assign_priority(body, location_data)
-            print(f"✅ Priority: {priority}")
-            
-            image_analysis = None
-            if media_url:
-                print(f"📷 Processing image: {media_url}")
-                try:
-                    img_path = os.path.join(tempfile.gettempdir(), f"wa_{random.randint(1000,9999)}.jpg")
-                    auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-                    r = requests.get(media_url, auth=auth, timeout=10)
-                    r.raise_for_status()
-                    
-                    with open(img_path, "wb") as f:
-                        f.write(r.content)
-                    
-                    image_analysis = analyze_image(img_path, body)
-                    print(f"✅ Image analyzed")
-                except Exception as img_err:
-                    print(f"❌ Image error: {img_err}")
-
-            grievance_id = f"GRV{random.randint(100000, 999999)}"
-            print(f"🆔 ID: {grievance_id}")
-
-            success_msg = f"""✅ *Grievance Registered!*
-
-🆔 *ID:* {grievance_id}
-
-📝 *Summary:*
-{structured[:300]}
-
-🏢 *Department:* {department}
-⚠️ *Priority:* {priority}"""
-
-            if image_analysis:
-                success_msg += f"\n\n📷 *Image:* {image_analysis[:100]}"
-
-            success_msg += f"\n\n💬 Send *{grievance_id}* to check status."
-
-            resp.message(success_msg)
-            print(f"\n📤 Sending response ({len(success_msg)} chars)")
-            print("="*70 + "\n")
-            
-            return str(resp), 200
+        # Acknowledge immediately - processing and the reply happen in a worker.
+        # Twilio retries reuse the MessageSid, so they dedupe onto one job.
+        job_id = job_queue.enqueue(
+            "whatsapp",
+            dict(submission, sender=sender),
+            dedupe_key=f"whatsapp:{message_sid}" if message_sid else None
+        )
+        if job_id:
+            print(f"📥 Queued message {message_sid} as job {job_id}")
+        else:
+            print(f"♻️  Duplicate delivery of {message_sid} ignored")
 
-        except Exception as process_err:
-            print(f"❌ Processing error: {process_err}")
-            import traceback
-            traceback.print_exc()
-            
-            error_msg = "❌ Sorry, error processing your grievance. Please try again."
-            resp.message(error_msg)
-            return str(resp), 200
+        return str(resp), 200
 
     except Exception as e:
         print(f"❌ CRITICAL ERROR: {e}")
@@ -381,28 +1168,74 @@ How can I help you today?"""
         return str(resp), 200
 
 
+@app.route("/webhook/twilio/status", methods=["POST"])
+def twilio_status_callback():
+    """Delivery updates for messages sent with TWILIO_STATUS_CALLBACK_URL"""
+    if TWILIO_VALIDATE_SIGNATURE and not is_valid_twilio_request():
+        print("❌ Invalid Twilio signature on status callback")
+        return "Invalid signature", 403
+
+    sid = request.form.get("MessageSid")
+    delivery_status = request.form.get("MessageStatus")
+    if not sid or not delivery_status:
+        return "Missing MessageSid or MessageStatus", 400
+
+    error_code = request.form.get("ErrorCode")
+    notification_outbox.record_status(sid, delivery_status, error_code)
+    if delivery_status in ("failed", "undelivered"):
+        print(f"❌ WhatsApp {sid} {delivery_status} (error {error_code})")
+    return "", 204
+
+
 @app.route("/health", methods=["GET"])
 def health():
+    """Service state from cached probes and local counters; makes no outbound calls"""
+    dependencies = {"twilio": twilio_client.health(), "groq": groq_client.health()}
+    degraded = any(dep["configured"] and dep["ok"] is False for dep in dependencies.values())
     return jsonify({
-        "status": "ok",
+        "status": "degraded" if degraded else "ok",
         "time": datetime.now().isoformat(),
-        "twilio_configured": client is not None,
-        "account_sid": TWILIO_ACCOUNT_SID[:10] + "..." if TWILIO_ACCOUNT_SID else None
+        "twilio_configured": twilio_client.configured,
+        "dependencies": dependencies,
+        "account_sid": TWILIO_ACCOUNT_SID[:10] + "..." if TWILIO_ACCOUNT_SID else None,
+        "llm_cache": get_cache_stats(),
+        "llm_backend": get_backend_stats(),
+        "llm_scheduler": get_scheduler_stats(),
+        "model_cascade": get_cascade_stats(),
+        "image_cache": get_image_cache_stats(),
+        "job_queue": job_queue.counts(),
+        "notification_outbox": notification_outbox.counts(),
+        "grievance_store": grievance_store.stats(),
+        "duplicate_index": duplicate_index.stats(),
+        "geo_index": dict(geo_index.stats(), pincode_table=pincode_table.stats()),
+        "sessions": user_sessions.stats()
     })
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of the counters and histograms in metrics.py"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     os.makedirs("uploads", exist_ok=True)
     print("\n" + "="*70)
     print("🚀 FLASK SERVER STARTING")
     print("="*70)
-    print(f"🌐 Local: http://localhost:5000")
+    print(f"🌐 Local: http://{SERVER_HOST}:{SERVER_PORT}")
     print(f"📝 Grievance API: POST /process_grievance")
+    print(f"📦 Batch import: POST /process_grievances/batch")
     print(f"📱 WhatsApp Webhook: POST /webhook/whatsapp")
     print(f"🔍 Test Twilio: GET /test_twilio")
-    print(f"🔑 Twilio: {'✅ Configured' if client else '❌ Not Configured'}")
+    print(f"🔑 Twilio: {'✅ Configured' if twilio_client.configured else '❌ Not Configured'}")
     if TWILIO_ACCOUNT_SID:
         print(f"🆔 SID: {TWILIO_ACCOUNT_SID[:10]}...")
+    print(f"🐞 Debug: {'on' if FLASK_DEBUG else 'off'}")
+    print("   Production: gunicorn -c gunicorn.conf.py (SERVER_MODE=wsgi|asgi)")
     print("="*70 + "\n")
-    
-    app.run(debug=True, port=5000)
+
+    # With the debug reloader, only the child process serves requests
+    if not FLASK_DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    app.run(debug=FLASK_DEBUG, host=SERVER_HOST, port=SERVER_PORT)
@@ -0,0 +1,260 @@
+"""
+ASGI entry point for async serving (SERVER_MODE=asgi in gunicorn.conf.py).
+
+POST /process_grievance runs on the event loop: the AI stages await the
+provider instead of holding a thread each, and the WhatsApp confirmation
+is committed to the notification outbox with the grievance. Every other
+route is bridged to the Flask app in app.py, one worker thread per request.
+
+    uvicorn asgi_app:app
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import traceback
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.formparser import parse_form_data
+
+from app import (
+    app as flask_app,
+    build_grievance_payload,
+    queue_requested,
+    enqueue_grievance,
+    grievance_record,
+    grievance_response,
+    grievance_confirmation,
+    start_background_services
+)
+from grievance_service import aprocess_or_link, record_grievance
+from metrics import request_seconds
+
+MAX_CONTENT_LENGTH = flask_app.config["MAX_CONTENT_LENGTH"]
+
+# Request bodies above this many bytes are spooled to disk
+SPOOL_MAX_BYTES = int(os.getenv("ASGI_SPOOL_MAX_BYTES", str(1024 * 1024)))
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+# ------------------------
+# ASGI plumbing
+# ------------------------
+async def read_body(receive, max_bytes=None):
+    """Spools the request body; returns (file positioned at 0, length)"""
+    body = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    length = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            raise ConnectionResetError("Client disconnected")
+        chunk = message.get("body", b"")
+        length += len(chunk)
+        if max_bytes is not None and length > max_bytes:
+            body.close()
+            raise BodyTooLarge()
+        body.write(chunk)
+        more_body = message.get("more_body", False)
+    body.seek(0)
+    return body, length
+
+
+def wsgi_environ(scope, body, length):
+    """WSGI environ for an ASGI http scope"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries paths as latin-1 decoded bytes
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_json(send, body, status=200):
+    data = json.dumps(body).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(data)).encode()),
+            # Same policy as CORS(app) on the Flask side
+            (b"access-control-allow-origin", b"*"),
+        ]
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def bridge_to_wsgi(scope, receive, send):
+    """Runs one request through the Flask app in a worker thread, streaming its response"""
+    try:
+        body, length = await read_body(receive)
+    except ConnectionResetError:
+        return
+    environ = wsgi_environ(scope, body, length)
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        return lambda data: None
+
+    def next_chunk(iterator):
+        for chunk in iterator:
+            if chunk:
+                return chunk
+        return None
+
+    try:
+        result = await asyncio.to_thread(flask_app, environ, start_response)
+        iterator = iter(result)
+        try:
+            # SSE and send_file responses arrive chunk by chunk
+            chunk = await asyncio.to_thread(next_chunk, iterator)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            while chunk is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await asyncio.to_thread(next_chunk, iterator)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(result, "close", None)
+            if close:
+                await asyncio.to_thread(close)
+    finally:
+        body.close()
+
+
+# ------------------------
+# Native routes
+# ------------------------
+def parse_submission(scope, body, length):
+    """
+    Parses the multipart form and saves any image (blocking, run in a
+    thread). Returns (payload, error, queue).
+    """
+    environ = wsgi_environ(scope, body, length)
+    _, form, files = parse_form_data(environ, max_content_length=MAX_CONTENT_LENGTH)
+    args = MultiDict(parse_qsl(environ["QUERY_STRING"], keep_blank_values=True))
+    payload, error = build_grievance_payload(form, files)
+    return payload, error, payload is not None and queue_requested(form, args)
+
+
+async def process_grievance(scope, receive, send):
+    """POST /process_grievance, same request and response as the Flask route"""
+    started = time.perf_counter()
+    status = 200
+    try:
+        try:
+            body, length = await read_body(receive, MAX_CONTENT_LENGTH)
+        except BodyTooLarge:
+            status = 413
+            await send_json(send, {"status": "error", "message": "Request body too large"}, status)
+            return
+
+        try:
+            payload, error, queue = await asyncio.to_thread(parse_submission, scope, body, length)
+        finally:
+            body.close()
+        if error:
+            response, status = error
+            await send_json(send, response, status)
+            return
+
+        # Accept now, process in the background
+        if queue:
+            status = 202
+            await send_json(send, await asyncio.to_thread(enqueue_grievance, payload), status)
+            return
+
+        result = await aprocess_or_link(
+            payload["grievance_text"],
+            payload["location_data"],
+            image_path=payload.get("image_path"),
+            mode=payload.get("mode")
+        )
+        confirmation, whatsapp_error = grievance_confirmation(payload, result)
+        await asyncio.to_thread(
+            record_grievance, grievance_record(payload, result), [confirmation] if confirmation else None
+        )
+        await send_json(send, grievance_response(payload, result, confirmation is not None, whatsapp_error))
+
+    except ConnectionResetError:
+        status = 499
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        traceback.print_exc()
+        status = 500
+        await send_json(send, {"status": "error", "message": str(e)}, status)
+    finally:
+        request_seconds.observe(
+            time.perf_counter() - started,
+            endpoint="/process_grievance",
+            method="POST",
+            status=status
+        )
+
+
+NATIVE_ROUTES = {
+    ("POST", "/process_grievance"): process_grievance,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            os.makedirs("uploads", exist_ok=True)
+            # Loads the duplicate index from SQLite, so keep it off the loop
+            await asyncio.to_thread(start_background_services)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        # No websocket routes
+        return
+
+    handler = NATIVE_ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+    if handler:
+        await handler(scope, receive, send)
+    else:
+        await bridge_to_wsgi(scope, receive, send)
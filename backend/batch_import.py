@@ -0,0 +1,439 @@
+"""
+Batch Grievance Import
+Runs a JSONL or CSV dump of complaints through the AI pipeline
+
+Each record needs the complaint text (grievance_text / grievance / text /
+complaint / description) and may carry phone, city, state, area, place,
+pincode, specificLocation and an external id.
+
+Results are appended to the output JSONL as each record finishes, one
+line per input row. The output doubles as the checkpoint: re-running the
+same command skips every row already written. Just before a grievance is
+stored, a {"status": "pending"} line records its ID, so a row interrupted
+between storing and its result line is finished under the same ID
+instead of creating a second grievance.
+
+Usage:
+    python batch_import.py complaints.csv
+    python batch_import.py dump.jsonl --output results.jsonl --concurrency 8
+    python batch_import.py dump.jsonl --max-per-minute 120 --retry-failed
+"""
+
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from grievance_id import new_grievance_id
+from grievance_store import normalize_phone
+from grievance_service import grievance_store, process_or_link, record_grievance, start_services
+from llm_scheduler import llm_lane, BATCH
+
+BATCH_DIR = os.getenv("BATCH_DIR", "batches")
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+# Records processed at once; each record runs its own stages concurrently
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Upper bound on records started per minute (0 = unlimited)
+BATCH_MAX_PER_MINUTE = float(os.getenv("BATCH_MAX_PER_MINUTE", "0"))
+# Attempts per record while its AI stages keep failing (rate limits, timeouts)
+BATCH_RECORD_ATTEMPTS = int(os.getenv("BATCH_RECORD_ATTEMPTS", "3"))
+BATCH_BACKOFF_SECONDS = float(os.getenv("BATCH_BACKOFF_SECONDS", "5"))
+BATCH_MAX_BACKOFF_SECONDS = 60.0
+PROGRESS_INTERVAL = 10.0
+
+FORMATS = ("jsonl", "csv")
+
+TEXT_FIELDS = ("grievance_text", "grievance", "text", "complaint", "description")
+PHONE_FIELDS = ("phone", "phone_number", "mobile")
+ID_FIELDS = ("external_id", "id", "complaint_id", "reference")
+LOCATION_FIELDS = ("city", "state", "area", "place", "pincode", "specificLocation")
+
+
+# ------------------------
+# Input
+# ------------------------
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    with open(path, encoding="utf-8-sig") as f:
+        first = f.readline().lstrip()
+    return "jsonl" if first.startswith("{") else "csv"
+
+
+def iter_records(path, fmt=None):
+    """
+    Yields (row, record) one at a time without loading the file. Rows are
+    numbered from 1 over non-blank records; a JSONL line that doesn't
+    parse yields {"_error": ...} so it is reported, not silently dropped.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for row, record in enumerate(csv.DictReader(f), start=1):
+                yield row, record
+            return
+
+        row = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {"_error": f"Invalid JSON: {e}"}
+            if not isinstance(record, dict):
+                record = {"_error": "Record is not a JSON object"}
+            yield row, record
+
+
+def _first(record, fields):
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+def parse_record(record):
+    """Returns (grievance_text, location_data, phone, external_id). Raises ValueError."""
+    if "_error" in record:
+        raise ValueError(record["_error"])
+    grievance_text = _first(record, TEXT_FIELDS)
+    if not grievance_text:
+        raise ValueError("Grievance text is required")
+
+    # Nested {"location": {...}} or flat columns
+    source = record.get("location") if isinstance(record.get("location"), dict) else record
+    location_data = {field: str(source.get(field) or "").strip() for field in LOCATION_FIELDS}
+
+    phone = _first(record, PHONE_FIELDS)
+    return grievance_text, location_data, normalize_phone(phone) if phone else "", _first(record, ID_FIELDS) or None
+
+
+def save_batch_upload(stream, filename, dest_dir=BATCH_DIR, max_bytes=BATCH_MAX_BYTES):
+    """
+    Streams an uploaded dump to dest_dir, named after its SHA-256 so the
+    same file uploaded twice maps to the same batch.
+
+    Returns {"path", "size", "sha256", "format"}. Raises ValueError past max_bytes.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: stream.read(64 * 1024), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Batch file exceeds {max_bytes / (1024 * 1024):.1f} MB limit")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    extension = os.path.splitext(filename or "")[1].lower()
+    fmt = "csv" if extension == ".csv" else "jsonl" if extension in (".jsonl", ".ndjson", ".json") else None
+    path = os.path.join(dest_dir, f"{sha256[:32]}{extension or '.dat'}")
+    os.replace(tmp_path, path)
+    return {"path": path, "size": size, "sha256": sha256, "format": fmt or detect_format(path)}
+
+
+# ------------------------
+# Output / checkpoint
+# ------------------------
+def load_completed(output_path, retry_failed=False):
+    """
+    Reads the output once. Returns (completed rows, {row: grievance_id}
+    of rows left pending, {"ok", "errors", "degraded"} over the completed
+    rows, a retried row counting once). A line cut short by a crash is
+    truncated away so appends start on a clean line.
+    """
+    latest = {}
+    pending = {}
+    if os.path.exists(output_path):
+        with open(output_path, "rb+") as f:
+            good_until = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    break
+                good_until += len(line)
+                if result.get("status") == "pending":
+                    pending[result["row"]] = result["grievance_id"]
+                else:
+                    latest[result["row"]] = (result.get("status"), bool(result.get("degraded_stages")))
+            f.truncate(good_until)
+
+    completed = set()
+    counts = {"ok": 0, "errors": 0, "degraded": 0}
+    for row, (status, degraded) in latest.items():
+        if status == "ok":
+            counts["ok"] += 1
+            counts["degraded"] += degraded
+        elif retry_failed:
+            continue
+        else:
+            counts["errors"] += 1
+        completed.add(row)
+        pending.pop(row, None)
+    return completed, pending, counts
+
+
+# ------------------------
+# Processing
+# ------------------------
+class _Throttle:
+    """
+    Paces record starts to max_per_minute and pauses everyone when the
+    AI stages start failing, which under load almost always means the
+    provider is rate limiting us. The pause doubles while failures
+    continue and resets on the first clean record.
+    """
+
+    def __init__(self, max_per_minute=0):
+        self.interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._backoff = BATCH_BACKOFF_SECONDS
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def penalize(self):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + self._backoff)
+            print(f"⏳ AI stages failing - pausing batch for {self._backoff:.0f}s")
+            self._backoff = min(self._backoff * 2, BATCH_MAX_BACKOFF_SECONDS)
+
+    def reset(self):
+        with self._lock:
+            self._backoff = BATCH_BACKOFF_SECONDS
+
+
+def resumed_line(row, grievance, external_id):
+    """Output line for a row whose grievance was stored before an interruption"""
+    return {
+        "row": row,
+        "status": "ok",
+        "external_id": external_id,
+        "grievance_id": grievance["grievance_id"],
+        "department": grievance["department"],
+        "priority": grievance["priority"],
+        "cluster_id": grievance["cluster_id"],
+        "duplicate_similarity": None,
+        "pipeline_mode": "resumed",
+        "degraded_stages": [],
+        "structured": grievance["structured"]
+    }
+
+
+def process_record(row, record, throttle, mode=None, checkpoint=None, grievance_id=None):
+    """
+    Runs one record through the pipeline and stores it. Returns the output line.
+    checkpoint(line) writes the pending line; grievance_id is the ID a
+    previous, interrupted run already gave this row.
+    """
+    try:
+        grievance_text, location_data, phone, external_id = parse_record(record)
+    except ValueError as e:
+        return {"row": row, "status": "error", "error": str(e)}
+
+    if grievance_id:
+        stored = grievance_store.get(grievance_id)
+        if stored:
+            return resumed_line(row, stored, external_id)
+    else:
+        grievance_id = new_grievance_id()
+
+    for attempt in range(1, BATCH_RECORD_ATTEMPTS + 1):
+        throttle.wait()
+        # Interactive submissions get provider capacity ahead of imports
+        with llm_lane(BATCH):
+            result = process_or_link(grievance_text, location_data, mode=mode)
+        degraded = sorted(name for name, stage in result["stages"].items() if stage["outcome"] != "ok")
+        if not degraded:
+            throttle.reset()
+            break
+        throttle.penalize()
+        if attempt < BATCH_RECORD_ATTEMPTS:
+            print(f"🔁 Row {row}: stages {degraded} failed, retrying (attempt {attempt + 1})")
+
+    if checkpoint:
+        checkpoint({"row": row, "status": "pending", "grievance_id": grievance_id})
+    record_grievance({
+        "grievance_id": grievance_id,
+        "phone": phone,
+        "source": "batch",
+        "grievance_text": grievance_text,
+        "structured": result["structured"],
+        "department": result["department"],
+        "priority": result["priority"],
+        "location": location_data,
+        "image_analysis": None,
+        "cluster_id": result["cluster_id"]
+    })
+
+    return {
+        "row": row,
+        "status": "ok",
+        "external_id": external_id,
+        "grievance_id": grievance_id,
+        "department": result["department"],
+        "priority": result["priority"],
+        "cluster_id": result["cluster_id"] or grievance_id,
+        "duplicate_similarity": result["similarity"],
+        "pipeline_mode": result["mode"],
+        "degraded_stages": degraded,
+        "structured": result["structured"]
+    }
+
+
+def run_batch(input_path, output_path, fmt=None, concurrency=BATCH_CONCURRENCY,
+              max_per_minute=BATCH_MAX_PER_MINUTE, mode=None, retry_failed=False,
+              limit=None, progress=None):
+    """
+    Processes every record of input_path not yet in output_path.
+
+    At most `concurrency` records are in flight and at most twice that
+    many are read ahead, so memory stays flat for any file size.
+    progress(summary), if given, is called every few seconds from the
+    calling thread.
+
+    Returns a summary dict.
+    """
+    completed, pending, counts = load_completed(output_path, retry_failed)
+    throttle = _Throttle(max_per_minute)
+    slots = threading.Semaphore(concurrency * 2)
+    write_lock = threading.Lock()
+    # ok / errors / degraded cover every row of the output, including
+    # earlier runs; processed counts this run only
+    summary = {
+        "input": input_path,
+        "output": output_path,
+        "resumed_rows": len(completed),
+        "processed": 0,
+        **counts
+    }
+    started = time.monotonic()
+    last_progress = started
+
+    if completed:
+        print(f"↩️ Resuming batch - {len(completed)} rows already in {output_path}")
+
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+
+        def write(line):
+            with write_lock:
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                out.flush()
+
+        def work(row, record):
+            try:
+                try:
+                    line = process_record(row, record, throttle, mode, write, pending.get(row))
+                    if line["status"] == "ok":
+                        # The result line must not claim a grievance that is still buffered
+                        grievance_store.flush()
+                except Exception as e:
+                    print(f"❌ Row {row} failed: {e}")
+                    line = {"row": row, "status": "error", "error": str(e)}
+                with write_lock:
+                    out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    out.flush()
+                    summary["processed"] += 1
+                    if line["status"] == "ok":
+                        summary["ok"] += 1
+                        summary["degraded"] += bool(line["degraded_stages"])
+                    else:
+                        summary["errors"] += 1
+            finally:
+                slots.release()
+
+        submitted = 0
+        for row, record in iter_records(input_path, fmt):
+            if row in completed:
+                continue
+            if limit is not None and submitted >= limit:
+                break
+            # Blocks while the read-ahead window is full; wakes up
+            # periodically so progress keeps being reported
+            while not slots.acquire(timeout=PROGRESS_INTERVAL):
+                if progress:
+                    progress(dict(summary))
+            pool.submit(work, row, record)
+            submitted += 1
+
+            if progress and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                progress(dict(summary))
+
+    summary["seconds"] = round(time.monotonic() - started, 1)
+    print(f"✅ Batch done: {summary['ok']} ok, {summary['errors']} errors, "
+          f"{summary['degraded']} degraded in {summary['seconds']}s")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file")
+    parser.add_argument("--output", help="results JSONL (default: <input file>.results.jsonl)")
+    parser.add_argument("--format", choices=FORMATS, help="override detection by extension")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--max-per-minute", type=float, default=BATCH_MAX_PER_MINUTE,
+                        help="records started per minute, 0 for no limit")
+    parser.add_argument("--mode", choices=("sequential", "fused"), help="pipeline mode")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run rows that errored last time")
+    parser.add_argument("--limit", type=int, help="stop after this many new rows")
+    args = parser.parse_args()
+
+    output = args.output or args.input + ".results.jsonl"
+    start_services()
+
+    def report(summary):
+        print(f"📊 {summary['processed']} processed ({summary['ok']} ok, {summary['errors']} errors)")
+
+    run_batch(
+        args.input,
+        output,
+        fmt=args.format,
+        concurrency=args.concurrency,
+        max_per_minute=args.max_per_minute,
+        mode=args.mode,
+        retry_failed=args.retry_failed,
+        limit=args.limit,
+        progress=report
+    )
+
+    grievance_store.flush()
+    print(f"📄 Results: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,775 @@
+"""
+Load Benchmark
+Drives the Flask app with a realistic request mix and reports throughput,
+p50/p95/p99 latency, CPU and memory per request. The LLM runs on the
+fake backend and Twilio on a stub, both with configurable latency, so no
+network access is needed. Results are saved as JSON tagged with the git
+commit, for comparing runs across commits.
+
+Usage:
+    python benchmark_load.py                                  # test client, 60s
+    python benchmark_load.py --server wsgi --concurrency 32   # real threaded WSGI server
+    python benchmark_load.py --mix text=1,status=3 --requests 500
+    python benchmark_load.py --llm-latency fixed:50 --twilio-latency fixed:80
+    python benchmark_load.py --memory --profile               # tracemalloc pass + CPU profile
+    python benchmark_load.py --compare benchmarks/load-....json
+
+Scenarios (--mix name=weight,...):
+    text             POST /process_grievance, text only (sync pipeline)
+    image            POST /process_grievance with a photo
+    whatsapp         POST /webhook/whatsapp, text message
+    whatsapp_media   POST /webhook/whatsapp with a photo served by a local media server
+    status           GET /grievance/<id>/status for a grievance created earlier
+    whatsapp_status  POST /webhook/whatsapp asking for a grievance ID's status
+
+WhatsApp messages are acknowledged at once and processed by the job
+queue; the run waits for the queue to drain and reports job latency
+separately from the webhook's.
+
+--profile runs cProfile in every thread (started before the app is
+imported) and slows requests down, so compare latency only between runs
+with the same flags.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import contextlib
+from datetime import datetime
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+BLUE = '\033[94m'
+RESET = '\033[0m'
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+SCENARIOS = ("text", "image", "whatsapp", "whatsapp_media", "status", "whatsapp_status")
+DEFAULT_MIX = "text=40,image=15,whatsapp=20,whatsapp_media=10,status=10,whatsapp_status=5"
+
+
+def say(*args):
+    """Harness output; app logging is redirected while it runs"""
+    print(*args, file=sys.__stdout__, flush=True)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("Mix needs at least one scenario with a positive weight")
+    return mix
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(seconds):
+    values = sorted(seconds)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "mean": round(sum(values) / len(values) * 1000, 1),
+        "max": round(values[-1] * 1000, 1)
+    }
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except Exception:
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "branch": git("rev-parse", "--abbrev-ref", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))
+    }
+
+
+def current_rss_kb():
+    """Resident set size right now (Linux), else the peak so far"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ------------------------
+# Stubs
+# ------------------------
+class StubTwilio:
+    """Stands in for twilio.rest.Client: messages.create() sleeps and succeeds"""
+
+    def __init__(self, latency):
+        from llm_backends import parse_latency
+        self.latency = parse_latency(latency)
+        self.messages = self
+        self.sent = 0
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def create(self, from_=None, to=None, body=None, **kwargs):
+        from llm_backends import sample_latency
+        with self._lock:
+            self.sent += 1
+            delay = sample_latency(self.latency, self._random)
+            sid = f"SMbenchmark{self.sent:021d}"
+        time.sleep(delay)
+        return SimpleNamespace(sid=sid, status="queued")
+
+
+def make_images(count, seed):
+    """Distinct phone-camera-sized JPEGs, so the image cache doesn't answer every request"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    images = []
+    rng = random.Random(seed)
+    for _ in range(count):
+        noise = Image.merge("RGB", [Image.effect_noise((1280, 960), rng.uniform(20, 80)) for _ in range(3)])
+        tint = Image.new("RGB", noise.size, tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        Image.blend(noise, tint, 0.5).save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def start_media_server(images, latency):
+    """Serves /media/<n>.jpg like Twilio's media URLs, with a delay before each response"""
+    from llm_backends import parse_latency, sample_latency
+    spec = parse_latency(latency)
+
+    class MediaHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                index = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                body = images[index % len(images)]
+            except (ValueError, ZeroDivisionError):
+                self.send_error(404)
+                return
+            time.sleep(sample_latency(spec))
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/media"
+
+
+# Idle threads spend their time here; left out of the top lists (not the .prof file)
+BLOCKING_CALLS = ("_thread.lock", "_queue.SimpleQueue", "time.sleep", "select.", "recv_into", "accept")
+
+
+class ThreadProfiles:
+    """
+    cProfile for every thread: each new thread enables its own profiler on
+    its first event. Must be installed before the app starts its worker
+    threads and pools.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def _start_thread(self, frame, event, arg):
+        import cProfile
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def install(self):
+        import cProfile
+        threading.setprofile(self._start_thread)
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def report(self, path, top=25):
+        import pstats
+        threading.setprofile(None)
+        with self._lock:
+            profiles = list(self.profiles)
+        for profile in profiles:
+            profile.create_stats()
+        profiles = [profile for profile in profiles if profile.stats]
+        if not profiles:
+            return None
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(path)
+
+        def rows(key):
+            entries = sorted(
+                (item for item in stats.stats.items() if not any(wait in item[0][2] for wait in BLOCKING_CALLS)),
+                key=lambda item: item[1][key], reverse=True
+            )[:top]
+            return [
+                {
+                    "function": f"{os.path.relpath(file) if file.startswith(BACKEND_DIR) else file}:{line}({name})",
+                    "calls": nc,
+                    "tottime_ms": round(tt * 1000, 1),
+                    "cumtime_ms": round(ct * 1000, 1)
+                }
+                for (file, line, name), (cc, nc, tt, ct, callers) in entries
+            ]
+
+        return {"file": path, "threads": len(profiles), "top_self": rows(2), "top_cumulative": rows(3)}
+
+
+# ------------------------
+# Drivers
+# ------------------------
+class TestClientDriver:
+    """In-process through Flask's test client (no sockets)"""
+
+    name = "test-client"
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        return self.app.test_client()
+
+    def request(self, session, method, path, data=None, files=None):
+        form = dict(data or {})
+        for field, (filename, content, _) in (files or {}).items():
+            form[field] = (io.BytesIO(content), filename)
+        response = session.open(path, method=method, data=form or None)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class WSGIDriver:
+    """Real sockets against werkzeug's threaded server, one keep-alive session per worker"""
+
+    name = "wsgi"
+
+    def __init__(self, app):
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, name="wsgi-server", daemon=True).start()
+
+    def session(self):
+        import requests
+        return requests.Session()
+
+    def request(self, session, method, path, data=None, files=None):
+        response = session.request(method, self.base_url + path, data=data, files=files, timeout=120)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ------------------------
+# Workload
+# ------------------------
+class Workload:
+    """Builds requests for each scenario from the grievance corpus"""
+
+    def __init__(self, images, media_url, duplicate_share):
+        from grievance_corpus import all_grievances
+        self.corpus = [(text, location) for text, location, _, _ in all_grievances()]
+        self.images = images
+        self.media_url = media_url
+        self.duplicate_share = duplicate_share
+        self.grievance_ids = []
+        self.whatsapp_senders = []
+        self._message_seq = 0
+        self._lock = threading.Lock()
+
+    def _grievance(self, rng):
+        text, location = rng.choice(self.corpus)
+        location = dict(location or {})
+        if rng.random() >= self.duplicate_share:
+            # A fresh pincode puts it in its own duplicate-detection partition
+            location["pincode"] = str(rng.randint(110001, 855117))
+        return text, location
+
+    def _message_sid(self):
+        with self._lock:
+            self._message_seq += 1
+            return f"SMload{os.getpid()}x{self._message_seq:012d}"
+
+    def _known_id(self, rng):
+        with self._lock:
+            return rng.choice(self.grievance_ids) if self.grievance_ids else None
+
+    def remember(self, scenario, data, body):
+        with self._lock:
+            if isinstance(body, dict) and body.get("grievance_id"):
+                self.grievance_ids.append(body["grievance_id"])
+            if scenario.startswith("whatsapp") and data and len(self.whatsapp_senders) < 1000:
+                self.whatsapp_senders.append(data["From"])
+
+    def build(self, scenario, rng):
+        """(method, path, form data, files) for one request"""
+        phone = f"+9198{rng.randrange(10 ** 8):08d}"
+
+        if scenario in ("text", "image"):
+            text, location = self._grievance(rng)
+            data = {"grievance_text": text, "phone": phone, **location}
+            files = None
+            if scenario == "image" and self.images:
+                files = {"image": ("photo.jpg", rng.choice(self.images), "image/jpeg")}
+            return "POST", "/process_grievance", data, files
+
+        if scenario in ("whatsapp", "whatsapp_media"):
+            text, _ = self._grievance(rng)
+            data = {"From": f"whatsapp:{phone}", "Body": text, "MessageSid": self._message_sid(), "NumMedia": "0"}
+            if scenario == "whatsapp_media" and self.media_url:
+                data.update({
+                    "NumMedia": "1",
+                    "MediaUrl0": f"{self.media_url}/{rng.randrange(len(self.images))}.jpg",
+                    "MediaContentType0": "image/jpeg"
+                })
+            return "POST", "/webhook/whatsapp", data, None
+
+        grievance_id = self._known_id(rng)
+        if scenario == "status":
+            return "GET", f"/grievance/{grievance_id or 'GRV00000000000000'}/status", None, None
+
+        with self._lock:
+            sender = rng.choice(self.whatsapp_senders) if self.whatsapp_senders else f"whatsapp:{phone}"
+        return "POST", "/webhook/whatsapp", {
+            "From": sender,
+            "Body": grievance_id or "status",
+            "MessageSid": self._message_sid(),
+            "NumMedia": "0"
+        }, None
+
+
+def is_ok(scenario, status, body):
+    if status >= 400 and not (scenario == "status" and status == 404):
+        return False
+    if scenario in ("text", "image"):
+        return isinstance(body, dict) and body.get("status") == "success"
+    return True
+
+
+def run_load(driver, workload, mix, concurrency, duration, total_requests, seed, warmup=False):
+    """
+    Closed loop: each worker sends its next request as soon as the last
+    one is answered. Stops after `duration` seconds or `total_requests`.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = []
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_slot():
+        with lock:
+            if total_requests and issued[0] >= total_requests:
+                return False
+            if deadline and time.perf_counter() >= deadline:
+                return False
+            issued[0] += 1
+            return True
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = driver.session()
+        while next_slot():
+            scenario = rng.choices(names, weights)[0]
+            method, path, data, files = workload.build(scenario, rng)
+            started = time.perf_counter()
+            try:
+                status, body = driver.request(session, method, path, data, files)
+                error = None if is_ok(scenario, status, body) else f"HTTP {status}"
+            except Exception as e:
+                status, body, error = None, None, type(e).__name__
+            elapsed = time.perf_counter() - started
+            if error is None:
+                workload.remember(scenario, data, body)
+            with lock:
+                samples.append((scenario, elapsed, status, error))
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"load-{i}") for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    def block(entries):
+        errors = {}
+        codes = {}
+        for _, _, status, error in entries:
+            codes[str(status)] = codes.get(str(status), 0) + 1
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+        return {
+            "requests": len(entries),
+            "errors": sum(errors.values()),
+            "errors_by_type": errors,
+            "status_codes": codes,
+            "throughput_rps": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": latency_summary([seconds for _, seconds, _, _ in entries])
+        }
+
+    scenarios = {}
+    for entry in samples:
+        scenarios.setdefault(entry[0], []).append(entry)
+    return block(samples), {name: block(entries) for name, entries in sorted(scenarios.items())}
+
+
+def wait_for_jobs(job_queue, timeout):
+    """Seconds until no job is queued or running (None on timeout)"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        counts = job_queue.counts()
+        if not counts.get("queued") and not counts.get("running"):
+            return time.perf_counter() - started
+        time.sleep(0.2)
+    return None
+
+
+def job_report(job_queue, since):
+    """End-to-end WhatsApp processing: enqueue to done, from the job table"""
+    conn = sqlite3.connect(job_queue.path, timeout=10)
+    try:
+        rows = conn.execute(
+            "SELECT status, created_at, updated_at FROM jobs WHERE kind = 'whatsapp' AND created_at >= ?",
+            (since,)
+        ).fetchall()
+    finally:
+        conn.close()
+    done = [updated - created for status, created, updated in rows if status == "done"]
+    return {
+        "jobs": len(rows),
+        "done": len(done),
+        "failed": sum(1 for status, _, _ in rows if status == "failed"),
+        "pending": sum(1 for status, _, _ in rows if status in ("queued", "running")),
+        "latency_ms": latency_summary(done)
+    }
+
+
+def measure_memory(driver, workload, mix, samples, seed, job_queue):
+    """
+    Sequential requests per scenario under tracemalloc: peak traced
+    allocation while the request (and for WhatsApp, its job) runs, and
+    what is still allocated afterwards. Uses the test client whatever
+    the server, since werkzeug's socket handling alone peaks at ~10 MB
+    per request and would drown out the app.
+    """
+    import tracemalloc
+    tracemalloc.start()
+    session = driver.session()
+    rng = random.Random(seed)
+    report = {}
+    try:
+        for scenario in mix:
+            peaks = []
+            retained = []
+            for _ in range(samples):
+                method, path, data, files = workload.build(scenario, rng)
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                driver.request(session, method, path, data, files)
+                if scenario.startswith("whatsapp"):
+                    wait_for_jobs(job_queue, 60)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+            peaks.sort()
+            report[scenario] = {
+                "samples": samples,
+                "peak_kb_p50": round(percentile(peaks, 50) / 1024, 1),
+                "peak_kb_max": round(peaks[-1] / 1024, 1),
+                "retained_kb_mean": round(sum(retained) / len(retained) / 1024, 1)
+            }
+    finally:
+        tracemalloc.stop()
+    return report
+
+
+# ------------------------
+# Reporting
+# ------------------------
+def print_block(title, block):
+    latency = block["latency_ms"]
+    color = GREEN if not block["errors"] else RED
+    say(f"  {title:<16} {block['requests']:>7} req  {block['throughput_rps']:>8.2f} rps  "
+        f"p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  p99 {latency['p99']:>8.1f} ms  "
+        f"{color}{block['errors']} errors{RESET}")
+
+
+def compare(result, baseline_path, threshold):
+    """Prints throughput / p95 changes against a saved run. Returns True on a regression."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    say(f"\n{YELLOW}Compared with {baseline_path} ({(baseline.get('git') or {}).get('commit', '?')[:10]}){RESET}")
+    regressed = False
+    rows = [("total", result["summary"], baseline.get("summary", {}))]
+    rows += [(name, block, baseline.get("scenarios", {}).get(name)) for name, block in result["scenarios"].items()]
+    for name, block, old in rows:
+        if not old:
+            continue
+        line = f"  {name:<16}"
+        for label, new_value, old_value, higher_is_better in (
+            ("rps", block["throughput_rps"], old["throughput_rps"], True),
+            ("p95", block["latency_ms"]["p95"], old["latency_ms"]["p95"], False)
+        ):
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            worse = change < -threshold if higher_is_better else change > threshold
+            regressed = regressed or worse
+            color = RED if worse else GREEN if abs(change) > threshold else ""
+            line += f"  {label} {old_value:>8} → {new_value:>8} {color}({change:+.1%}){RESET}"
+        say(line)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("test-client", "wsgi"), default="test-client")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"default {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--warmup", type=int, default=20, help="requests before measuring")
+    parser.add_argument("--llm-latency", default="lognormal:300:0.5", help="fake LLM latency spec, see llm_backends")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--twilio-latency", default="lognormal:250:0.3")
+    parser.add_argument("--media-latency", default="lognormal:150:0.3", help="Twilio media download delay")
+    parser.add_argument("--duplicate-share", type=float, default=0.2,
+                        help="share of submissions that may be linked to an earlier duplicate")
+    parser.add_argument("--images", type=int, default=8, help="distinct photos in the pool")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="tracemalloc pass after the load run")
+    parser.add_argument("--memory-samples", type=int, default=10, help="requests per scenario in the memory pass")
+    parser.add_argument("--profile", action="store_true", help="cProfile all threads during the load run")
+    parser.add_argument("--drain-timeout", type=float, default=300, help="seconds to wait for queued WhatsApp jobs")
+    parser.add_argument("--output", help="results file (default benchmarks/load-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10)
+    parser.add_argument("--workdir", help="where the app keeps its databases and uploads (default: a temp dir)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own logging")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="nyaya-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY": args.llm_latency,
+        "LLM_FAKE_ERROR_RATE": str(args.llm_error_rate),
+        "GRIEVANCE_DB": os.path.join(workdir, "grievances.db"),
+        "JOB_QUEUE_DB": os.path.join(workdir, "jobs.db"),
+        "LLM_CACHE_DB": os.path.join(workdir, "llm_cache.db"),
+        "BATCH_DIR": os.path.join(workdir, "batches"),
+        "TWILIO_ACCOUNT_SID": "",
+        "TWILIO_AUTH_TOKEN": "",
+        "TWILIO_VALIDATE_SIGNATURE": "false",
+        "PROCESSING_MODE": "sync",
+        "SESSION_DB": os.path.join(workdir, "sessions.db"),
+        # One message per grievance, so each WhatsApp request runs the pipeline
+        "WHATSAPP_INTAKE": "direct"
+    })
+    # Provider limits would measure the throttle, not the app
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(workdir)
+
+    images = make_images(args.images, args.seed) if {"image", "whatsapp_media"} & set(args.mix) else []
+    profiles = ThreadProfiles() if args.profile else None
+    if profiles:
+        profiles.install()
+
+    app_log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with app_log:
+        import app as app_module
+        import ai_service
+        from clients import twilio_client
+
+        twilio = StubTwilio(args.twilio_latency)
+        twilio_client.set(twilio)
+        app_module.start_background_services()
+
+        mix = dict(args.mix)
+        if not images:
+            for scenario in ("image", "whatsapp_media"):
+                if mix.pop(scenario, None):
+                    say(f"{YELLOW}⚠️  Pillow not installed - skipping the {scenario} scenario{RESET}")
+        if not mix:
+            say(f"{RED}Nothing left to run{RESET}")
+            return 1
+
+        media_server, media_url = start_media_server(images, args.media_latency) if images else (None, None)
+        workload = Workload(images, media_url, args.duplicate_share)
+        driver = WSGIDriver(app_module.app) if args.server == "wsgi" else TestClientDriver(app_module.app)
+
+        say(f"\n{YELLOW}{'='*80}")
+        say(f"LOAD BENCHMARK - {driver.name}, {args.concurrency} workers, "
+            f"{args.requests or f'{args.duration:g}s'}, LLM {args.llm_latency}")
+        say(f"mix: {', '.join(f'{name}={weight:g}' for name, weight in mix.items())}")
+        say(f"workdir: {workdir}")
+        say(f"{'='*80}{RESET}")
+
+        # Warm-up also seeds grievance IDs for the status scenarios
+        if args.warmup:
+            warmup_mix = {name: weight for name, weight in mix.items() if name in ("text", "whatsapp")} or mix
+            run_load(driver, workload, warmup_mix, min(args.concurrency, 4), 0, args.warmup, args.seed + 1)
+            wait_for_jobs(app_module.job_queue, args.drain_timeout)
+
+        measure_since = time.time()
+        cpu_before = time.process_time()
+        rss_before = current_rss_kb()
+        samples, elapsed = run_load(driver, workload, mix, args.concurrency,
+                                    0 if args.requests else args.duration, args.requests, args.seed)
+        cpu_seconds = time.process_time() - cpu_before
+        rss_after = current_rss_kb()
+
+        drain_seconds = wait_for_jobs(app_module.job_queue, args.drain_timeout)
+        jobs = job_report(app_module.job_queue, measure_since)
+        profile = profiles.report(os.path.join(workdir, "load.prof")) if profiles else None
+        memory = measure_memory(TestClientDriver(app_module.app), workload, mix, args.memory_samples, args.seed + 2,
+                                app_module.job_queue) if args.memory else None
+        health = {
+            "llm_backend": ai_service.get_backend_stats(),
+            "llm_scheduler": ai_service.get_scheduler_stats(),
+            "model_cascade": ai_service.get_cascade_stats(),
+            "llm_cache": ai_service.get_cache_stats(),
+            "image_cache": ai_service.get_image_cache_stats(),
+            "duplicate_index": app_module.duplicate_index.stats(),
+            "twilio_messages": twilio.sent
+        }
+        driver.close()
+        if media_server:
+            media_server.shutdown()
+
+    summary, scenarios = summarize(samples, elapsed)
+    summary.update({
+        "duration_s": round(elapsed, 2),
+        "cpu_ms_per_request": round(cpu_seconds * 1000 / len(samples), 2) if samples else 0.0,
+        "rss_before_mb": round(rss_before / 1024, 1),
+        "rss_after_mb": round(rss_after / 1024, 1),
+        "rss_growth_kb_per_request": round((rss_after - rss_before) / len(samples), 1) if samples else 0.0
+    })
+    git = git_info()
+    result = {
+        "benchmark": "load",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": git,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "server": driver.name,
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "duration": None if args.requests else args.duration,
+            "requests": args.requests or None,
+            "warmup": args.warmup,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "twilio_latency": args.twilio_latency,
+            "media_latency": args.media_latency,
+            "duplicate_share": args.duplicate_share,
+            "images": len(images),
+            "seed": args.seed,
+            "profiled": bool(profiles),
+            "env": {name: os.environ[name] for name in sorted(os.environ)
+                    if name.startswith(("LLM_", "PIPELINE_", "JOB_WORKERS", "DEDUPE_", "STAGE_TIMEOUT_"))
+                    and "KEY" not in name}
+        },
+        "summary": summary,
+        "scenarios": scenarios,
+        "whatsapp_jobs": {**jobs, "drain_seconds": round(drain_seconds, 2) if drain_seconds is not None else None},
+        "memory": memory,
+        "profile": profile,
+        "app": health
+    }
+
+    say(f"\n{BLUE}Results ({summary['duration_s']}s, {summary['cpu_ms_per_request']} ms CPU/request, "
+        f"RSS {summary['rss_before_mb']} → {summary['rss_after_mb']} MB){RESET}")
+    print_block("total", summary)
+    for name, block in scenarios.items():
+        print_block(name, block)
+    if jobs["jobs"]:
+        latency = jobs["latency_ms"]
+        say(f"  {'whatsapp jobs':<16} {jobs['done']:>7} done ({jobs['failed']} failed, {jobs['pending']} pending)  "
+            f"p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f} ms end to end")
+    if memory:
+        say(f"\n{BLUE}Memory per request (tracemalloc){RESET}")
+        for name, entry in memory.items():
+            say(f"  {name:<16} peak p50 {entry['peak_kb_p50']:>9.1f} KB  max {entry['peak_kb_max']:>9.1f} KB  "
+                f"retained {entry['retained_kb_mean']:>8.1f} KB")
+    if profile:
+        say(f"\n{BLUE}Top functions by own time ({profile['threads']} threads, {profile['file']}){RESET}")
+        for row in profile["top_self"][:15]:
+            say(f"  {row['tottime_ms']:>10.1f} ms  {row['calls']:>9}  {row['function']}")
+
+    output = output or os.path.join(
+        RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}-{(git['commit'] or 'nogit')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    say(f"\n💾 Saved {output}")
+
+    if baseline and compare(result, baseline, args.regression_threshold):
+        say(f"{RED}❌ Regression beyond {args.regression_threshold:.0%}{RESET}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
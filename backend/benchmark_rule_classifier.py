@@ -0,0 +1,97 @@
+"""
+Rule Classifier Benchmark
+Compares the keyword pre-classifier with the LLM on the test corpus
+
+Usage:
+    python benchmark_rule_classifier.py              # rules vs live LLM
+    python benchmark_rule_classifier.py --rules-only # no network calls
+    python benchmark_rule_classifier.py --threshold 0.6
+"""
+
+import argparse
+import time
+
+from grievance_corpus import all_grievances
+from rule_classifier import classify_department_rules, assign_priority_rules, RULE_CONFIDENCE_THRESHOLD
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+BLUE = '\033[94m'
+RESET = '\033[0m'
+
+
+def pct(part, whole):
+    return f"{(part / whole) * 100:.1f}%" if whole else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=RULE_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--rules-only", action="store_true", help="skip the LLM comparison")
+    args = parser.parse_args()
+
+    if not args.rules_only:
+        from ai_service import classify_department, assign_priority
+
+    tasks = {
+        "department": {"rules": classify_department_rules, "covered": 0, "agree": 0, "expected": 0, "correct": 0,
+                       "rule_seconds": 0.0, "llm_seconds": 0.0},
+        "priority": {"rules": assign_priority_rules, "covered": 0, "agree": 0, "expected": 0, "correct": 0,
+                     "rule_seconds": 0.0, "llm_seconds": 0.0},
+    }
+
+    corpus = list(all_grievances())
+    print(f"\n{YELLOW}{'='*80}")
+    print(f"RULE CLASSIFIER BENCHMARK - {len(corpus)} grievances, threshold {args.threshold}")
+    print(f"{'='*80}{RESET}")
+
+    for text, location, expected_dept, expected_priority in corpus:
+        print(f"\n{BLUE}{text}{RESET}")
+        for name, task in tasks.items():
+            started = time.perf_counter()
+            label, confidence, terms = task["rules"](text)
+            task["rule_seconds"] += time.perf_counter() - started
+            confident = label is not None and confidence >= args.threshold
+            line = f"  {name:<10} rules: {label or '-':<15} conf {confidence:<5}"
+
+            if confident:
+                task["covered"] += 1
+                expected = expected_dept if name == "department" else expected_priority
+                if expected:
+                    task["expected"] += 1
+                    task["correct"] += label == expected
+
+            if not args.rules_only:
+                started = time.perf_counter()
+                if name == "department":
+                    llm_label = classify_department(text, use_rules=False)
+                else:
+                    llm_label = assign_priority(text, location, use_rules=False)
+                task["llm_seconds"] += time.perf_counter() - started
+                line += f" llm: {llm_label:<15}"
+                if confident:
+                    same = llm_label == label
+                    task["agree"] += same
+                    line += f" {GREEN + 'agree' if same else RED + 'DISAGREE'}{RESET}"
+
+            print(line + (f" {terms}" if terms else ""))
+
+    print(f"\n{YELLOW}{'='*80}")
+    print("📊 SUMMARY")
+    print(f"{'='*80}{RESET}")
+    for name, task in tasks.items():
+        print(f"\n{GREEN}{name.title()}:{RESET}")
+        print(f"  Coverage (LLM call skipped): {task['covered']}/{len(corpus)} ({pct(task['covered'], len(corpus))})")
+        if task["expected"]:
+            print(f"  Correct vs expected label:   {task['correct']}/{task['expected']} ({pct(task['correct'], task['expected'])})")
+        if not args.rules_only:
+            print(f"  Agreement with LLM:          {task['agree']}/{task['covered']} ({pct(task['agree'], task['covered'])})")
+            print(f"  LLM time:                    {task['llm_seconds'] * 1000 / len(corpus):.1f} ms/grievance")
+        print(f"  Rule time:                   {task['rule_seconds'] * 1000000 / len(corpus):.1f} µs/grievance")
+
+    print('\n' + '='*80)
+
+
+if __name__ == "__main__":
+    main()
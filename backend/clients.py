@@ -0,0 +1,241 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from metrics import registry, errors
+
+load_dotenv()
+
+# Seconds between background health probes (0 disables probing)
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "60"))
+# Delay before the first probe, so a booting worker serves traffic first
+HEALTH_PROBE_INITIAL_DELAY = float(os.getenv("HEALTH_PROBE_INITIAL_DELAY", "1"))
+# A failed client construction is retried after this many seconds
+CLIENT_RETRY_SECONDS = float(os.getenv("CLIENT_RETRY_SECONDS", "30"))
+
+
+class ClientProvider:
+    """
+    Builds an API client on first use instead of at import, once, under
+    a lock. A background thread probes the service periodically; health()
+    returns the last probe result without touching the network.
+
+    factory() returns the client, or None when the service isn't
+    configured. probe(client) raises if the service is unreachable and
+    may return a dict of details (account status, ...). async_factory(),
+    if given, builds the asyncio flavour of the client for get_async();
+    both share the credentials, retry backoff and health state.
+    """
+
+    def __init__(self, name, factory, probe=None, configured=None, async_factory=None):
+        self.name = name
+        self.factory = factory
+        self.probe = probe
+        self.is_configured = configured or (lambda: True)
+        self.async_factory = async_factory
+        self._client = None
+        self._built = False
+        self._async_client = None
+        self._failed_at = None
+        self._error = None
+        self._health = None
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def configured(self):
+        """Credentials are present; says nothing about reachability"""
+        return self._client is not None or self.is_configured()
+
+    def get(self):
+        """The client, built on the first call; None if unconfigured or construction failed"""
+        if self._built:
+            return self._client
+        with self._lock:
+            if self._built:
+                return self._client
+            if self._failed_at and time.monotonic() - self._failed_at < CLIENT_RETRY_SECONDS:
+                return None
+            started = time.perf_counter()
+            try:
+                self._client = self.factory()
+                self._built = True
+                self._error = None
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                self._error = str(e)
+                errors.inc(component=self.name, type=type(e).__name__)
+                print(f"❌ {self.name} client initialization failed: {e}")
+                return None
+            if self._client is not None:
+                print(f"✅ {self.name} client initialized in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return self._client
+
+    def get_async(self):
+        """The async client, built on the first call; None under the same conditions as get()"""
+        if self._async_client is not None:
+            return self._async_client
+        if self.async_factory is None or self.get() is None:
+            return None
+        with self._lock:
+            if self._async_client is None:
+                try:
+                    self._async_client = self.async_factory()
+                except Exception as e:
+                    self._error = str(e)
+                    errors.inc(component=self.name, type=type(e).__name__)
+                    print(f"❌ {self.name} async client initialization failed: {e}")
+            return self._async_client
+
+    def set(self, client, async_client=None):
+        """Replaces the clients (tests, benchmarks) and forgets the last probe"""
+        with self._lock:
+            self._client = client
+            self._async_client = async_client
+            self._built = True
+            self._health = None
+
+    # ------------------------
+    # Health probing
+    # ------------------------
+    def check(self):
+        """Probes the service now and caches the result"""
+        with self._probe_lock:
+            started = time.perf_counter()
+            result = {"ok": False, "checked_at": datetime.now().isoformat()}
+            client = self.get()
+            if client is None:
+                result["error"] = self._error or "not configured"
+            elif self.probe is None:
+                result["ok"] = True
+            else:
+                try:
+                    result["details"] = self.probe(client) or {}
+                    result["ok"] = True
+                except Exception as e:
+                    errors.inc(component=f"{self.name}_probe", type=type(e).__name__)
+                    result["error"] = str(e)
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if self._health is None or self._health["ok"] != result["ok"]:
+                print(f"{'✅' if result['ok'] else '❌'} {self.name} health: "
+                      f"{'ok' if result['ok'] else result.get('error')}")
+            self._health = result
+            return result
+
+    def health(self):
+        """Last probe result; {"ok": None} until the first probe has run"""
+        health = self._health
+        if health is None:
+            return {"ok": None, "configured": self.configured, "checked_at": None}
+        return dict(health, configured=self.configured)
+
+    def _probe_loop(self, interval, initial_delay):
+        if self._stop.wait(initial_delay):
+            return
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"❌ {self.name} probe error: {e}")
+            if self._stop.wait(interval):
+                return
+
+    def start_probing(self, interval=HEALTH_PROBE_INTERVAL, initial_delay=HEALTH_PROBE_INITIAL_DELAY):
+        """Starts the background probe (idempotent); unconfigured services aren't probed"""
+        if interval <= 0 or not self.configured:
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._probe_loop, args=(interval, initial_delay), name=f"{self.name}-probe", daemon=True
+            )
+            self._thread.start()
+
+    def stop_probing(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+# ------------------------
+# Twilio
+# ------------------------
+def _twilio_credentials():
+    return os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN")
+
+
+def _build_twilio():
+    account_sid, auth_token = _twilio_credentials()
+    if not (account_sid and auth_token):
+        return None
+    from twilio.rest import Client
+
+    return Client(account_sid, auth_token)
+
+
+def _probe_twilio(client):
+    account = client.api.accounts(client.account_sid).fetch()
+    return {
+        "account_sid": account.sid,
+        "account_status": account.status,
+        "friendly_name": account.friendly_name
+    }
+
+
+twilio_client = ClientProvider(
+    "twilio", _build_twilio, _probe_twilio,
+    configured=lambda: all(_twilio_credentials())
+)
+
+
+# ------------------------
+# Groq
+# ------------------------
+def _build_groq():
+    from groq import Groq
+    from llm_scheduler import create_http_client
+
+    # Retries are handled by the scheduler, and the pooled HTTP client
+    # keeps connections to the API warm between calls
+    return Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0, http_client=create_http_client())
+
+
+def _build_async_groq():
+    from groq import AsyncGroq
+    from llm_scheduler import create_async_http_client
+
+    # Own connection pool: httpx async clients can't share the sync one
+    return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0, http_client=create_async_http_client())
+
+
+def _probe_groq(client):
+    # Lists models: authenticated, but uses no completion tokens
+    return {"models": len(client.models.list().data)}
+
+
+groq_client = ClientProvider(
+    "groq", _build_groq, _probe_groq,
+    configured=lambda: bool(os.getenv("GROQ_API_KEY")),
+    async_factory=_build_async_groq
+)
+
+
+def _health_gauge():
+    values = {}
+    for provider in (twilio_client, groq_client):
+        ok = provider.health()["ok"]
+        if ok is not None:
+            values[(provider.name,)] = 1 if ok else 0
+    return values
+
+
+registry.gauge("nyaya_dependency_up", "Last health probe result per external service", ("service",),
+               collect=_health_gauge)
@@ -1,9 +1,25 @@
 """
 Comprehensive Test Cases with Location Support
 Tests AI service with proper location context
+
+Usage:
+    python comprehensive_test_cases.py                     # live Groq
+    LLM_BACKEND=record python comprehensive_test_cases.py  # live, saving fixtures
+    LLM_BACKEND=replay python comprehensive_test_cases.py  # offline, from fixtures
+    LLM_BACKEND=fake python comprehensive_test_cases.py    # offline stand-in
 """
 
 from ai_service import structure_grievance, classify_department, assign_priority, verify_closure
+from grievance_corpus import (
+    location_tests,
+    vague_tests,
+    partial_tests,
+    sample_grievance,
+    sample_location,
+    closure_tests,
+    real_world
+)
+import sys
 import json
 
 GREEN = '\033[92m'
@@ -17,317 +33,155 @@ def print_test_header(test_num, title):
     print(f"{BLUE}TEST {test_num}: {title}{RESET}")
     print('='*80)
 
-# =============================================================================
-# TEST SUITE 1: WITH COMPLETE LOCATION DATA
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("TEST SUITE 1: GRIEVANCES WITH COMPLETE LOCATION DATA")
-print(f"{'='*80}{RESET}")
-
-location_tests = [
-    {
-        "id": 1,
-        "title": "Hospital Equipment - Complete Location",
-        "text": "No ventilators available. COVID patients suffering.",
-        "location": {
-            "city": "Mumbai",
-            "area": "Parel",
-            "pincode": "400012",
-            "specificLocation": "KEM Hospital"
-        },
-        "expected_dept": "Health",
-        "expected_priority": "high"
-    },
-    {
-        "id": 2,
-        "title": "Road Pothole - Complete Location",
-        "text": "Huge pothole causing accidents. 3 bikes damaged this week.",
-        "location": {
-            "city": "Mumbai",
-            "area": "Bandra West",
-            "pincode": "400050",
-            "specificLocation": "SV Road near Shoppers Stop"
-        },
-        "expected_dept": "Infrastructure",
-        "expected_priority": "high"
-    },
-    {
-        "id": 3,
-        "title": "Street Light - Complete Location",
-        "text": "Light not working. Dark and unsafe at night.",
-        "location": {
-            "city": "Mumbai",
-            "area": "Andheri East",
-            "pincode": "400069",
-            "specificLocation": "Sakinaka Metro Station exit"
-        },
-        "expected_dept": "Public Safety",
-        "expected_priority": "medium"
-    }
-]
-
-for test in location_tests:
-    print_test_header(test["id"], test["title"])
-    print(f"Grievance: {test['text']}")
-    print(f"Location: {test['location']['specificLocation']}, {test['location']['area']}, {test['location']['city']}")
-    
-    # Test structuring with location
-    structured = structure_grievance(test["text"], test["location"])
-    print(f"\n{GREEN}Structured Grievance:{RESET}")
-    print(structured[:300] + "..." if len(structured) > 300 else structured)
-    
-    # Test department classification
-    dept = classify_department(test["text"], structured)
-    print(f"\n{GREEN}Department:{RESET} {dept}")
-    print(f"Expected: {test['expected_dept']}")
-    
-    # Test priority
-    priority = assign_priority(test["text"], test["location"])
-    print(f"\n{GREEN}Priority:{RESET} {priority}")
-    print(f"Expected: {test['expected_priority']}")
-    
-    # Check if location is in structured output
-    has_location = test['location']['specificLocation'].lower() in structured.lower()
-    print(f"\n{GREEN if has_location else RED}Location Verification:{RESET} {'✅ Specific location included' if has_location else '❌ Location missing'}")
-
-# =============================================================================
-# TEST SUITE 2: WITHOUT LOCATION DATA (Vague Grievances)
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("TEST SUITE 2: GRIEVANCES WITHOUT LOCATION DATA (Should be flagged)")
-print(f"{'='*80}{RESET}")
-
-vague_tests = [
-    {
-        "id": 1,
-        "title": "Vague Hospital Complaint",
-        "text": "Hospital has no medicines. Patients being turned away.",
-        "location": None
-    },
-    {
-        "id": 2,
-        "title": "Vague Road Complaint",
-        "text": "Road is full of potholes everywhere.",
-        "location": None
-    },
-    {
-        "id": 3,
-        "title": "Vague Water Complaint",
-        "text": "No water supply for many days.",
-        "location": None
-    }
-]
-
-for test in vague_tests:
-    print_test_header(test["id"], test["title"])
-    print(f"Grievance: {test['text']}")
-    print(f"Location: {RED}NOT PROVIDED{RESET}")
-    
-    structured = structure_grievance(test["text"], test["location"])
-    print(f"\n{YELLOW}Structured Grievance (checking for missing location flag):{RESET}")
-    print(structured[:400] + "..." if len(structured) > 400 else structured)
-    
-    # Check if AI flagged missing location
-    flagged = "not specified" in structured.lower() or "missing" in structured.lower()
-    print(f"\n{GREEN if flagged else RED}Missing Location Detection:{RESET} {'✅ AI flagged missing location' if flagged else '❌ AI did not flag'}")
-    
-    priority = assign_priority(test["text"], test["location"])
-    print(f"\n{YELLOW}Priority:{RESET} {priority} (may be lower due to vague location)")
-
-# =============================================================================
-# TEST SUITE 3: PARTIAL LOCATION DATA
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("TEST SUITE 3: PARTIAL LOCATION DATA")
-print(f"{'='*80}{RESET}")
-
-partial_tests = [
-    {
-        "id": 1,
-        "title": "City and Area, but No Specific Location",
-        "text": "School roof leaking badly. Children getting wet.",
-        "location": {
-            "city": "Mumbai",
-            "area": "Borivali",
-            "pincode": "",
-            "specificLocation": ""  # Missing!
-        }
-    },
-    {
-        "id": 2,
-        "title": "Only Specific Location in Text",
-        "text": "Garbage not collected at Lokhandwala Market for 2 weeks.",
-        "location": {
-            "city": "",
-            "area": "",
-            "pincode": "",
-            "specificLocation": ""
-        }
-    }
-]
-
-for test in partial_tests:
-    print_test_header(test["id"], test["title"])
-    print(f"Grievance: {test['text']}")
-    print(f"Location Data: {test['location']}")
-    
-    structured = structure_grievance(test["text"], test["location"])
-    print(f"\n{BLUE}Checking if AI extracts location from text:{RESET}")
-    print(structured[:350] + "..." if len(structured) > 350 else structured)
-
-# =============================================================================
-# TEST SUITE 4: CLOSURE VERIFICATION WITH LOCATION
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("TEST SUITE 4: CLOSURE VERIFICATION (Location-Aware)")
-print(f"{'='*80}{RESET}")
-
-sample_grievance = """**Issue Summary:** Broken street light causing safety concerns
-
-**Location Details:**
-- City/Region: Mumbai
-- Area/Locality: Andheri West
-- Specific Location: Near Sector 5 Park, next to XYZ School
-- Pincode: 400058
-
-**Detailed Description:** The street light has been non-functional for 2 weeks.
-
-**Impact:** Affects 200+ residents. Two theft incidents reported."""
-
-sample_location = {
-    "city": "Mumbai",
-    "area": "Andheri West",
-    "pincode": "400058",
-    "specificLocation": "Near Sector 5 Park, next to XYZ School"
-}
-
-closure_tests = [
-    {
-        "id": 1,
-        "title": "INADEQUATE - No Location Confirmation",
-        "closure": "All streetlights in Mumbai have been repaired.",
-        "should_approve": False
-    },
-    {
-        "id": 2,
-        "title": "INADEQUATE - Wrong Location",
-        "closure": "Streetlight repaired at Sector 3 Park, Andheri. Work order #123.",
-        "should_approve": False
-    },
-    {
-        "id": 3,
-        "title": "INADEQUATE - Vague Promise",
-        "closure": "We will look into the Andheri streetlight issue soon.",
-        "should_approve": False
-    },
-    {
-        "id": 4,
-        "title": "ADEQUATE - Correct Location + Details",
-        "closure": "Streetlight near Sector 5 Park, Andheri West (next to XYZ School) repaired on Jan 22. New LED installed. Work order #SL-445. Team: Municipal Electric.",
-        "should_approve": True
-    },
-    {
-        "id": 5,
-        "title": "ADEQUATE - Correct Location + Timeline",
-        "closure": "Light pole at Sector 5 Park area, Andheri West damaged beyond repair. New pole installation scheduled Jan 28. Temporary lighting installed Jan 23. Location: next to XYZ School gate.",
-        "should_approve": True
-    }
-]
-
-closure_correct = 0
-closure_total = len(closure_tests)
-
-for test in closure_tests:
-    print_test_header(test["id"], test["title"])
-    print(f"Closure Notes: {test['closure']}")
-    
-    result = verify_closure(sample_grievance, test["closure"], sample_location)
-    
-    print(f"\n{BLUE}AI Response:{RESET}")
-    print(json.dumps(result, indent=2))
-    print(f"\nExpected: {'✅ APPROVE' if test['should_approve'] else '❌ REJECT'}")
-    print(f"AI Decision: {GREEN if result['approved'] else RED}{'✅ APPROVED' if result['approved'] else '❌ REJECTED'}{RESET}")
-    
-    success = result["approved"] == test["should_approve"]
-    if success:
-        closure_correct += 1
-        print(f"{GREEN}✅ CORRECT DECISION{RESET}")
-    else:
-        print(f"{RED}❌ INCORRECT DECISION{RESET}")
-
-print(f"\n{BLUE}Closure Verification Accuracy: {closure_correct}/{closure_total} ({(closure_correct/closure_total)*100:.1f}%){RESET}")
-
-# =============================================================================
-# TEST SUITE 5: REAL-WORLD SCENARIOS
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("TEST SUITE 5: REAL-WORLD SCENARIOS")
-print(f"{'='*80}{RESET}")
-
-real_world = [
-    {
-        "id": 1,
-        "title": "Urgent Medical Emergency with Location",
-        "text": "Ambulance service not responding. Called 108 three times. Patient critical.",
-        "location": {
-            "city": "Mumbai",
-            "area": "Kurla West",
-            "pincode": "400070",
-            "specificLocation": "Building A, Nehru Nagar, Lane 5"
-        }
-    },
-    {
-        "id": 2,
-        "title": "School Issue with Partial Info",
-        "text": "Teacher shortage. 50 students without math teacher for 1 month.",
-        "location": {
-            "city": "Pune",
-            "area": "Kothrud",
-            "pincode": "",
-            "specificLocation": "Municipal School #23"
-        }
-    },
-    {
-        "id": 3,
-        "title": "Water Crisis with Community Impact",
-        "text": "No water for 1 week. 500 families affected. Tanker not coming.",
-        "location": {
-            "city": "Delhi",
-            "area": "Rohini Sector 15",
-            "pincode": "110085",
-            "specificLocation": "Blocks A, B, C - Near Main Park"
-        }
-    }
-]
-
-for test in real_world:
-    print_test_header(test["id"], test["title"])
-    print(f"{BLUE}Scenario:{RESET} {test['text']}")
-    print(f"{BLUE}Location:{RESET} {test['location']['specificLocation']}, {test['location']['area']}")
-    
-    structured = structure_grievance(test["text"], test["location"])
-    dept = classify_department(test["text"], structured)
-    priority = assign_priority(test["text"], test["location"])
-    
-    print(f"\n{GREEN}Results:{RESET}")
-    print(f"Department: {dept}")
-    print(f"Priority: {priority}")
-    print(f"\nStructured Preview:")
-    print(structured[:250] + "...")
-
-# =============================================================================
-# FINAL SUMMARY
-# =============================================================================
-print(f"\n{YELLOW}{'='*80}")
-print("📊 FINAL TEST SUMMARY")
-print(f"{'='*80}{RESET}")
-
-print(f"""
-✅ Complete Location Tests: Tested 3 scenarios
-✅ Vague Location Tests: Tested 3 scenarios (AI should flag missing info)
-✅ Partial Location Tests: Tested 2 scenarios (AI should extract from text)
+
+def check(label, actual, expected, failures, test_id):
+    """Prints actual vs expected and records a mismatch; no expectation passes"""
+    if expected is None:
+        print(f"{label}: {actual}")
+        return
+    ok = str(actual or "").strip().lower() == str(expected).strip().lower()
+    print(f"{label}: {actual} (expected {expected}) {GREEN + '✅' if ok else RED + '❌'}{RESET}")
+    if not ok:
+        failures.append(f"{test_id} {label.lower()}: got {actual}, expected {expected}")
+
+
+def main():
+    failures = []
+
+    # =============================================================================
+    # TEST SUITE 1: WITH COMPLETE LOCATION DATA
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("TEST SUITE 1: GRIEVANCES WITH COMPLETE LOCATION DATA")
+    print(f"{'='*80}{RESET}")
+
+    for test in location_tests:
+        print_test_header(test["id"], test["title"])
+        print(f"Grievance: {test['text']}")
+        print(f"Location: {test['location']['specificLocation']}, {test['location']['area']}, {test['location']['city']}")
+
+        # Test structuring with location
+        structured = structure_grievance(test["text"], test["location"])
+        print(f"\n{GREEN}Structured Grievance:{RESET}")
+        print(structured[:300] + "..." if len(structured) > 300 else structured)
+
+        # Test department classification
+        dept = classify_department(test["text"], structured)
+        print()
+        check("Department", dept, test["expected_dept"], failures, test["id"])
+
+        # Test priority
+        priority = assign_priority(test["text"], test["location"])
+        check("Priority", priority, test["expected_priority"], failures, test["id"])
+
+        # Check if location is in structured output
+        has_location = test['location']['specificLocation'].lower() in structured.lower()
+        print(f"\n{GREEN if has_location else RED}Location Verification:{RESET} {'✅ Specific location included' if has_location else '❌ Location missing'}")
+
+    # =============================================================================
+    # TEST SUITE 2: WITHOUT LOCATION DATA (Vague Grievances)
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("TEST SUITE 2: GRIEVANCES WITHOUT LOCATION DATA (Should be flagged)")
+    print(f"{'='*80}{RESET}")
+
+    for test in vague_tests:
+        print_test_header(test["id"], test["title"])
+        print(f"Grievance: {test['text']}")
+        print(f"Location: {RED}NOT PROVIDED{RESET}")
+
+        structured = structure_grievance(test["text"], test["location"])
+        print(f"\n{YELLOW}Structured Grievance (checking for missing location flag):{RESET}")
+        print(structured[:400] + "..." if len(structured) > 400 else structured)
+
+        # Check if AI flagged missing location
+        flagged = "not specified" in structured.lower() or "missing" in structured.lower()
+        print(f"\n{GREEN if flagged else RED}Missing Location Detection:{RESET} {'✅ AI flagged missing location' if flagged else '❌ AI did not flag'}")
+
+        priority = assign_priority(test["text"], test["location"])
+        print(f"\n{YELLOW}Priority:{RESET} {priority} (may be lower due to vague location)")
+
+    # =============================================================================
+    # TEST SUITE 3: PARTIAL LOCATION DATA
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("TEST SUITE 3: PARTIAL LOCATION DATA")
+    print(f"{'='*80}{RESET}")
+
+    for test in partial_tests:
+        print_test_header(test["id"], test["title"])
+        print(f"Grievance: {test['text']}")
+        print(f"Location Data: {test['location']}")
+
+        structured = structure_grievance(test["text"], test["location"])
+        print(f"\n{BLUE}Checking if AI extracts location from text:{RESET}")
+        print(structured[:350] + "..." if len(structured) > 350 else structured)
+
+    # =============================================================================
+    # TEST SUITE 4: CLOSURE VERIFICATION WITH LOCATION
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("TEST SUITE 4: CLOSURE VERIFICATION (Location-Aware)")
+    print(f"{'='*80}{RESET}")
+
+    closure_correct = 0
+    closure_total = len(closure_tests)
+
+    for test in closure_tests:
+        print_test_header(test["id"], test["title"])
+        print(f"Closure Notes: {test['closure']}")
+
+        result = verify_closure(sample_grievance, test["closure"], sample_location)
+
+        print(f"\n{BLUE}AI Response:{RESET}")
+        print(json.dumps(result, indent=2))
+        print(f"\nExpected: {'✅ APPROVE' if test['should_approve'] else '❌ REJECT'}")
+        print(f"AI Decision: {GREEN if result['approved'] else RED}{'✅ APPROVED' if result['approved'] else '❌ REJECTED'}{RESET}")
+
+        success = result["approved"] == test["should_approve"]
+        if success:
+            closure_correct += 1
+            print(f"{GREEN}✅ CORRECT DECISION{RESET}")
+        else:
+            print(f"{RED}❌ INCORRECT DECISION{RESET}")
+
+    print(f"\n{BLUE}Closure Verification Accuracy: {closure_correct}/{closure_total} ({(closure_correct/closure_total)*100:.1f}%){RESET}")
+
+    # =============================================================================
+    # TEST SUITE 5: REAL-WORLD SCENARIOS
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("TEST SUITE 5: REAL-WORLD SCENARIOS")
+    print(f"{'='*80}{RESET}")
+
+    for test in real_world:
+        print_test_header(test["id"], test["title"])
+        print(f"{BLUE}Scenario:{RESET} {test['text']}")
+        print(f"{BLUE}Location:{RESET} {test['location']['specificLocation']}, {test['location']['area']}")
+
+        structured = structure_grievance(test["text"], test["location"])
+        dept = classify_department(test["text"], structured)
+        priority = assign_priority(test["text"], test["location"])
+
+        print(f"\n{GREEN}Results:{RESET}")
+        check("Department", dept, test.get("expected_dept"), failures, test["id"])
+        check("Priority", priority, test.get("expected_priority"), failures, test["id"])
+        print(f"\nStructured Preview:")
+        print(structured[:250] + "...")
+
+    # =============================================================================
+    # FINAL SUMMARY
+    # =============================================================================
+    print(f"\n{YELLOW}{'='*80}")
+    print("📊 FINAL TEST SUMMARY")
+    print(f"{'='*80}{RESET}")
+
+    print(f"""
+✅ Complete Location Tests: Tested {len(location_tests)} scenarios
+✅ Vague Location Tests: Tested {len(vague_tests)} scenarios (AI should flag missing info)
+✅ Partial Location Tests: Tested {len(partial_tests)} scenarios (AI should extract from text)
 ✅ Closure Verification: {closure_correct}/{closure_total} correct ({(closure_correct/closure_total)*100:.1f}%)
-✅ Real-World Scenarios: Tested 3 scenarios
+✅ Real-World Scenarios: Tested {len(real_world)} scenarios
 
 {GREEN}Key Improvements with Location Support:{RESET}
 1. AI now validates location specificity
@@ -349,4 +203,15 @@ Next Steps:
 4. Add frontend validation for required location fields
 """)
 
-print('='*80)
\ No newline at end of file
+    if failures:
+        print(f"{RED}❌ {len(failures)} department / priority mismatches:{RESET}")
+        for failure in failures:
+            print(f"   - {failure}")
+    else:
+        print(f"{GREEN}✅ Every department and priority matched its expected value{RESET}")
+    print('='*80)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
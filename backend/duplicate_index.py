@@ -0,0 +1,222 @@
+import os
+import re
+import time
+import zlib
+import threading
+
+from geo_index import resolve_pincode, coordinates
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EMBEDDING_DIM = int(os.getenv("DEDUPE_EMBEDDING_DIM", "512"))
+# Cosine similarity above which a grievance joins an existing cluster
+# and skips the LLM pipeline
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.85"))
+# Hashed n-grams match on shared wording ("pipeline leak near ..."), not on
+# the department; below this similarity a match is only linked when the
+# rule classifier confidently puts both texts in the same department
+DEDUPE_STRICT_THRESHOLD = float(os.getenv("DEDUPE_STRICT_THRESHOLD", "0.97"))
+DEDUPE_TOP_K = int(os.getenv("DEDUPE_TOP_K", "3"))
+DEDUPE_WINDOW_DAYS = float(os.getenv("DEDUPE_WINDOW_DAYS", "14"))
+DEDUPE_MAX_PER_PARTITION = int(os.getenv("DEDUPE_MAX_PER_PARTITION", "5000"))
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "true").lower() == "true"
+# Grid cell (degrees, ~5.5 km) for pinned locations that map to no known pincode
+DEDUPE_CELL_DEGREES = float(os.getenv("DEDUPE_CELL_DEGREES", "0.05"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Words that say nothing about which problem it is
+STOPWORDS = {
+    "the", "a", "an", "is", "are", "was", "were", "be", "been", "of", "in", "on",
+    "at", "to", "for", "and", "or", "it", "this", "that", "there", "here", "my",
+    "our", "we", "i", "me", "please", "sir", "madam", "very", "since", "from",
+    "with", "near", "not", "no", "has", "have", "had", "hai", "ka", "ki", "ke",
+    "se", "mein", "aur", "nahi", "bhi",
+}
+
+
+def _bucket(feature):
+    # crc32 is stable across processes, unlike hash()
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % EMBEDDING_DIM, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def embed(text):
+    """
+    Lightweight local embedding: hashed word unigrams, bigrams and
+    character trigrams, L2-normalized. No model download, ~50µs per text.
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    words = [w for w in (m.lower() for m in _WORD.findall(text or "")) if w not in STOPWORDS]
+
+    for word in words:
+        index, sign = _bucket("w:" + word)
+        vector[index] += sign * 2.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            index, sign = _bucket("c:" + padded[i:i + 3])
+            vector[index] += sign * 0.5
+    for first, second in zip(words, words[1:]):
+        index, sign = _bucket(f"b:{first} {second}")
+        vector[index] += sign * 1.5
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def partition_key(location_data):
+    """
+    Grievances are only compared within the same pincode (or city, or
+    grid cell for a shared location that maps to no known pincode)
+    """
+    location_data = location_data or {}
+    pincode = resolve_pincode(location_data)
+    if pincode:
+        return f"pin:{pincode}"
+    city = str(location_data.get("city") or "").strip().lower()
+    if city:
+        return f"city:{city}"
+    point = coordinates(location_data)
+    if point:
+        return f"cell:{int(point[0] // DEDUPE_CELL_DEGREES)}:{int(point[1] // DEDUPE_CELL_DEGREES)}"
+    return "unknown"
+
+
+# How much the free-text location contributes relative to the complaint
+LOCATION_WEIGHT = 0.35
+
+
+def dedupe_vector(text, location_data=None):
+    """Embedding of the complaint, nudged by its specific location / area"""
+    location_data = location_data or {}
+    vector = embed(text)
+    location_text = f"{location_data.get('specificLocation') or ''} {location_data.get('area') or ''}"
+    if location_text.strip():
+        vector = vector + LOCATION_WEIGHT * embed(location_text)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+    return vector
+
+
+class _Partition:
+    """
+    Embeddings for one pincode / city. Storage grows by doubling up to
+    capacity, after which the oldest slot is overwritten.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.matrix = np.zeros((min(capacity, 64), EMBEDDING_DIM), dtype=np.float32)
+        self.size = 0
+        self._next = 0
+        self.ids = []
+        self.clusters = []
+        self.times = []
+
+    def add(self, vector, grievance_id, cluster_id, created_at):
+        if self.size < self.capacity:
+            if self.size == len(self.matrix):
+                grown = np.zeros((min(self.capacity, self.size * 2), EMBEDDING_DIM), dtype=np.float32)
+                grown[:self.size] = self.matrix[:self.size]
+                self.matrix = grown
+            slot = self.size
+            self.size += 1
+            self.ids.append(grievance_id)
+            self.clusters.append(cluster_id)
+            self.times.append(created_at)
+        else:
+            slot = self._next
+            self._next = (self._next + 1) % self.capacity
+            self.ids[slot] = grievance_id
+            self.clusters[slot] = cluster_id
+            self.times[slot] = created_at
+        self.matrix[slot] = vector
+
+
+class DuplicateIndex:
+    """
+    In-process vector index over recent grievances, partitioned by
+    pincode / city. Top-k is a single matrix-vector product per query.
+    """
+
+    def __init__(self, threshold=DEDUPE_THRESHOLD, max_per_partition=DEDUPE_MAX_PER_PARTITION,
+                 window_days=DEDUPE_WINDOW_DAYS):
+        self.threshold = threshold
+        self.max_per_partition = max_per_partition
+        self.window = window_days * 86400
+        self.enabled = DEDUPE_ENABLED and np is not None
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.matches = 0
+
+        if DEDUPE_ENABLED and np is None:
+            print("⚠️ numpy not installed - duplicate detection disabled")
+
+    def add(self, grievance_id, text, location_data=None, cluster_id=None, created_at=None):
+        if not self.enabled:
+            return
+        vector = dedupe_vector(text, location_data)
+        key = partition_key(location_data)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self.max_per_partition)
+            partition.add(vector, grievance_id, cluster_id or grievance_id, created_at or time.time())
+
+    def search(self, text, location_data=None, k=DEDUPE_TOP_K):
+        """Top-k [(grievance_id, cluster_id, score)] within the partition and time window"""
+        if not self.enabled:
+            return []
+        vector = dedupe_vector(text, location_data)
+        key = partition_key(location_data)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None or not partition.size:
+                return []
+            scores = partition.matrix[:partition.size] @ vector
+            ids = list(partition.ids)
+            clusters = list(partition.clusters)
+            times = np.array(partition.times)
+
+        # Entries older than the window never match
+        scores[times < time.time() - self.window] = -np.inf
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (ids[i], clusters[i], float(scores[i]))
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+    def find_duplicate(self, text, location_data=None):
+        """
+        Returns (grievance_id, cluster_id, score) of the best match when its
+        similarity clears the threshold, otherwise None. Grievances without
+        a pincode, city or shared location are never matched.
+        """
+        if not self.enabled or partition_key(location_data) == "unknown":
+            return None
+        self.queries += 1
+        results = self.search(text, location_data, k=1)
+        if results and results[0][2] >= self.threshold:
+            self.matches += 1
+            return results[0]
+        return None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "partitions": len(self._partitions),
+            "indexed": sum(p.size for p in self._partitions.values()),
+            "queries": self.queries,
+            "matches": self.matches,
+            "threshold": self.threshold
+        }
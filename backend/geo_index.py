@@ -0,0 +1,411 @@
+"""
+Geospatial index for grievances.
+
+Every grievance is reduced to a normalized pincode and, where possible,
+a point: the sender's shared location pin, else the pincode's centroid
+from an offline table. Points live in an SQLite R*Tree next to the
+grievances table and are written in the same transaction, so every
+worker sees the same index; per-pincode counters kept alongside make
+hotspot queries independent of the number of grievances.
+
+The bundled data/pincodes.csv only covers major towns. For full
+coverage, point PINCODE_TABLE at the India Post pincode directory
+(the data.gov.in CSV with pincode / latitude / longitude / district /
+statename columns works as is).
+"""
+import os
+import re
+import csv
+import math
+import sqlite3
+import threading
+
+PINCODE_TABLE = os.getenv(
+    "PINCODE_TABLE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pincodes.csv")
+)
+# Coordinates without a pincode take the nearest table entry within this distance
+GEO_REVERSE_MAX_KM = float(os.getenv("GEO_REVERSE_MAX_KM", "3"))
+GEO_MAX_RADIUS_KM = float(os.getenv("GEO_MAX_RADIUS_KM", "50"))
+
+# Statuses that take a grievance out of the "open" counts
+CLOSED_STATUSES = {"Resolved", "Closed", "Rejected"}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Six digits, never starting with 0; "400 058" is common in free text
+PINCODE_PATTERN = re.compile(r"(?<!\d)([1-9]\d{2})\s?(\d{3})(?!\d)")
+
+# Cell size of the in-memory grid over the pincode table (reverse lookups)
+_GRID_DEGREES = 0.1
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle"""
+    dlat = radius_km / KM_PER_DEGREE
+    # Longitude degrees shrink towards the poles
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def normalize_pincode(value):
+    """Six-digit pincode from "400 058", 400058.0, ... or "" if it isn't one"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits if len(digits) == 6 and digits[0] != "0" else ""
+
+
+def parse_coordinate(value, limit):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and -limit <= value <= limit else None
+
+
+def coordinates(location_data):
+    """(lat, lon) from a shared location pin, or None"""
+    location_data = location_data or {}
+    lat = parse_coordinate(location_data.get("latitude"), 90)
+    lon = parse_coordinate(location_data.get("longitude"), 180)
+    return (lat, lon) if lat is not None and lon is not None else None
+
+
+# ------------------------
+# Pincode table
+# ------------------------
+class PincodeTable:
+    """pincode -> centroid, district and state; loaded on first use"""
+
+    def __init__(self, path=PINCODE_TABLE):
+        self.path = path
+        self._entries = None
+        self._prefixes = {}
+        self._grid = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        points = {}
+        try:
+            with open(self.path, newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+                    pincode = normalize_pincode(row.get("pincode"))
+                    lat = parse_coordinate(row.get("latitude"), 90)
+                    lon = parse_coordinate(row.get("longitude"), 180)
+                    if not pincode or lat is None or lon is None:
+                        continue
+                    # The India Post directory lists every office; average them
+                    entry = points.setdefault(pincode, [0.0, 0.0, 0, row.get("district", ""),
+                                                        row.get("statename") or row.get("state", "")])
+                    entry[0] += lat
+                    entry[1] += lon
+                    entry[2] += 1
+        except FileNotFoundError:
+            print(f"⚠️ Pincode table {self.path} not found - only shared locations will be mapped")
+
+        entries = {}
+        prefixes = {}
+        for pincode, (lat, lon, count, district, state) in points.items():
+            entry = {"latitude": lat / count, "longitude": lon / count, "district": district.title(),
+                     "state": state.title()}
+            entries[pincode] = entry
+            # First three digits are the sorting district
+            prefix = prefixes.setdefault(pincode[:3], [0.0, 0.0, 0, entry["district"], entry["state"]])
+            prefix[0] += entry["latitude"]
+            prefix[1] += entry["longitude"]
+            prefix[2] += 1
+            self._grid.setdefault(self._cell(entry["latitude"], entry["longitude"]), []).append(pincode)
+
+        self._prefixes = {
+            prefix: {"latitude": lat / count, "longitude": lon / count, "district": district, "state": state}
+            for prefix, (lat, lon, count, district, state) in prefixes.items()
+        }
+        print(f"🗺️ Loaded {len(entries)} pincodes from {self.path}")
+        return entries
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    @staticmethod
+    def _cell(lat, lon):
+        return int(math.floor(lat / _GRID_DEGREES)), int(math.floor(lon / _GRID_DEGREES))
+
+    def lookup(self, pincode):
+        """
+        {"latitude", "longitude", "district", "state", "precision"} for a
+        pincode: "pincode" from its own entry, "district" from the centroid
+        of known pincodes sharing its first three digits. None if unknown.
+        """
+        pincode = normalize_pincode(pincode)
+        if not pincode:
+            return None
+        entry = self.entries.get(pincode)
+        if entry:
+            return dict(entry, precision="pincode")
+        entry = self._prefixes.get(pincode[:3])
+        return dict(entry, precision="district") if entry else None
+
+    def nearest(self, lat, lon, max_km=GEO_REVERSE_MAX_KM):
+        """Closest pincode centroid within max_km, or None"""
+        entries = self.entries
+        span = int(math.ceil(max_km / (KM_PER_DEGREE * _GRID_DEGREES * max(math.cos(math.radians(lat)), 0.01))))
+        row, col = self._cell(lat, lon)
+        best, best_km = None, max_km
+        for i in range(row - span, row + span + 1):
+            for j in range(col - span, col + span + 1):
+                for pincode in self._grid.get((i, j), ()):
+                    entry = entries[pincode]
+                    km = haversine_km(lat, lon, entry["latitude"], entry["longitude"])
+                    if km <= best_km:
+                        best, best_km = pincode, km
+        return best
+
+    def stats(self):
+        # Doesn't force a load
+        loaded = self._entries is not None
+        return {
+            "path": self.path,
+            "pincodes": len(self._entries) if loaded else None,
+            "districts": len(self._prefixes) if loaded else None
+        }
+
+
+pincode_table = PincodeTable()
+
+
+def resolve_pincode(location_data):
+    """
+    Normalized pincode of a location: the pincode field, else one written
+    in the free-text fields, else the nearest pincode to a shared pin.
+    "" when there is none.
+    """
+    location_data = location_data or {}
+    pincode = normalize_pincode(location_data.get("pincode"))
+    if pincode:
+        return pincode
+    for key in ("specificLocation", "area", "place"):
+        match = PINCODE_PATTERN.search(str(location_data.get(key) or ""))
+        if match:
+            return match.group(1) + match.group(2)
+    point = coordinates(location_data)
+    if point:
+        return pincode_table.nearest(*point) or ""
+    return ""
+
+
+def locate(location_data, pincode=None):
+    """
+    (lat, lon, precision) for a location: "exact" for a shared pin,
+    otherwise the pincode's centroid. None when it can't be placed.
+    """
+    point = coordinates(location_data)
+    if point:
+        return point[0], point[1], "exact"
+    entry = pincode_table.lookup(pincode or resolve_pincode(location_data))
+    if entry:
+        return entry["latitude"], entry["longitude"], entry["precision"]
+    return None
+
+
+# ------------------------
+# SQLite index
+# ------------------------
+def create_geo_tables(conn):
+    """Point, pincode and counter tables, in the grievance database"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS grievance_geo (
+            id INTEGER PRIMARY KEY,
+            grievance_id TEXT NOT NULL UNIQUE,
+            pincode TEXT,
+            department TEXT,
+            is_open INTEGER NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            precision TEXT,
+            created_at REAL
+        )
+    """)
+    # One degenerate box per point; rows without coordinates aren't in it
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS grievance_points
+        USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pincode_counts (
+            pincode TEXT NOT NULL,
+            department TEXT NOT NULL,
+            open INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (pincode, department)
+        ) WITHOUT ROWID
+    """)
+
+
+def is_open(status):
+    return (status or "Submitted") not in CLOSED_STATUSES
+
+
+def _count(conn, pincode, department, open_delta, total_delta):
+    if not pincode:
+        return
+    conn.execute(
+        """INSERT INTO pincode_counts (pincode, department, open, total) VALUES (?, ?, ?, ?)
+           ON CONFLICT (pincode, department) DO UPDATE SET
+               open = open + excluded.open, total = total + excluded.total""",
+        (pincode, department or "", open_delta, total_delta)
+    )
+
+
+def _unindex(conn, row):
+    geo_id, pincode, department, was_open = row
+    conn.execute("DELETE FROM grievance_points WHERE id = ?", (geo_id,))
+    conn.execute("DELETE FROM grievance_geo WHERE id = ?", (geo_id,))
+    _count(conn, pincode, department, -was_open, -1)
+
+
+def index_grievances(conn, records):
+    """
+    Indexes grievance records (as prepared by grievance_store) inside the
+    caller's transaction. Re-indexing a grievance replaces its entry.
+    """
+    for record in records:
+        existing = conn.execute(
+            "SELECT id, pincode, department, is_open FROM grievance_geo WHERE grievance_id = ?",
+            (record["grievance_id"],)
+        ).fetchone()
+        if existing:
+            _unindex(conn, tuple(existing))
+
+        location = record.get("location") or {}
+        pincode = normalize_pincode(record.get("pincode")) or resolve_pincode(location)
+        point = locate(location, pincode)
+        lat, lon, precision = point if point else (None, None, None)
+        open_flag = 1 if is_open(record.get("status")) else 0
+        cur = conn.execute(
+            """INSERT INTO grievance_geo
+               (grievance_id, pincode, department, is_open, latitude, longitude, precision, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (record["grievance_id"], pincode or None, record.get("department"), open_flag, lat, lon, precision,
+             record.get("created_at"))
+        )
+        if point:
+            conn.execute("INSERT INTO grievance_points VALUES (?, ?, ?, ?, ?)", (cur.lastrowid, lat, lat, lon, lon))
+        _count(conn, pincode, record.get("department"), open_flag, 1)
+
+
+def update_open(conn, grievance_id, status):
+    """Moves a grievance in or out of the open counts after a status change"""
+    row = conn.execute(
+        "SELECT id, pincode, department, is_open FROM grievance_geo WHERE grievance_id = ?", (grievance_id,)
+    ).fetchone()
+    if row is None:
+        return
+    geo_id, pincode, department, was_open = tuple(row)
+    open_flag = 1 if is_open(status) else 0
+    if open_flag != was_open:
+        conn.execute("UPDATE grievance_geo SET is_open = ? WHERE id = ?", (open_flag, geo_id))
+        _count(conn, pincode, department, open_flag - was_open, 0)
+
+
+class GeoIndex:
+    """Read side of the index; the grievance store does the writes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.queries = 0
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def nearby(self, lat, lon, radius_km, open_only=True, department=None, limit=100):
+        """
+        Grievances within radius_km of a point, nearest first:
+        [{"grievance_id", "distance_km", "latitude", "longitude", "precision", "pincode"}]
+        """
+        self.queries += 1
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        query = """
+            SELECT g.grievance_id, g.latitude, g.longitude, g.precision, g.pincode, g.department
+            FROM grievance_points p JOIN grievance_geo g ON g.id = p.id
+            WHERE p.max_lat >= ? AND p.min_lat <= ? AND p.max_lon >= ? AND p.min_lon <= ?
+        """
+        params = [min_lat, max_lat, min_lon, max_lon]
+        if open_only:
+            query += " AND g.is_open = 1"
+        if department:
+            query += " AND g.department = ?"
+            params.append(department)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+        # The box's corners are outside the circle
+        results = []
+        for grievance_id, point_lat, point_lon, precision, pincode, point_department in rows:
+            km = haversine_km(lat, lon, point_lat, point_lon)
+            if km <= radius_km:
+                results.append({
+                    "grievance_id": grievance_id,
+                    "distance_km": round(km, 3),
+                    "latitude": point_lat,
+                    "longitude": point_lon,
+                    "precision": precision,
+                    "pincode": pincode,
+                    "department": point_department
+                })
+        results.sort(key=lambda r: r["distance_km"])
+        return results[:limit]
+
+    def hotspots(self, limit=20, department=None, open_only=True):
+        """Pincodes with the most (open) grievances, with their centroid, district and state"""
+        self.queries += 1
+        column = "open" if open_only else "total"
+        query = "SELECT pincode, SUM(open), SUM(total) FROM pincode_counts"
+        params = []
+        if department:
+            query += " WHERE department = ?"
+            params.append(department)
+        query += f" GROUP BY pincode HAVING SUM({column}) > 0 ORDER BY SUM({column}) DESC, pincode LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+        hotspots = []
+        for pincode, open_count, total in rows:
+            hotspot = {"pincode": pincode, "open": open_count, "total": total}
+            entry = pincode_table.lookup(pincode)
+            if entry:
+                hotspot.update(entry)
+            hotspots.append(hotspot)
+        return hotspots
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            indexed = conn.execute("SELECT COUNT(*) FROM grievance_geo").fetchone()[0]
+            points = conn.execute("SELECT COUNT(*) FROM grievance_points").fetchone()[0]
+            pincodes = conn.execute("SELECT COUNT(DISTINCT pincode) FROM pincode_counts").fetchone()[0]
+        finally:
+            conn.close()
+        return {"indexed": indexed, "points": points, "pincodes": pincodes, "queries": self.queries}
@@ -0,0 +1,245 @@
+"""
+Grievance corpus shared by comprehensive_test_cases.py and the benchmarks
+"""
+
+location_tests = [
+    {
+        "id": 1,
+        "title": "Hospital Equipment - Complete Location",
+        "text": "No ventilators available. COVID patients suffering.",
+        "location": {
+            "city": "Mumbai",
+            "area": "Parel",
+            "pincode": "400012",
+            "specificLocation": "KEM Hospital"
+        },
+        "expected_dept": "Health",
+        "expected_priority": "high"
+    },
+    {
+        "id": 2,
+        "title": "Road Pothole - Complete Location",
+        "text": "Huge pothole causing accidents. 3 bikes damaged this week.",
+        "location": {
+            "city": "Mumbai",
+            "area": "Bandra West",
+            "pincode": "400050",
+            "specificLocation": "SV Road near Shoppers Stop"
+        },
+        "expected_dept": "Infrastructure",
+        "expected_priority": "high"
+    },
+    {
+        "id": 3,
+        "title": "Street Light - Complete Location",
+        "text": "Light not working. Dark and unsafe at night.",
+        "location": {
+            "city": "Mumbai",
+            "area": "Andheri East",
+            "pincode": "400069",
+            "specificLocation": "Sakinaka Metro Station exit"
+        },
+        "expected_dept": "Electricity",
+        "expected_priority": "medium"
+    }
+]
+
+vague_tests = [
+    {
+        "id": 1,
+        "title": "Vague Hospital Complaint",
+        "text": "Hospital has no medicines. Patients being turned away.",
+        "location": None,
+        "expected_dept": "Health",
+        "expected_priority": "high"
+    },
+    {
+        "id": 2,
+        "title": "Vague Road Complaint",
+        "text": "Road is full of potholes everywhere.",
+        "location": None,
+        "expected_dept": "Infrastructure",
+        "expected_priority": "medium"
+    },
+    {
+        "id": 3,
+        "title": "Vague Water Complaint",
+        "text": "No water supply for many days.",
+        "location": None,
+        "expected_dept": "Water Supply",
+        "expected_priority": "medium"
+    }
+]
+
+partial_tests = [
+    {
+        "id": 1,
+        "title": "City and Area, but No Specific Location",
+        "text": "School roof leaking badly. Children getting wet.",
+        "location": {
+            "city": "Mumbai",
+            "area": "Borivali",
+            "pincode": "",
+            "specificLocation": ""  # Missing!
+        },
+        "expected_dept": "Education",
+        "expected_priority": "medium"
+    },
+    {
+        "id": 2,
+        "title": "Only Specific Location in Text",
+        "text": "Garbage not collected at Lokhandwala Market for 2 weeks.",
+        "location": {
+            "city": "",
+            "area": "",
+            "pincode": "",
+            "specificLocation": ""
+        },
+        "expected_dept": "Sanitation",
+        "expected_priority": "medium"
+    }
+]
+
+sample_grievance = """**Issue Summary:** Broken street light causing safety concerns
+
+**Location Details:**
+- City/Region: Mumbai
+- Area/Locality: Andheri West
+- Specific Location: Near Sector 5 Park, next to XYZ School
+- Pincode: 400058
+
+**Detailed Description:** The street light has been non-functional for 2 weeks.
+
+**Impact:** Affects 200+ residents. Two theft incidents reported."""
+
+sample_location = {
+    "city": "Mumbai",
+    "area": "Andheri West",
+    "pincode": "400058",
+    "specificLocation": "Near Sector 5 Park, next to XYZ School"
+}
+
+closure_tests = [
+    {
+        "id": 1,
+        "title": "INADEQUATE - No Location Confirmation",
+        "closure": "All streetlights in Mumbai have been repaired.",
+        "should_approve": False
+    },
+    {
+        "id": 2,
+        "title": "INADEQUATE - Wrong Location",
+        "closure": "Streetlight repaired at Sector 3 Park, Andheri. Work order #123.",
+        "should_approve": False
+    },
+    {
+        "id": 3,
+        "title": "INADEQUATE - Vague Promise",
+        "closure": "We will look into the Andheri streetlight issue soon.",
+        "should_approve": False
+    },
+    {
+        "id": 4,
+        "title": "ADEQUATE - Correct Location + Details",
+        "closure": "Streetlight near Sector 5 Park, Andheri West (next to XYZ School) repaired on Jan 22. New LED installed. Work order #SL-445. Team: Municipal Electric.",
+        "should_approve": True
+    },
+    {
+        "id": 5,
+        "title": "ADEQUATE - Correct Location + Timeline",
+        "closure": "Light pole at Sector 5 Park area, Andheri West damaged beyond repair. New pole installation scheduled Jan 28. Temporary lighting installed Jan 23. Location: next to XYZ School gate.",
+        "should_approve": True
+    }
+]
+
+real_world = [
+    {
+        "id": 1,
+        "title": "Urgent Medical Emergency with Location",
+        "text": "Ambulance service not responding. Called 108 three times. Patient critical.",
+        "location": {
+            "city": "Mumbai",
+            "area": "Kurla West",
+            "pincode": "400070",
+            "specificLocation": "Building A, Nehru Nagar, Lane 5"
+        },
+        "expected_dept": "Health",
+        "expected_priority": "high"
+    },
+    {
+        "id": 2,
+        "title": "School Issue with Partial Info",
+        "text": "Teacher shortage. 50 students without math teacher for 1 month.",
+        "location": {
+            "city": "Pune",
+            "area": "Kothrud",
+            "pincode": "",
+            "specificLocation": "Municipal School #23"
+        },
+        "expected_dept": "Education",
+        "expected_priority": "medium"
+    },
+    {
+        "id": 3,
+        "title": "Water Crisis with Community Impact",
+        "text": "No water for 1 week. 500 families affected. Tanker not coming.",
+        "location": {
+            "city": "Delhi",
+            "area": "Rohini Sector 15",
+            "pincode": "110085",
+            "specificLocation": "Blocks A, B, C - Near Main Park"
+        },
+        "expected_dept": "Water Supply",
+        "expected_priority": "high"
+    },
+    {
+        "id": 4,
+        "title": "Cosmetic Request",
+        "text": "Minor issue: the paint on the garden railing has faded. Request repainting when possible.",
+        "location": {
+            "city": "Pune",
+            "area": "Aundh",
+            "pincode": "411007",
+            "specificLocation": "Sindh Society garden, Gate 2"
+        },
+        "expected_dept": "Municipal Services",
+        "expected_priority": "low"
+    },
+    {
+        "id": 5,
+        "title": "Hinglish Live Wire Hazard",
+        "text": "Bijli ka taar sadak par gira hai, bachche wahan khelte hain. Bahut khatarnak hai, turant thik karo.",
+        "location": {
+            "city": "Nagpur",
+            "area": "Sitabuldi",
+            "pincode": "440012",
+            "specificLocation": "Lane behind Modi No. 3 bus stop"
+        },
+        "expected_dept": "Electricity",
+        "expected_priority": "high"
+    },
+    {
+        "id": 6,
+        "title": "Sewage Overflow in Hindi",
+        "text": "हमारी गली में नाली पिछले दो हफ्ते से बंद है और गंदा पानी घरों में आ रहा है। कई शिकायत की पर कोई सुनवाई नहीं।",
+        "location": {
+            "city": "Lucknow",
+            "area": "Aliganj",
+            "pincode": "226024",
+            "specificLocation": "Sector B, near Kapoorthala crossing"
+        },
+        "expected_dept": "Sanitation",
+        "expected_priority": "medium"
+    }
+]
+
+
+def all_grievances():
+    """Every grievance in the corpus as (text, location, expected_dept, expected_priority)"""
+    for test in location_tests + vague_tests + partial_tests + real_world:
+        yield (
+            test["text"],
+            test["location"],
+            test.get("expected_dept"),
+            test.get("expected_priority")
+        )
@@ -0,0 +1,141 @@
+import os
+import re
+import time
+import random
+import threading
+
+# Grievance IDs look like GRV0Q4M9XT5K7B0012 and are built from
+#   7 chars  seconds since ID_EPOCH   (35 bits, ~1000 years)
+#   4 chars  node id                  (20 bits, random per process)
+#   3 chars  sequence within second   (15 bits, 32768/s per process)
+#   1 char   Luhn mod 32 check character
+# in Crockford base32, so IDs sort by creation time as plain strings and
+# every process can generate them without coordinating with the others.
+
+ID_PREFIX = "GRV"
+ID_EPOCH = 1704067200  # 2024-01-01 UTC
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALUES = {char: i for i, char in enumerate(ALPHABET)}
+# Crockford decoding is forgiving about look-alike characters
+_ALIASES = str.maketrans({"O": "0", "I": "1", "L": "1"})
+
+TIME_CHARS = 7
+NODE_CHARS = 4
+SEQ_CHARS = 3
+BODY_CHARS = TIME_CHARS + NODE_CHARS + SEQ_CHARS
+
+MAX_SEQ = 32 ** SEQ_CHARS
+
+# Matches new IDs and the old GRV + 6 digit IDs still held by citizens.
+# Look-alikes (I, L, O) are accepted so a retyped ID is still found;
+# normalize_grievance_id maps them and the check character rejects typos
+GRIEVANCE_ID_PATTERN = re.compile(
+    r"\bGRV(?:[0-9A-TV-Z]{%d}|\d{6})\b" % (BODY_CHARS + 1),
+    re.IGNORECASE
+)
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def _decode(text):
+    value = 0
+    for char in text:
+        value = value * 32 + _VALUES[char]
+    return value
+
+
+def check_character(body):
+    """Luhn mod 32 check character for an ID body"""
+    factor = 2
+    total = 0
+    for char in reversed(body):
+        addend = factor * _VALUES[char]
+        factor = 1 if factor == 2 else 2
+        total += addend // 32 + addend % 32
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+class GrievanceIdGenerator:
+    """
+    Time-ordered ID generator. IDs from one process are strictly
+    increasing; IDs from different processes are ordered to the second.
+    If a process exhausts the sequence within a second it borrows the
+    next second rather than blocking, which keeps IDs monotonic.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._node = random.SystemRandom().getrandbits(5 * NODE_CHARS)
+        self._last_second = -1
+        self._seq = 0
+
+    def new_id(self):
+        with self._lock:
+            second = int(time.time()) - ID_EPOCH
+            if second > self._last_second:
+                self._last_second = second
+                self._seq = 0
+            else:
+                self._seq += 1
+                if self._seq >= MAX_SEQ:
+                    self._last_second += 1
+                    self._seq = 0
+            body = (
+                _encode(self._last_second, TIME_CHARS)
+                + _encode(self._node, NODE_CHARS)
+                + _encode(self._seq, SEQ_CHARS)
+            )
+        return ID_PREFIX + body + check_character(body)
+
+
+_generator = GrievanceIdGenerator()
+
+# Forked workers (e.g. gunicorn) must not share the parent's node id
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_generator._reset)
+
+
+def new_grievance_id():
+    return _generator.new_id()
+
+
+def normalize_grievance_id(text):
+    """Uppercases an ID and maps Crockford look-alikes (O→0, I/L→1)"""
+    text = str(text or "").strip().upper()
+    if not text.startswith(ID_PREFIX):
+        return text
+    return ID_PREFIX + text[len(ID_PREFIX):].translate(_ALIASES)
+
+
+def is_valid_grievance_id(grievance_id):
+    """True for a well-formed ID with a correct check character (or a legacy ID)"""
+    grievance_id = normalize_grievance_id(grievance_id)
+    if not grievance_id.startswith(ID_PREFIX):
+        return False
+    body = grievance_id[len(ID_PREFIX):]
+    if len(body) == 6 and body.isdigit():
+        return True
+    if len(body) != BODY_CHARS + 1 or any(char not in _VALUES for char in body):
+        return False
+    return check_character(body[:-1]) == body[-1]
+
+
+def grievance_id_timestamp(grievance_id):
+    """Creation time (epoch seconds) encoded in an ID, or None for legacy IDs"""
+    grievance_id = normalize_grievance_id(grievance_id)
+    if not is_valid_grievance_id(grievance_id):
+        return None
+    body = grievance_id[len(ID_PREFIX):]
+    if body.isdigit():
+        return None
+    return _decode(body[:TIME_CHARS]) + ID_EPOCH
@@ -0,0 +1,170 @@
+import time
+import asyncio
+import threading
+
+from pipeline import run_grievance_stages, arun_grievance_stages
+from ai_service import analyze_image, aanalyze_image, basic_structured_report
+from grievance_store import create_repository
+from duplicate_index import DuplicateIndex, DEDUPE_WINDOW_DAYS, DEDUPE_STRICT_THRESHOLD
+from rule_classifier import classify_department_rules, RULE_CONFIDENCE_THRESHOLD
+from notification_outbox import NotificationOutbox
+from geo_index import GeoIndex
+
+# Processed grievances, looked up by ID / phone / department / priority
+grievance_store = create_repository()
+
+# WhatsApp messages, in the grievance database so a grievance and its
+# confirmation commit together (senders are started by app.py)
+notification_outbox = NotificationOutbox(grievance_store.path)
+grievance_store.on_notifications = notification_outbox.wake
+
+# Points and per-pincode counts, maintained by grievance_store's writes
+geo_index = GeoIndex(grievance_store.path)
+
+# Recent grievances by pincode / city, for linking near-duplicates;
+# filled by start_services()
+duplicate_index = DuplicateIndex()
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_services():
+    """
+    Starts the store's flusher and loads the recent grievances into the
+    duplicate index. Runs once per process, after any fork (idempotent).
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        grievance_store.start()
+        if duplicate_index.enabled:
+            started = time.perf_counter()
+            recent = grievance_store.find(since=time.time() - DEDUPE_WINDOW_DAYS * 86400, limit=50000)
+            for g in reversed(recent):
+                duplicate_index.add(g["grievance_id"], g["grievance_text"], g["location"], g["cluster_id"],
+                                    g["created_at"])
+            print(f"✅ Duplicate index loaded {len(recent)} grievances in {time.perf_counter() - started:.1f}s")
+
+
+def process_or_link(grievance_text, location_data, image_path=None, fetch_image=None, mode=None, on_delta=None):
+    """
+    Links a near-duplicate of a recent grievance at the same pincode / city
+    to its cluster and reuses that grievance's AI results; anything else
+    goes through the full AI pipeline. Attached images are still analyzed.
+
+    Returns the pipeline result plus cluster_id and similarity (None when
+    the grievance starts a new cluster).
+    """
+    canonical, cluster_id, score = find_canonical(grievance_text, location_data)
+    if not canonical:
+        result = run_grievance_stages(
+            grievance_text,
+            location_data,
+            image_path=image_path,
+            fetch_image=fetch_image,
+            mode=mode,
+            on_delta=on_delta
+        )
+        result["cluster_id"] = None
+        result["similarity"] = None
+        return result
+
+    print(f"🔗 Duplicate of {cluster_id} (similarity {score:.2f}) - skipping AI pipeline")
+    image_analysis = None
+    try:
+        if fetch_image and not image_path:
+            image_path = fetch_image()
+        if image_path:
+            image_analysis = analyze_image(image_path, grievance_text)
+    except Exception as e:
+        print(f"❌ Image error: {e}")
+
+    return duplicate_result(canonical, cluster_id, score, image_analysis, grievance_text, location_data)
+
+
+async def aprocess_or_link(grievance_text, location_data, image_path=None, fetch_image=None, mode=None,
+                           on_delta=None):
+    """process_or_link() for the async serving path; fetch_image runs in a thread"""
+    canonical, cluster_id, score = await asyncio.to_thread(find_canonical, grievance_text, location_data)
+    if not canonical:
+        result = await arun_grievance_stages(
+            grievance_text,
+            location_data,
+            image_path=image_path,
+            fetch_image=fetch_image,
+            mode=mode,
+            on_delta=on_delta
+        )
+        result["cluster_id"] = None
+        result["similarity"] = None
+        return result
+
+    print(f"🔗 Duplicate of {cluster_id} (similarity {score:.2f}) - skipping AI pipeline")
+    image_analysis = None
+    try:
+        if fetch_image and not image_path:
+            image_path = await asyncio.to_thread(fetch_image)
+        if image_path:
+            image_analysis = await aanalyze_image(image_path, grievance_text)
+    except Exception as e:
+        print(f"❌ Image error: {e}")
+
+    return duplicate_result(canonical, cluster_id, score, image_analysis, grievance_text, location_data)
+
+
+def find_canonical(grievance_text, location_data):
+    """(canonical grievance, cluster_id, similarity) of a recent near-duplicate, else (None, None, None)"""
+    match = duplicate_index.find_duplicate(grievance_text, location_data)
+    if not match:
+        return None, None, None
+    matched_id, cluster_id, score = match
+    canonical = grievance_store.get(cluster_id) or grievance_store.get(matched_id)
+    if canonical and score < DEDUPE_STRICT_THRESHOLD and not departments_agree(
+            grievance_text, canonical["grievance_text"]):
+        print(f"↔️ Similar to {cluster_id} ({score:.2f}) but departments may differ - running AI pipeline")
+        return None, None, None
+    return canonical, cluster_id, score
+
+
+def departments_agree(text, other_text):
+    """Both texts are confidently classified into the same department by the rules"""
+    department, confidence, _ = classify_department_rules(text)
+    if department is None or confidence < RULE_CONFIDENCE_THRESHOLD:
+        return False
+    other, other_confidence, _ = classify_department_rules(other_text)
+    return other == department and other_confidence >= RULE_CONFIDENCE_THRESHOLD
+
+
+def duplicate_result(canonical, cluster_id, score, image_analysis, grievance_text, location_data):
+    """
+    Result for a linked near-duplicate. Only the classification comes from
+    the canonical grievance; the report is built from this submission, so
+    no citizen sees another citizen's text or location.
+    """
+    return {
+        "structured": basic_structured_report(grievance_text, location_data),
+        "department": canonical["department"],
+        "priority": canonical["priority"],
+        "image_analysis": image_analysis,
+        "mode": "duplicate",
+        "stages": {},
+        "cluster_id": cluster_id,
+        "similarity": round(score, 3)
+    }
+
+
+def record_grievance(grievance, notifications=None):
+    """
+    Stores a processed grievance, with the messages announcing it, and
+    adds it to the duplicate index
+    """
+    grievance_store.add(grievance, notifications)
+    duplicate_index.add(
+        grievance["grievance_id"],
+        grievance["grievance_text"],
+        grievance.get("location"),
+        grievance.get("cluster_id")
+    )
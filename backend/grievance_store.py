@@ -0,0 +1,400 @@
+import os
+import re
+import json
+import time
+import atexit
+import sqlite3
+import threading
+
+from notification_outbox import create_outbox_table, insert_notifications
+from geo_index import create_geo_tables, index_grievances, update_open, normalize_pincode, resolve_pincode
+
+GRIEVANCE_DB = os.getenv("GRIEVANCE_DB", "grievances.db")
+# Writes are buffered and committed together once this many are pending
+# or the flush interval passes, whichever comes first
+GRIEVANCE_BATCH_SIZE = int(os.getenv("GRIEVANCE_BATCH_SIZE", "50"))
+GRIEVANCE_FLUSH_INTERVAL = float(os.getenv("GRIEVANCE_FLUSH_INTERVAL", "0.5"))
+
+COLUMNS = [
+    "grievance_id",
+    "phone",
+    "source",
+    "grievance_text",
+    "structured",
+    "department",
+    "priority",
+    "status",
+    "city",
+    "state",
+    "area",
+    "pincode",
+    "location",
+    "image_analysis",
+    "cluster_id",
+    "created_at",
+    "updated_at",
+]
+
+JSON_COLUMNS = ("location", "image_analysis")
+
+# Workflow states a grievance moves through; geo_index counts the
+# CLOSED_STATUSES among them as no longer open
+GRIEVANCE_STATUSES = ("Submitted", "Acknowledged", "In Progress", "Resolved", "Closed", "Rejected")
+
+
+def normalize_status(value):
+    """Canonical spelling of a workflow status ("in progress" -> "In Progress"), or None"""
+    wanted = " ".join(str(value or "").replace("_", " ").split()).lower()
+    for status in GRIEVANCE_STATUSES:
+        if status.lower() == wanted:
+            return status
+    return None
+
+
+def normalize_phone(phone_number):
+    """
+    Normalizes a phone number to E.164, defaulting to +91.
+    Accepts "whatsapp:" prefixed Twilio addresses. Returns "" if empty.
+    """
+    phone_number = str(phone_number or "").strip()
+    if phone_number.startswith("whatsapp:"):
+        phone_number = phone_number[len("whatsapp:"):]
+
+    clean_number = re.sub(r"[^\d+]", "", phone_number)
+    if not clean_number:
+        return ""
+
+    # Add +91 fallback
+    if not clean_number.startswith("+"):
+        if clean_number.startswith("91") and len(clean_number) > 10:
+            clean_number = "+" + clean_number
+        else:
+            clean_number = "+91" + clean_number
+    return clean_number
+
+
+class GrievanceRepository:
+    """
+    Storage interface for processed grievances.
+
+    A grievance is a dict with the keys in COLUMNS; location and
+    image_analysis are dicts, timestamps are epoch seconds.
+    """
+
+    def add(self, grievance, notifications=None):
+        """
+        notifications are outbox entries (notification_outbox.notification)
+        committed together with the grievance
+        """
+        raise NotImplementedError
+
+    def add_many(self, grievances):
+        for grievance in grievances:
+            self.add(grievance)
+
+    def get(self, grievance_id):
+        raise NotImplementedError
+
+    def find_by_phone(self, phone_number, limit=20):
+        raise NotImplementedError
+
+    def find(self, department=None, priority=None, status=None, since=None, cluster_id=None, limit=50, offset=0):
+        raise NotImplementedError
+
+    def update_status(self, grievance_id, status):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def start(self):
+        """Starts any background work the repository needs (idempotent)"""
+        pass
+
+    def stats(self):
+        return {}
+
+
+class SQLiteGrievanceRepository(GrievanceRepository):
+    """
+    SQLite implementation. Point lookups use the grievance_id primary
+    key; phone, department, priority and created_at are indexed.
+    """
+
+    def __init__(self, path=GRIEVANCE_DB, batch_size=GRIEVANCE_BATCH_SIZE, flush_interval=GRIEVANCE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_notifications = []
+        # Called after a flush committed outbox rows (wakes the sender)
+        self.on_notifications = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._init_db()
+        atexit.register(self.flush)
+
+    def start(self):
+        """Starts the thread that commits buffered writes after flush_interval (idempotent)"""
+        with self._lock:
+            if self._flusher:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="grievance-flush", daemon=True)
+            self._flusher.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate_clustered(conn)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS grievances (
+                    grievance_id TEXT PRIMARY KEY,
+                    phone TEXT,
+                    source TEXT,
+                    grievance_text TEXT NOT NULL,
+                    structured TEXT,
+                    department TEXT,
+                    priority TEXT,
+                    status TEXT NOT NULL,
+                    city TEXT,
+                    state TEXT,
+                    area TEXT,
+                    pincode TEXT,
+                    location TEXT,
+                    image_analysis TEXT,
+                    cluster_id TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grievances_phone ON grievances(phone, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grievances_department ON grievances(department, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grievances_priority ON grievances(priority, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grievances_created ON grievances(created_at)")
+            self._add_missing_columns(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grievances_cluster ON grievances(cluster_id)")
+            create_outbox_table(conn)
+            create_geo_tables(conn)
+            self._backfill_geo(conn)
+
+    @staticmethod
+    def _add_missing_columns(conn):
+        """Adds columns introduced after a database was created"""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(grievances)")}
+        for col in COLUMNS:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE grievances ADD COLUMN {col} TEXT")
+
+    @staticmethod
+    def _migrate_clustered(conn):
+        """
+        Grievance IDs are time-ordered, so the table is clustered on
+        grievance_id (WITHOUT ROWID) and new rows append to the end of
+        the primary key b-tree. Rebuilds tables created before that.
+        """
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'grievances'"
+        ).fetchone()
+        if row is None or "WITHOUT ROWID" in row[0].upper():
+            return
+        print("🔧 Migrating grievances table to a clustered primary key")
+        conn.execute("ALTER TABLE grievances RENAME TO grievances_old")
+        for index in ("phone", "department", "priority", "created"):
+            conn.execute(f"DROP INDEX IF EXISTS idx_grievances_{index}")
+        conn.execute(row[0].rstrip() + " WITHOUT ROWID")
+        conn.execute("INSERT INTO grievances SELECT * FROM grievances_old")
+        conn.execute("DROP TABLE grievances_old")
+
+    def _backfill_geo(self, conn):
+        """Indexes grievances stored before the geo tables existed"""
+        if conn.execute("SELECT 1 FROM grievance_geo LIMIT 1").fetchone():
+            return
+        cursor = conn.execute(
+            "SELECT grievance_id, pincode, department, status, location, created_at FROM grievances"
+        )
+        indexed = 0
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            index_grievances(conn, [dict(row, location=json.loads(row["location"] or "{}")) for row in rows])
+            indexed += len(rows)
+        if indexed:
+            print(f"🗺️ Indexed {indexed} existing grievances by location")
+
+    # ------------------------
+    # Writes
+    # ------------------------
+    def add(self, grievance, notifications=None):
+        record = self._prepare(grievance)
+        with self._lock:
+            self._pending[record["grievance_id"]] = record
+            if notifications:
+                self._pending_notifications.extend(notifications)
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def add_many(self, grievances):
+        with self._lock:
+            for grievance in grievances:
+                record = self._prepare(grievance)
+                self._pending[record["grievance_id"]] = record
+        self.flush()
+
+    def update_status(self, grievance_id, status):
+        self.flush()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE grievances SET status = ?, updated_at = ? WHERE grievance_id = ?",
+                (status, time.time(), grievance_id)
+            )
+            if cur.rowcount:
+                update_open(conn, grievance_id, status)
+            return cur.rowcount > 0
+
+    def flush(self):
+        """Commits all buffered writes, with their outbox entries, in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())
+                notifications = self._pending_notifications
+                self._pending = {}
+                self._pending_notifications = []
+            if not batch:
+                return 0
+
+            placeholders = ", ".join("?" for _ in COLUMNS)
+            rows = [tuple(self._encode(record)[col] for col in COLUMNS) for record in batch]
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO grievances ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                        rows
+                    )
+                    index_grievances(conn, batch)
+                    insert_notifications(conn, notifications)
+            except Exception as e:
+                print(f"❌ Grievance store flush failed: {e}")
+                # Put the batch back unless newer versions arrived meanwhile
+                with self._lock:
+                    for record in batch:
+                        self._pending.setdefault(record["grievance_id"], record)
+                    self._pending_notifications[:0] = notifications
+                raise
+            if notifications and self.on_notifications:
+                self.on_notifications()
+            return len(batch)
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _prepare(grievance):
+        now = time.time()
+        location = grievance.get("location") or {}
+        record = {col: grievance.get(col) for col in COLUMNS}
+        record["phone"] = normalize_phone(grievance.get("phone"))
+        record["status"] = grievance.get("status") or "Submitted"
+        record["city"] = record["city"] or location.get("city", "")
+        record["state"] = record["state"] or location.get("state", "")
+        record["area"] = record["area"] or location.get("area", "")
+        record["pincode"] = normalize_pincode(record["pincode"]) or resolve_pincode(location)
+        record["location"] = location
+        record["cluster_id"] = record["cluster_id"] or record["grievance_id"]
+        record["created_at"] = record["created_at"] or now
+        record["updated_at"] = now
+        return record
+
+    @staticmethod
+    def _encode(record):
+        encoded = dict(record)
+        for col in JSON_COLUMNS:
+            encoded[col] = json.dumps(record[col]) if record[col] is not None else None
+        return encoded
+
+    @staticmethod
+    def _decode(row):
+        record = dict(row)
+        for col in JSON_COLUMNS:
+            record[col] = json.loads(record[col]) if record[col] else None
+        return record
+
+    # ------------------------
+    # Reads
+    # ------------------------
+    def get(self, grievance_id):
+        with self._lock:
+            record = self._pending.get(grievance_id)
+        if record:
+            return dict(record)
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM grievances WHERE grievance_id = ?", (grievance_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def find_by_phone(self, phone_number, limit=20):
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM grievances WHERE phone = ? ORDER BY created_at DESC LIMIT ?",
+                (normalize_phone(phone_number), limit)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def find(self, department=None, priority=None, status=None, since=None, cluster_id=None, limit=50, offset=0):
+        self.flush()
+        clauses = []
+        params = []
+        if department:
+            clauses.append("department = ?")
+            params.append(department)
+        if priority:
+            clauses.append("priority = ?")
+            params.append(priority)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if cluster_id:
+            clauses.append("cluster_id = ?")
+            params.append(cluster_id)
+
+        query = "SELECT * FROM grievances"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def stats(self):
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM grievances").fetchone()[0]
+        with self._lock:
+            pending = len(self._pending)
+        return {"grievances": total, "pending_writes": pending, "path": self.path}
+
+
+def create_repository():
+    """Repository used by the app (SQLite at GRIEVANCE_DB)"""
+    return SQLiteGrievanceRepository()
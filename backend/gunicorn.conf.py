@@ -0,0 +1,44 @@
+# Production launcher: gunicorn -c gunicorn.conf.py
+#
+# SERVER_MODE=wsgi  Flask app on threaded workers (app:app)
+# SERVER_MODE=asgi  asgi_app:app on uvicorn workers; /process_grievance
+#                   awaits the LLM and Twilio instead of holding a thread
+import os
+import multiprocessing
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+
+# Each worker runs its own LLM scheduler; this makes each one take an
+# equal share of the provider limits (LLM_REQUESTS_PER_MINUTE and
+# LLM_TOKENS_PER_MINUTE, when set) instead of the whole budget. Workers
+# inherit the environment
+os.environ.setdefault("LLM_WORKER_PROCESSES", str(workers))
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "asgi_app:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+    worker_class = "gthread"
+    # Sync requests hold a thread for the whole pipeline
+    threads = int(os.getenv("WEB_THREADS", "16"))
+
+# Long enough for a sync pipeline with vision and retries
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Threads don't survive the fork, so each worker starts its own job
+    # workers, outbox senders and store flusher
+    from app import start_background_services
+
+    start_background_services()
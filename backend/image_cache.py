@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "5000"))
+# Max differing bits (out of 64) for two images to count as the same photo
+IMAGE_HASH_MAX_DISTANCE = int(os.getenv("IMAGE_HASH_MAX_DISTANCE", "6"))
+# Min word overlap (Jaccard) between the grievances for an analysis to be reused
+IMAGE_CACHE_MIN_TEXT_OVERLAP = float(os.getenv("IMAGE_CACHE_MIN_TEXT_OVERLAP", "0.2"))
+
+_WORD = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def dhash(image, size=8):
+    """
+    64-bit difference hash of a decoded PIL image: shrink to (size+1)xsize
+    grayscale and record whether each pixel is brighter than its right
+    neighbour. Robust to re-encoding, resizing and WhatsApp recompression.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def text_tokens(text):
+    return frozenset(word.lower() for word in _WORD.findall(text or ""))
+
+
+def text_overlap(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PerceptualImageCache:
+    """
+    Bounded LRU index of analyzed images keyed by dHash.
+
+    Lookups scan the index comparing Hamming distance; with 64-bit ints
+    this stays around a millisecond at the default size.
+    """
+
+    def __init__(self, max_entries=IMAGE_CACHE_SIZE, max_distance=IMAGE_HASH_MAX_DISTANCE,
+                 min_text_overlap=IMAGE_CACHE_MIN_TEXT_OVERLAP):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.min_text_overlap = min_text_overlap
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.near_misses = 0
+        self.evictions = 0
+
+    def lookup(self, image_hash, grievance_text):
+        """
+        Returns (analysis, distance) for the closest cached image that is
+        within max_distance and was analyzed for a compatible grievance,
+        or (None, None).
+        """
+        tokens = text_tokens(grievance_text)
+        best = None
+        with self._lock:
+            self.lookups += 1
+            for key, entry in self._entries.items():
+                distance = hamming(key, image_hash)
+                if distance > self.max_distance:
+                    continue
+                if text_overlap(tokens, entry["tokens"]) < self.min_text_overlap:
+                    # Same photo, but attached to an unrelated complaint
+                    self.near_misses += 1
+                    continue
+                if best is None or distance < best[1]:
+                    best = (key, distance)
+                    if distance == 0:
+                        break
+
+            if best is None:
+                return None, None
+            self.hits += 1
+            self._entries.move_to_end(best[0])
+            return dict(self._entries[best[0]]["analysis"]), best[1]
+
+    def add(self, image_hash, grievance_text, analysis):
+        with self._lock:
+            self._entries[image_hash] = {
+                "analysis": analysis,
+                "tokens": text_tokens(grievance_text)
+            }
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "rejected_incompatible": self.near_misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,125 @@
+import os
+import io
+import base64
+import hashlib
+import tempfile
+
+import requests
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+# What the vision model gets: longest side and JPEG quality
+VISION_MAX_DIMENSION = int(os.getenv("VISION_MAX_DIMENSION", "1024"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "80"))
+
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".heic"}
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload or download exceeds MAX_IMAGE_BYTES"""
+
+
+def stream_to_file(chunks, dest_dir, extension=".jpg", max_bytes=MAX_IMAGE_BYTES):
+    """
+    Writes an iterable of byte chunks to dest_dir, hashing as it goes.
+    The file is named after its SHA-256, so identical images share a path.
+
+    Returns {"path", "size", "sha256"}. Raises ImageTooLarge (and removes
+    the partial file) once more than max_bytes have been received.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageTooLarge(f"Image exceeds {max_bytes / (1024 * 1024):.1f} MB limit")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    extension = extension.lower() if extension.lower() in ALLOWED_EXTENSIONS else ".jpg"
+    path = os.path.join(dest_dir, f"{sha256[:32]}{extension}")
+    os.replace(tmp_path, path)
+
+    return {"path": path, "size": size, "sha256": sha256}
+
+
+def save_upload(file_storage, dest_dir="uploads", max_bytes=MAX_IMAGE_BYTES):
+    """Streams a werkzeug FileStorage upload to disk in chunks"""
+    extension = os.path.splitext(file_storage.filename or "")[1]
+    stream = file_storage.stream
+    chunks = iter(lambda: stream.read(CHUNK_SIZE), b"")
+    return stream_to_file(chunks, dest_dir, extension, max_bytes)
+
+
+def download_image(url, auth=None, dest_dir=None, max_bytes=MAX_IMAGE_BYTES, timeout=10):
+    """
+    Streams a remote image (e.g. Twilio media) to disk without buffering
+    the whole body. Rejects oversized files from Content-Length up front.
+    """
+    dest_dir = dest_dir or os.path.join(tempfile.gettempdir(), "nyaya_media")
+    with requests.get(url, auth=auth, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        length = r.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ImageTooLarge(f"Image exceeds {max_bytes / (1024 * 1024):.1f} MB limit")
+
+        content_type = r.headers.get("Content-Type", "")
+        extension = "." + content_type.split("/")[-1].split(";")[0] if content_type.startswith("image/") else ".jpg"
+        return stream_to_file(r.iter_content(CHUNK_SIZE), dest_dir, extension, max_bytes)
+
+
+def decode_image(image_path, max_dimension=VISION_MAX_DIMENSION):
+    """
+    The one decode of an uploaded image that every analysis shares.
+
+    Returns {"image", "width", "height", "format"}: image is an upright
+    RGB copy downscaled to max_dimension on the longest side, the others
+    describe the original file. None if Pillow can't read it.
+    """
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(image_path) as img:
+            width, height = img.size
+            format_name = img.format
+            # Let the JPEG decoder skip detail we would throw away anyway
+            img.draft("RGB", (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(img)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((max_dimension, max_dimension))
+    except Exception as e:
+        print(f"⚠️ Image decode failed: {e}")
+        return None
+
+    return {"image": image, "width": width, "height": height, "format": format_name}
+
+
+def prepare_image_for_vision(image_path, decoded=None, quality=VISION_JPEG_QUALITY):
+    """
+    Base64 JPEG of the downscaled image for the vision model, from
+    decode_image()'s result when the caller already has it. Falls back to
+    the original bytes if Pillow can't handle the file.
+    """
+    if decoded is None:
+        decoded = decode_image(image_path)
+    if decoded is None:
+        print("⚠️ Image downscale failed, sending original")
+        with open(image_path, "rb") as image_file:
+            return base64.b64encode(image_file.read()).decode("utf-8")
+
+    buffer = io.BytesIO()
+    decoded["image"].save(buffer, format="JPEG", quality=quality, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+
+from metrics import job_seconds, errors
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A running job whose lease expires (worker crashed or restarted) is
+# picked up again by any other worker, up to JOB_MAX_ATTEMPTS times
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Finished (done or dead-lettered) jobs are deleted this long after their
+# last update; 0 keeps them forever. Idle workers sweep once per interval
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_PRUNE_INTERVAL = float(os.getenv("JOB_PRUNE_INTERVAL", "3600"))
+
+
+class JobQueue:
+    """
+    Durable work queue on SQLite.
+
+    Jobs survive restarts: a job is only removed from the runnable set
+    once its handler returns, and a claimed job holds a lease so that
+    work orphaned by a dead worker is retried. Several processes can
+    share one database file.
+    """
+
+    def __init__(self, path=JOB_QUEUE_DB, workers=JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_prune = 0.0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    ref TEXT,
+                    dedupe_key TEXT UNIQUE,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_after REAL NOT NULL,
+                    lease_until REAL,
+                    lease_owner TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(status, run_after)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ref ON jobs(ref)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+        finally:
+            conn.close()
+
+    # ------------------------
+    # Producer side
+    # ------------------------
+    def register(self, kind, handler):
+        """handler(payload) -> JSON-serializable result"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, ref=None, dedupe_key=None):
+        """
+        Persists a job and wakes a worker. Returns the job id, or None if
+        a job with the same dedupe_key already exists.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, ref, dedupe_key, payload, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, ref, dedupe_key, json.dumps(payload), now, now, now)
+            )
+            job_id = cur.lastrowid if cur.rowcount else None
+        finally:
+            conn.close()
+
+        if job_id:
+            self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self._fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
+
+    def get_by_ref(self, ref):
+        """Latest job for a reference such as a grievance ID"""
+        return self._fetch_one("SELECT * FROM jobs WHERE ref = ? ORDER BY id DESC LIMIT 1", (ref,))
+
+    def _fetch_one(self, query, params):
+        conn = self._connect()
+        try:
+            row = conn.execute(query, params).fetchone()
+        finally:
+            conn.close()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
+
+    def prune(self, older_than):
+        """Deletes done and failed jobs last updated more than older_than seconds ago"""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+        finally:
+            conn.close()
+        if cur.rowcount:
+            print(f"🧹 Pruned {cur.rowcount} finished jobs")
+        return cur.rowcount
+
+    def _maybe_prune(self):
+        # One worker per interval runs the retention sweep
+        if JOB_RETENTION_DAYS <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + JOB_PRUNE_INTERVAL
+        self.prune(JOB_RETENTION_DAYS * 86400)
+
+    # ------------------------
+    # Worker side
+    # ------------------------
+    def claim(self):
+        """
+        Atomically takes the next runnable job, or returns None. A job
+        whose lease expired already used up an attempt (its worker died
+        mid-run), so it is dead-lettered once that reaches JOB_MAX_ATTEMPTS.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE "
+                    "(status = 'queued' AND run_after <= ?) OR "
+                    "(status = 'running' AND lease_until < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] == "running" and row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, lease_owner = NULL, "
+                        "updated_at = ? WHERE id = ?",
+                        (f"Lease expired on attempt {row['attempts']} (worker lost)", now, row["id"])
+                    )
+                    print(f"❌ Job {row['id']} ({row['kind']}) dead-lettered after {row['attempts']} lost leases")
+                    continue
+                break
+            owner = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                "lease_until = ?, lease_owner = ?, updated_at = ? WHERE id = ?",
+                (now + JOB_LEASE_SECONDS, owner, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        job = self._to_dict(row)
+        job["attempts"] += 1
+        job["lease_owner"] = owner
+        return job
+
+    def complete(self, job_id, result, owner):
+        """Marks a job done; False if the caller's lease was lost to another worker"""
+        return self._update(job_id, owner, status="done", result=json.dumps(result), error=None, lease_until=None)
+
+    def fail(self, job_id, error, attempts, owner):
+        if attempts < JOB_MAX_ATTEMPTS:
+            delay = JOB_RETRY_DELAY * (2 ** (attempts - 1))
+            return self._update(job_id, owner, status="queued", error=error, run_after=time.time() + delay,
+                                lease_until=None)
+        return self._update(job_id, owner, status="failed", error=error, lease_until=None)
+
+    def heartbeat(self, progress=None):
+        """
+        Renews the lease of the job running on the calling worker thread.
+        Long handlers (batch imports) call this so they aren't reclaimed;
+        progress, if given, is kept as the job's result until it finishes.
+        """
+        job_id = getattr(self._local, "job_id", None)
+        if job_id is None:
+            return
+        fields = {"lease_until": time.time() + JOB_LEASE_SECONDS}
+        if progress is not None:
+            fields["result"] = json.dumps(progress)
+        self._update(job_id, self._local.lease_owner, **fields)
+
+    def _update(self, job_id, owner, **fields):
+        """Updates a job only while owner still holds its lease"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND lease_owner = ?",
+                (*fields.values(), job_id, owner)
+            )
+        finally:
+            conn.close()
+        if not cur.rowcount:
+            print(f"⚠️ Job {job_id} lease was lost to another worker - update dropped")
+        return cur.rowcount > 0
+
+    def run_job(self, job):
+        handler = self.handlers.get(job["kind"])
+        owner = job["lease_owner"]
+        if handler is None:
+            self.fail(job["id"], f"No handler for job kind '{job['kind']}'", JOB_MAX_ATTEMPTS, owner)
+            return
+        self._local.job_id = job["id"]
+        self._local.lease_owner = owner
+        started = time.perf_counter()
+        try:
+            result = handler(job["payload"])
+            self.complete(job["id"], result, owner)
+            job_seconds.observe(time.perf_counter() - started, kind=job["kind"], outcome="done")
+            print(f"✅ Job {job['id']} ({job['kind']}) done")
+        except Exception as e:
+            job_seconds.observe(time.perf_counter() - started, kind=job["kind"], outcome="failed")
+            errors.inc(component="job", type=type(e).__name__)
+            print(f"❌ Job {job['id']} ({job['kind']}) failed (attempt {job['attempts']}): {e}")
+            traceback.print_exc()
+            self.fail(job["id"], str(e), job["attempts"], owner)
+        finally:
+            self._local.job_id = None
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.claim()
+                if job is None:
+                    self._maybe_prune()
+            except Exception as e:
+                print(f"❌ Job queue error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def start(self):
+        """Starts the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"✅ Job queue started with {self.workers} workers ({self.path})")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
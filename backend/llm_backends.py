@@ -0,0 +1,480 @@
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from clients import groq_client
+from llm_scheduler import time_left
+
+# groq (default) | record | replay | fake
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_FIXTURES_DIR = os.getenv("LLM_FIXTURES_DIR", os.path.join(os.path.dirname(__file__), "fixtures", "llm"))
+
+# Fake backend: latency distribution in ms ("fixed:300", "uniform:200:800",
+# "normal:400:100", "lognormal:400:0.5" = median and sigma), share of
+# calls that fail, and which share of those failures are 429s vs 500s
+LLM_FAKE_LATENCY = os.getenv("LLM_FAKE_LATENCY", "lognormal:300:0.5")
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+LLM_FAKE_RATE_LIMIT_SHARE = float(os.getenv("LLM_FAKE_RATE_LIMIT_SHARE", "0.5"))
+LLM_FAKE_SEED = os.getenv("LLM_FAKE_SEED")
+
+STREAM_CHUNK_CHARS = 4
+
+
+# ------------------------
+# Response shapes (same attributes as the Groq SDK objects we read)
+# ------------------------
+def completion(content, total_tokens=None):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+        usage=SimpleNamespace(total_tokens=total_tokens)
+    )
+
+
+class ChunkStream:
+    """
+    Streams content in small chunks, optionally spacing them out in time.
+    Iterable with for (sleeping between chunks) or async for (awaiting).
+    """
+
+    def __init__(self, content, chunk_delay=0.0):
+        self.content = content
+        self.chunk_delay = chunk_delay
+        self.closed = False
+
+    def _chunk(self, i):
+        piece = self.content[i:i + STREAM_CHUNK_CHARS]
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    def __iter__(self):
+        for i in range(0, len(self.content), STREAM_CHUNK_CHARS):
+            if self.closed:
+                return
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield self._chunk(i)
+
+    async def __aiter__(self):
+        for i in range(0, len(self.content), STREAM_CHUNK_CHARS):
+            if self.closed:
+                return
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield self._chunk(i)
+
+    def close(self):
+        self.closed = True
+
+
+def response_text(response):
+    """Full text of a completion or a (fully consumed) stream"""
+    if hasattr(response, "choices"):
+        return response.choices[0].message.content
+    return "".join(chunk.choices[0].delta.content or "" for chunk in response if chunk.choices)
+
+
+# ------------------------
+# Backends
+# ------------------------
+class LLMBackend:
+    """
+    Where chat completions come from. complete() takes the keyword
+    arguments of the Groq chat.completions.create call and returns an
+    object with the same shape (or a chunk stream when stream=True).
+    acomplete() is the coroutine version; backends without native async
+    I/O run complete() on a worker thread.
+    """
+
+    name = "base"
+
+    def complete(self, **request):
+        raise NotImplementedError
+
+    async def acomplete(self, **request):
+        return await asyncio.to_thread(self.complete, **request)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class GroqBackend(LLMBackend):
+    """Live Groq API"""
+
+    name = "groq"
+
+    def __init__(self, client=None, async_client=None):
+        # Without an explicit client the shared provider builds one on
+        # the first call, so importing the app makes no Groq setup
+        self._client = client
+        self._async_client = async_client
+
+    @property
+    def client(self):
+        client = self._client or groq_client.get()
+        if client is None:
+            raise RuntimeError("Groq client unavailable")
+        return client
+
+    def complete(self, **request):
+        # Within a deadline (a pipeline stage), the request gives up with it
+        left = time_left()
+        options = {"timeout": max(left, 0.1)} if left is not None else {}
+        return self.client.chat.completions.create(**request, **options)
+
+    def async_client(self):
+        """AsyncGroq from the same provider, created on the first async call"""
+        client = self._async_client or groq_client.get_async()
+        if client is None:
+            raise RuntimeError("Groq client unavailable")
+        return client
+
+    async def acomplete(self, **request):
+        return await self.async_client().chat.completions.create(**request)
+
+
+class FixtureNotFound(LookupError):
+    """Replay found no recorded response for a request"""
+
+
+def fixture_key(request):
+    """
+    Stable hash of everything that determines the answer. Images are
+    reduced to their own hash, and stream is ignored so streamed and
+    plain calls share fixtures.
+    """
+    messages = []
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            content = [
+                {"type": "image_url", "sha256": hashlib.sha256(part["image_url"]["url"].encode()).hexdigest()}
+                if part.get("type") == "image_url" else part
+                for part in content
+            ]
+        messages.append({"role": message.get("role"), "content": content})
+
+    canonical = {
+        "model": request.get("model"),
+        "messages": messages,
+        "temperature": request.get("temperature"),
+        "max_tokens": request.get("max_tokens"),
+        "response_format": request.get("response_format")
+    }
+    key = hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return key, canonical
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Prompt → response fixtures on disk, one JSON file per request.
+
+    replay: answers only from fixtures, raising FixtureNotFound otherwise
+    record: answers from fixtures when present, else calls the inner
+            backend and saves its answer
+    """
+
+    def __init__(self, mode="replay", fixtures_dir=LLM_FIXTURES_DIR, inner=None):
+        self.name = mode
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.inner = inner
+        self.hits = 0
+        self.recorded = 0
+        self.missing = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.fixtures_dir, key[:2], f"{key}.json")
+
+    def complete(self, **request):
+        key, canonical = fixture_key(request)
+        path = self._path(key)
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                fixture = json.load(f)
+            with self._lock:
+                self.hits += 1
+            content = fixture["content"]
+            if request.get("stream"):
+                return ChunkStream(content)
+            return completion(content, fixture.get("total_tokens"))
+
+        if self.mode != "record" or self.inner is None:
+            with self._lock:
+                self.missing += 1
+            raise FixtureNotFound(f"No LLM fixture {key[:12]} for {request.get('model')} - record it with LLM_BACKEND=record")
+
+        response = self.inner.complete(**request)
+        content = response_text(response)
+        usage = getattr(response, "usage", None)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "request": canonical,
+                "content": content,
+                "total_tokens": getattr(usage, "total_tokens", None),
+                "recorded_at": time.time()
+            }, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+        if request.get("stream"):
+            return ChunkStream(content)
+        return completion(content, getattr(usage, "total_tokens", None))
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "fixtures_dir": self.fixtures_dir,
+            "hits": self.hits,
+            "recorded": self.recorded,
+            "missing": self.missing
+        }
+
+
+class FakeAPIError(Exception):
+    """Shaped like the provider's API errors so the scheduler retries it"""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def parse_latency(spec):
+    """'kind:a[:b]' → (kind, a, b) with milliseconds converted to seconds"""
+    parts = spec.split(":")
+    kind = parts[0].strip().lower()
+    values = [float(v) for v in parts[1:]]
+    if kind == "fixed" and len(values) == 1:
+        return kind, values[0] / 1000, 0.0
+    if kind in ("uniform", "normal") and len(values) == 2:
+        return kind, values[0] / 1000, values[1] / 1000
+    if kind == "lognormal" and len(values) == 2:
+        return kind, values[0] / 1000, values[1]
+    raise ValueError(f"Invalid latency spec '{spec}'")
+
+
+def sample_latency(latency, rng=random):
+    """One delay in seconds from a parse_latency() tuple"""
+    kind, a, b = latency
+    if kind == "uniform":
+        delay = rng.uniform(a, b)
+    elif kind == "normal":
+        delay = rng.gauss(a, b)
+    elif kind == "lognormal":
+        delay = a * math.exp(rng.gauss(0, b))
+    else:
+        delay = a
+    return max(delay, 0.0)
+
+
+_QUOTED_GRIEVANCE = re.compile(r'Grievance(?: Text)?:\s*"(.*?)"\s*(?:\n|$)', re.DOTALL)
+_PLAIN_GRIEVANCE = re.compile(r"(?:Original )?Grievance(?: Text)?:\s*\n(.*?)(?:\n\n|$)", re.DOTALL)
+_LOCATION_BLOCK = "Location Details (if provided):"
+_PLACEHOLDER = re.compile(r"^\[.*\]$")
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in. Answers are deterministic functions of the prompt
+    (keyword rules for labels, the citizen's own text for reports);
+    latency and failures follow the configured distributions.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=LLM_FAKE_LATENCY, error_rate=LLM_FAKE_ERROR_RATE,
+                 rate_limit_share=LLM_FAKE_RATE_LIMIT_SHARE, seed=LLM_FAKE_SEED):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self._random = random.Random(int(seed) if seed is not None else None)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _sample(self):
+        with self._lock:
+            self.calls += 1
+            delay = sample_latency(self.latency, self._random)
+            failure = self._random.random() < self.error_rate
+            rate_limited = self._random.random() < self.rate_limit_share
+            if failure:
+                self.errors += 1
+        return delay, failure, rate_limited
+
+    @staticmethod
+    def _error(rate_limited):
+        return FakeAPIError(429, retry_after=1) if rate_limited else FakeAPIError(500)
+
+    @staticmethod
+    def _response(request, content, delay):
+        if request.get("stream"):
+            # The rest of the latency is spread over the chunks
+            chunks = max(1, math.ceil(len(content) / STREAM_CHUNK_CHARS))
+            return ChunkStream(content, chunk_delay=delay * 0.6 / chunks)
+        tokens = (sum(len(str(m.get("content"))) for m in request.get("messages", [])) + len(content)) // 4
+        return completion(content, tokens)
+
+    @staticmethod
+    def _first_token_delay(request, delay):
+        # Streams only wait for the first token up front
+        return delay * 0.4 if request.get("stream") else delay
+
+    def complete(self, **request):
+        delay, failure, rate_limited = self._sample()
+        if failure:
+            time.sleep(delay / 4)
+            raise self._error(rate_limited)
+        content = self.answer(request)
+        wait = self._first_token_delay(request, delay)
+        # Like the live client's per-request timeout
+        left = time_left()
+        if left is not None and wait > left:
+            time.sleep(max(left, 0))
+            raise TimeoutError("Request timed out")
+        time.sleep(wait)
+        return self._response(request, content, delay)
+
+    async def acomplete(self, **request):
+        delay, failure, rate_limited = self._sample()
+        if failure:
+            await asyncio.sleep(delay / 4)
+            raise self._error(rate_limited)
+        content = self.answer(request)
+        await asyncio.sleep(self._first_token_delay(request, delay))
+        return self._response(request, content, delay)
+
+    # ------------------------
+    # Canned answers
+    # ------------------------
+    @staticmethod
+    def _grievance(prompt):
+        match = _QUOTED_GRIEVANCE.search(prompt) or _PLAIN_GRIEVANCE.search(prompt)
+        return (match.group(1) if match else prompt[-300:]).strip()
+
+    @staticmethod
+    def _location_value(prompt, name):
+        # The output template above the location block has the same labels
+        # ("Area: [area]"), so read only the block and skip any placeholder
+        block = prompt.rpartition(_LOCATION_BLOCK)[2].split("Grievance Text:")[0]
+        for match in re.finditer(rf"^{name}:\s*(.+)$", block, re.MULTILINE):
+            value = match.group(1).strip()
+            if value and not _PLACEHOLDER.match(value):
+                return value
+        return "Not specified"
+
+    def answer(self, request):
+        from rule_classifier import classify_department_rules, assign_priority_rules
+
+        messages = request.get("messages", [])
+        content = messages[-1].get("content") if messages else ""
+        if isinstance(content, list):
+            return json.dumps({
+                "description": "Photo submitted with the grievance",
+                "issue": "Issue visible in photo",
+                "matches_grievance": True,
+                "severity": "medium",
+                "text_found": "none",
+                "safety_concern": "no"
+            })
+
+        prompt = content or ""
+        grievance = self._grievance(prompt)
+        department = classify_department_rules(grievance)[0] or "Other"
+        priority = assign_priority_rules(grievance)[0] or "medium"
+
+        if prompt.startswith("Classify the government department"):
+            return department
+        if prompt.startswith("Determine the priority level"):
+            return priority
+        if prompt.startswith("Verify whether a grievance"):
+            resolution = prompt.rsplit("Resolution Provided:", 1)[-1]
+            specific = bool(re.search(r"\d", resolution)) and len(resolution.split()) >= 8
+            return json.dumps({
+                "approved": specific,
+                "reason": "Specific action and details provided" if specific else "Missing dates, actions or location"
+            })
+
+        summary = grievance.split(".")[0][:80] or "Citizen grievance"
+        city = self._location_value(prompt, "City")
+        area = self._location_value(prompt, "Area")
+        pincode = self._location_value(prompt, "Pincode")
+        specific = self._location_value(prompt, "Specific Location")
+
+        if request.get("response_format", {}).get("type") == "json_object":
+            return json.dumps({
+                "issue_summary": summary,
+                "detailed_description": grievance,
+                "location": {"city": city, "area": area, "specific_location": specific, "pincode": pincode},
+                "impact": "Residents of the area",
+                "urgency_indicators": {
+                    "duration": "Not specified",
+                    "safety_risk": "yes" if priority == "high" else "no",
+                    "vulnerable_population": "Not specified",
+                    "confirmed_incidents": "Not specified"
+                },
+                "expected_resolution": "Inspection and repair by the responsible department",
+                "department": department,
+                "priority": priority
+            })
+
+        return f"""Issue Summary:
+{summary}
+
+Detailed Description:
+{grievance}
+
+Location Details:
+City: {city}
+Area: {area}
+Specific Location: {specific}
+Pincode: {pincode}
+
+Impact:
+Residents of the area
+
+Urgency Indicators:
+- Duration of Issue: Not specified
+- Safety Risk: {"yes" if priority == "high" else "no"}
+- Vulnerable Population: Not specified
+- Confirmed Incidents: Not specified
+
+Expected Resolution:
+Inspection and repair by the responsible department"""
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "latency": self.latency_spec,
+            "error_rate": self.error_rate,
+            "calls": self.calls,
+            "errors": self.errors
+        }
+
+
+def create_backend(name=LLM_BACKEND):
+    """Backend selected by LLM_BACKEND"""
+    if name == "fake":
+        print("🧪 LLM backend: fake (offline)")
+        return FakeBackend()
+    if name == "replay":
+        print(f"📼 LLM backend: replay from {LLM_FIXTURES_DIR}")
+        return RecordReplayBackend("replay")
+    if name == "record":
+        print(f"📼 LLM backend: recording to {LLM_FIXTURES_DIR}")
+        return RecordReplayBackend("record", inner=GroqBackend())
+    return GroqBackend()
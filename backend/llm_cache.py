@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# "memory" (default), "sqlite" (memory + on-disk tier) or "off"
+LLM_CACHE = os.getenv("LLM_CACHE", "memory")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+
+
+def make_cache_key(model, system_prompt, prompt, temperature, **params):
+    """
+    Content address for an LLM call. Any extra request parameters that
+    change the output (e.g. json mode) are folded into the key as well.
+    """
+    payload = json.dumps(
+        [model, system_prompt, prompt, temperature, params],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU tier with TTL"""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions
+        }
+
+
+class SQLiteCache:
+    """
+    On-disk tier shared by every worker process on the host. Entries
+    expire after the TTL; when the table grows past max_entries the
+    least recently used rows are deleted.
+    """
+
+    def __init__(self, path=LLM_CACHE_DB, max_entries=LLM_CACHE_DB_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now)
+            )
+            self._writes += 1
+            # Trimming needs a count, so only do it every so often
+            if self._writes % 100 == 0:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "entries": count,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "path": self.path
+        }
+
+
+class LLMCache:
+    """
+    Tiered response cache: memory first, then the optional SQLite tier.
+    Disk hits are promoted into memory.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                print(f"⚠️ Cache read failed ({type(tier).__name__}): {e}")
+                continue
+            if value is not None:
+                for upper in self.tiers[:i]:
+                    upper.set(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            try:
+                tier.set(key, value)
+            except Exception as e:
+                print(f"⚠️ Cache write failed ({type(tier).__name__}): {e}")
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": True,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "ttl": LLM_CACHE_TTL,
+            "tiers": {type(tier).__name__: tier.stats() for tier in self.tiers}
+        }
+
+
+def create_cache(mode=LLM_CACHE):
+    """Builds the cache configured by LLM_CACHE, or None when disabled"""
+    if mode == "off":
+        return None
+    tiers = [MemoryCache()]
+    if mode == "sqlite":
+        try:
+            tiers.append(SQLiteCache())
+        except Exception as e:
+            print(f"⚠️ SQLite LLM cache unavailable, using memory only: {e}")
+    return LLMCache(tiers)
@@ -0,0 +1,464 @@
+import os
+import time
+import random
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from metrics import errors
+
+# Calls in flight against the provider at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Slots batch work may hold, so interactive requests always find one free
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+# Per-model request and token budgets per minute. Unlimited (0) by default;
+# set them to the provider account's limits, e.g. LLM_REQUESTS_PER_MINUTE=30
+# and LLM_TOKENS_PER_MINUTE=6000 on a free Groq tier, to queue calls locally
+# instead of collecting 429s
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Processes sharing the account; each gets an equal share of the limits.
+# gunicorn.conf.py sets this to its worker count
+LLM_WORKER_PROCESSES = max(1, int(os.getenv("LLM_WORKER_PROCESSES", "1")))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# HTTP connection pool shared by all calls
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "30"))
+LLM_HTTP_KEEPALIVE = float(os.getenv("LLM_HTTP_KEEPALIVE", "60"))
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+_LANE_ORDER = {INTERACTIVE: 0, BATCH: 1}
+
+# Completion size assumed when the caller sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+# Rough cost of one downscaled image for the vision model
+IMAGE_TOKENS = 1200
+
+_lane = contextvars.ContextVar("llm_lane", default=INTERACTIVE)
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def llm_lane(lane):
+    """
+    Runs the enclosed LLM calls in a lane. Pipeline stages inherit the
+    lane of the request that started them.
+    """
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+@contextmanager
+def llm_deadline(deadline):
+    """
+    Gives the enclosed LLM calls until `deadline` (a time.monotonic()
+    value). Requests go out with the time left as their client timeout,
+    and a call that can't start in time fails instead of waiting.
+    Pipeline stages run under their stage deadline.
+    """
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds until the current llm_deadline(), or None when there is none"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def create_http_client(max_connections=LLM_MAX_CONCURRENCY):
+    """
+    Keep-alive pool sized to the concurrency cap, so every in-flight call
+    reuses a warm TLS connection instead of opening a new one.
+    """
+    import httpx
+
+    return httpx.Client(
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=max_connections * 2,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE
+        )
+    )
+
+
+def create_async_http_client(max_connections=LLM_MAX_CONCURRENCY):
+    """Same pool limits for the async client used by the ASGI app"""
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=max_connections * 2,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE
+        )
+    )
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Prompt + completion tokens for rate limiting, at ~4 characters per token"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    return chars // 4 + images * IMAGE_TOKENS + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute up to one minute's worth. Reservations may
+    overdraw the bucket; the caller then sleeps until the debt is repaid,
+    so large requests are delayed instead of starved.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Takes amount and returns how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.rate > 0:
+                self._refill(now)
+                self.level -= amount
+                wait = -self.level / self.rate if self.level < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def adjust(self, amount):
+        """Returns (positive) or charges (negative) tokens after the fact"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+    def block(self, seconds):
+        """Nobody gets through for `seconds`, e.g. after a 429"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _PriorityGate:
+    """
+    Concurrency limiter that hands free slots to waiting interactive
+    requests before batch ones, FIFO within a lane. Batch work is also
+    capped below the total so a long import can't fill every slot.
+    """
+
+    def __init__(self, slots, batch_slots):
+        self.slots = slots
+        self.batch_slots = min(batch_slots, slots)
+        self.active = {INTERACTIVE: 0, BATCH: 0}
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _can_run(self, lane):
+        if sum(self.active.values()) >= self.slots:
+            return False
+        return lane != BATCH or self.active[BATCH] < self.batch_slots
+
+    def _head(self):
+        # Earliest waiter (interactive first) that may start right now
+        runnable = [entry for entry in self._waiting if self._can_run(entry[2])]
+        return min(runnable)[1] if runnable else None
+
+    def _leave(self, entry):
+        # Caller holds self._cond
+        if entry in self._waiting:
+            self._waiting.remove(entry)
+        self._cond.notify_all()
+
+    def acquire(self, lane, deadline=None):
+        """
+        Waits for a slot. With a deadline (a time.monotonic() value) the
+        wait gives up with TimeoutError once it passes, without a slot.
+        """
+        entry = (_LANE_ORDER[lane], next(self._seq), lane)
+        with self._cond:
+            self._waiting.append(entry)
+            while self._head() != entry[1]:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self._leave(entry)
+                    raise TimeoutError(f"no free {lane} LLM slot before the deadline")
+                self._cond.wait(timeout)
+            self._waiting.remove(entry)
+            self.active[lane] += 1
+
+    async def acquire_async(self, lane, deadline=None):
+        """
+        Same queue and deadline as acquire(), but waits without holding a
+        thread: the coroutine polls for its turn with a short, growing sleep.
+        """
+        entry = (_LANE_ORDER[lane], next(self._seq), lane)
+        with self._cond:
+            self._waiting.append(entry)
+        delay = 0.002
+        try:
+            while True:
+                with self._cond:
+                    if self._head() == entry[1]:
+                        self._waiting.remove(entry)
+                        self.active[lane] += 1
+                        return
+                if deadline is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        raise TimeoutError(f"no free {lane} LLM slot before the deadline")
+                    delay = min(delay, timeout)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        except BaseException:
+            # Cancelled or timed out while waiting - give up the place in the queue
+            with self._cond:
+                self._leave(entry)
+            raise
+
+    def release(self, lane):
+        with self._cond:
+            self.active[lane] -= 1
+            self._cond.notify_all()
+
+    def waiting(self):
+        with self._cond:
+            counts = {INTERACTIVE: 0, BATCH: 0}
+            for _, _, lane in self._waiting:
+                counts[lane] += 1
+            return counts
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on the provider's error, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+def _is_retryable(error):
+    """Rate limits, provider 5xx, timeouts and dropped connections"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status == 408 or status >= 500
+    name = type(error).__name__
+    return name in ("APIConnectionError", "APITimeoutError", "RateLimitError") or isinstance(error, (TimeoutError, ConnectionError))
+
+
+class LLMScheduler:
+    """
+    Admission control for every provider call: a per-model token bucket
+    for requests and tokens per minute, a concurrency cap with priority
+    lanes, and retries with jittered exponential backoff that honour
+    Retry-After. A 429 blocks the model's bucket for everyone, not just
+    the caller that saw it.
+
+    The buckets live in this process, so the account limits are split
+    evenly between the `processes` sharing them.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, batch_concurrency=LLM_BATCH_MAX_CONCURRENCY,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_attempts=LLM_MAX_ATTEMPTS, processes=LLM_WORKER_PROCESSES):
+        self.processes = processes
+        self.requests_per_minute = requests_per_minute / processes
+        self.tokens_per_minute = tokens_per_minute / processes
+        self.max_attempts = max_attempts
+        self._gate = _PriorityGate(max_concurrency, batch_concurrency)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failed": 0,
+            "throttled_seconds": 0.0
+        }
+
+    def _buckets_for(self, model):
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (TokenBucket(self.requests_per_minute), TokenBucket(self.tokens_per_minute))
+            return self._buckets[model]
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def call(self, fn, model, tokens, lane=None):
+        """
+        Runs fn() under the limits for `model`, with `tokens` the estimated
+        prompt + completion size. Returns fn's result; the last error is
+        raised once attempts run out or for a non-retryable failure.
+        """
+        lane = lane or current_lane()
+        lane = lane if lane in _LANE_ORDER else BATCH
+        requests_bucket, tokens_bucket = self._buckets_for(model)
+
+        for attempt in range(1, self.max_attempts + 1):
+            # Wait for the rate limit before taking a slot, so a throttled
+            # call doesn't keep a slot from work that could run now
+            wait = self._reserve(requests_bucket, tokens_bucket, tokens)
+            self._check_deadline(wait, model, requests_bucket, tokens_bucket, tokens)
+            if wait > 0:
+                time.sleep(wait)
+            self._acquire_slot(lane, requests_bucket, tokens_bucket, tokens)
+            try:
+                self._count("calls")
+                response = fn()
+            except Exception as e:
+                error = e
+            else:
+                self._settle(tokens_bucket, tokens, response)
+                return response
+            finally:
+                self._gate.release(lane)
+
+            delay = self._retry_delay(error, attempt, model, requests_bucket)
+            left = time_left()
+            if left is not None and delay >= left:
+                # The retry couldn't finish before the deadline anyway
+                raise error
+            time.sleep(delay)
+
+    async def acall(self, afn, model, tokens, lane=None):
+        """
+        call() for coroutines: afn() returns an awaitable. Waiting for a
+        slot, the rate limit or a retry doesn't block the event loop.
+        """
+        lane = lane or current_lane()
+        lane = lane if lane in _LANE_ORDER else BATCH
+        requests_bucket, tokens_bucket = self._buckets_for(model)
+
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._reserve(requests_bucket, tokens_bucket, tokens)
+            self._check_deadline(wait, model, requests_bucket, tokens_bucket, tokens)
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._gate.acquire_async(lane, _deadline.get())
+            except (asyncio.CancelledError, TimeoutError):
+                # Never made the call - hand the reservation back
+                requests_bucket.adjust(1)
+                tokens_bucket.adjust(tokens)
+                raise
+            try:
+                self._count("calls")
+                response = await afn()
+            except Exception as e:
+                error = e
+            else:
+                self._settle(tokens_bucket, tokens, response)
+                return response
+            finally:
+                self._gate.release(lane)
+
+            await asyncio.sleep(self._retry_delay(error, attempt, model, requests_bucket))
+
+    def _reserve(self, requests_bucket, tokens_bucket, tokens):
+        wait = max(requests_bucket.reserve(1), tokens_bucket.reserve(tokens))
+        if wait > 0:
+            self._count("throttled_seconds", wait)
+        return wait
+
+    def _acquire_slot(self, lane, requests_bucket, tokens_bucket, tokens):
+        """Takes a gate slot before the deadline, or hands the reservation back and raises TimeoutError"""
+        try:
+            self._gate.acquire(lane, _deadline.get())
+        except TimeoutError:
+            requests_bucket.adjust(1)
+            tokens_bucket.adjust(tokens)
+            raise
+
+    def _check_deadline(self, wait, model, requests_bucket, tokens_bucket, tokens):
+        """Hands the reservation back and raises TimeoutError if the call can't start before the deadline"""
+        left = time_left()
+        if left is None or wait < left:
+            return
+        requests_bucket.adjust(1)
+        tokens_bucket.adjust(tokens)
+        raise TimeoutError(f"{model} call can't start before its deadline ({wait:.1f}s throttled)")
+
+    @staticmethod
+    def _settle(tokens_bucket, tokens, response):
+        # Give back (or charge) the difference between estimate and actual usage
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        if isinstance(used, int):
+            tokens_bucket.adjust(tokens - used)
+
+    def _retry_delay(self, error, attempt, model, requests_bucket):
+        """Seconds to wait before the next attempt; raises error when there is none"""
+        retry_after = _retry_after(error)
+        if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+            self._count("rate_limited")
+            requests_bucket.block(retry_after or LLM_BACKOFF_BASE * 2)
+
+        if attempt == self.max_attempts or not _is_retryable(error):
+            self._count("failed")
+            errors.inc(component="llm", type=type(error).__name__)
+            raise error
+
+        # Full jitter, never earlier than the provider asked for
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+        print(f"🔁 {model} call failed ({error.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+        self._count("retries")
+        return delay
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters["throttled_seconds"] = round(counters["throttled_seconds"], 1)
+        return {
+            **counters,
+            "in_flight": dict(self._gate.active),
+            "waiting": self._gate.waiting(),
+            "max_concurrency": self._gate.slots,
+            "batch_max_concurrency": self._gate.batch_slots,
+            "processes": self.processes,
+            "requests_per_minute": round(self.requests_per_minute, 2),
+            "tokens_per_minute": round(self.tokens_per_minute, 1)
+        }
@@ -0,0 +1,99 @@
+import re
+
+from grievance_id import GRIEVANCE_ID_PATTERN, normalize_grievance_id, is_valid_grievance_id
+
+# Intents recognized before a message is allowed into the AI pipeline
+STATUS_QUERY = "status_query"
+GREETING = "greeting"
+HELP = "help"
+NEW_GRIEVANCE = "new_grievance"
+EMPTY = "empty"
+
+GREETING_WORDS = {
+    "hi", "hii", "hello", "hey", "hlo", "namaste", "namaskar", "namaskaar",
+    "good morning", "good afternoon", "good evening", "thanks", "thank you",
+    "ok", "okay", "नमस्ते", "नमस्कार", "धन्यवाद",
+}
+
+HELP_WORDS = {
+    "help", "menu", "start", "info", "how", "madad", "sahayata", "मदद", "सहायता",
+}
+
+STATUS_WORDS = re.compile(
+    r"\b(status|track|check|update|progress|kya hua|sthiti)\b|स्थिति",
+    re.IGNORECASE
+)
+
+# Short messages that only mention a status keyword, without an ID
+MAX_STATUS_ONLY_WORDS = 4
+
+# Whole-message status commands, still answered during a WhatsApp intake
+STATUS_COMMANDS = {"status", "my status", "track", "sthiti", "स्थिति"}
+
+# ASCII punctuation plus the Devanagari danda (\w would also strip matras)
+_PUNCTUATION = re.compile(r"[!-/:-@\[-`{-~।॥]")
+
+
+def _normalize(text):
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def route_message(body, num_media=0):
+    """
+    Classifies an incoming message with cheap regex / keyword checks.
+
+    Returns (intent, grievance_ids). Only NEW_GRIEVANCE should go through
+    the AI pipeline; a message that contains a grievance ID and little
+    else is treated as a status query.
+    """
+    body = (body or "").strip()
+    if not body and not num_media:
+        return EMPTY, []
+
+    ids = [normalize_grievance_id(match) for match in GRIEVANCE_ID_PATTERN.findall(body)]
+    normalized = _normalize(body)
+    words = normalized.split()
+
+    if ids:
+        remainder = GRIEVANCE_ID_PATTERN.sub(" ", body)
+        remainder_words = _normalize(remainder).split()
+        if len(remainder_words) <= MAX_STATUS_ONLY_WORDS or STATUS_WORDS.search(remainder):
+            return STATUS_QUERY, ids
+
+    if num_media:
+        return NEW_GRIEVANCE, []
+
+    if normalized in GREETING_WORDS:
+        return GREETING, []
+    if normalized in HELP_WORDS or body == "?":
+        return HELP, []
+    if len(words) <= MAX_STATUS_ONLY_WORDS and STATUS_WORDS.search(body):
+        return STATUS_QUERY, []
+
+    return NEW_GRIEVANCE, []
+
+
+def is_command(body):
+    """The whole message is a help or status keyword"""
+    body = (body or "").strip()
+    normalized = _normalize(body)
+    return body == "?" or normalized in HELP_WORDS or normalized in STATUS_COMMANDS
+
+
+def format_status_reply(grievance_id, grievance, job=None):
+    """WhatsApp text for a status query, from the stored grievance or its job"""
+    if not is_valid_grievance_id(grievance_id):
+        return f"❓ *{grievance_id}* isn't a valid Grievance ID - a character looks mistyped. Please check it and try again."
+
+    if grievance:
+        return f"""📋 *Grievance Status*
+
+🆔 *ID:* {grievance_id}
+📌 *Status:* {grievance['status']}
+🏢 *Department:* {grievance.get('department') or 'Pending'}
+⚠️ *Priority:* {grievance.get('priority') or 'Pending'}"""
+
+    if job and job["status"] in ("queued", "running"):
+        return f"⏳ Grievance *{grievance_id}* is still being processed. Please check again in a minute."
+
+    return f"❓ No grievance found with ID *{grievance_id}*. Please check the ID and try again."
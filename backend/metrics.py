@@ -0,0 +1,226 @@
+import time
+import bisect
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers rule-only answers (ms) up to slow vision calls and retries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Fixed buckets per label set. An observation is one bisect and three
+    additions under a lock; cumulative counts are only built on scrape.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the enclosed block, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback returning {label values tuple: value}"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def render(self):
+        try:
+            values = sorted(self.collect().items()) if self.collect else []
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} unavailable: {e}")
+            values = []
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Re-registering (e.g. on module reload) keeps the existing series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames=(), collect=None):
+        gauge = self._register(Gauge(name, help_text, labelnames))
+        gauge.collect = collect
+        return gauge
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram, **labels):
+    """Decorator form of histogram.time(), for functions and coroutines"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+# ------------------------
+# Metrics
+# ------------------------
+registry = MetricsRegistry()
+
+# stage: structure, classify, priority, fused, vision, image_download,
+# twilio_send, and pipeline for the whole AI stage graph
+stage_seconds = registry.histogram(
+    "nyaya_stage_duration_seconds", "Duration of one processing stage", ("stage",)
+)
+stage_outcomes = registry.counter(
+    "nyaya_pipeline_stage_outcomes_total", "Pipeline stages by outcome (ok, error, timeout)", ("stage", "outcome")
+)
+request_seconds = registry.histogram(
+    "nyaya_http_request_duration_seconds", "HTTP request duration until the response is returned",
+    ("endpoint", "method", "status")
+)
+job_seconds = registry.histogram(
+    "nyaya_job_duration_seconds", "Background job run time", ("kind", "outcome")
+)
+llm_call_seconds = registry.histogram(
+    "nyaya_llm_call_duration_seconds", "Provider call duration including queueing and retries", ("model",)
+)
+fallbacks = registry.counter(
+    "nyaya_fallbacks_total", "Answers produced by a fallback instead of the model", ("kind",)
+)
+cache_requests = registry.counter(
+    "nyaya_cache_requests_total", "Cache lookups by result (hit, miss)", ("cache", "result")
+)
+errors = registry.counter(
+    "nyaya_errors_total", "Errors by component and exception type", ("component", "type")
+)
+
+
+def render_metrics():
+    return registry.render()
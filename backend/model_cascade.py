@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+
+# Cheapest first; an answer escalates to the next tier when it fails
+# validation or looks unreliable
+MODEL_TIERS = [
+    model.strip()
+    for model in os.getenv("MODEL_TIERS", "llama-3.1-8b-instant,llama-3.3-70b-versatile").split(",")
+    if model.strip()
+]
+
+
+class ModelCascade:
+    """
+    Runs a task on each model tier in turn until one gives a valid,
+    confident answer. Keeps per-task, per-tier latency and acceptance
+    counts so the tiers can be tuned for cost against accuracy.
+    """
+
+    def __init__(self, tiers=None):
+        self.tiers = list(tiers or MODEL_TIERS)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, task, model, seconds, outcome):
+        with self._lock:
+            entry = self._stats.setdefault(task, {"calls": 0, "escalations": 0, "exhausted": 0, "tiers": {}})
+            tier = entry["tiers"].setdefault(model, {"calls": 0, "accepted": 0, "low_confidence": 0,
+                                                     "invalid": 0, "errors": 0, "seconds": 0.0})
+            tier["calls"] += 1
+            tier[outcome] += 1
+            tier["seconds"] += seconds
+
+    def _count(self, task, name):
+        with self._lock:
+            entry = self._stats.setdefault(task, {"calls": 0, "escalations": 0, "exhausted": 0, "tiers": {}})
+            entry[name] += 1
+
+    def run(self, task, generate, validate):
+        """
+        generate(model) returns the raw model output; validate(raw) returns
+        (value, confident) with value None when the output is unusable.
+
+        Returns the first confident value, else the last usable one from a
+        higher tier, else None. Raises only if every tier raised.
+        """
+        self._count(task, "calls")
+        fallback = None
+        error = None
+
+        for index, model in enumerate(self.tiers):
+            started = time.perf_counter()
+            raised = False
+            try:
+                value, confident = validate(generate(model))
+            except Exception as e:
+                error, raised = e, True
+                value, confident = None, False
+            if self._judge(task, index, model, started, value, confident, raised):
+                return value
+            if value is not None:
+                fallback = value
+
+        return self._exhausted(task, fallback, error)
+
+    async def arun(self, task, agenerate, validate):
+        """run() with agenerate(model) returning an awaitable"""
+        self._count(task, "calls")
+        fallback = None
+        error = None
+
+        for index, model in enumerate(self.tiers):
+            started = time.perf_counter()
+            raised = False
+            try:
+                value, confident = validate(await agenerate(model))
+            except Exception as e:
+                error, raised = e, True
+                value, confident = None, False
+            if self._judge(task, index, model, started, value, confident, raised):
+                return value
+            if value is not None:
+                fallback = value
+
+        return self._exhausted(task, fallback, error)
+
+    def _judge(self, task, index, model, started, value, confident, raised):
+        """Records one tier's answer; True when it is accepted"""
+        if raised:
+            outcome = "errors"
+        else:
+            outcome = "accepted" if value is not None and confident else \
+                "low_confidence" if value is not None else "invalid"
+        self._record(task, model, time.perf_counter() - started, outcome)
+        if outcome == "accepted":
+            return True
+        if index + 1 < len(self.tiers):
+            self._count(task, "escalations")
+            print(f"⬆️ {task}: {outcome.replace('_', ' ')} from {model}, escalating to {self.tiers[index + 1]}")
+        return False
+
+    def _exhausted(self, task, fallback, error):
+        self._count(task, "exhausted")
+        if fallback is None and error is not None:
+            raise error
+        return fallback
+
+    def stats(self):
+        with self._lock:
+            report = {"tiers": self.tiers, "tasks": {}}
+            for task, entry in self._stats.items():
+                report["tasks"][task] = {
+                    "calls": entry["calls"],
+                    "escalation_rate": round(entry["escalations"] / entry["calls"], 3) if entry["calls"] else 0.0,
+                    "exhausted": entry["exhausted"],
+                    "tiers": {
+                        model: {
+                            "calls": tier["calls"],
+                            "accepted": tier["accepted"],
+                            "low_confidence": tier["low_confidence"],
+                            "invalid": tier["invalid"],
+                            "errors": tier["errors"],
+                            "avg_ms": round(tier["seconds"] * 1000 / tier["calls"], 1) if tier["calls"] else 0.0
+                        }
+                        for model, tier in entry["tiers"].items()
+                    }
+                }
+            return report
@@ -0,0 +1,118 @@
+import json
+
+from grievance_store import normalize_phone
+from notification_outbox import notification, WHATSAPP_MAX_CHARS
+
+SUMMARY_CHARS = 400
+IMAGE_SUMMARY_CHARS = 200
+
+TRACKING_FOOTER = "\n\n---\n💬 *Track your grievance:*\nSend your Grievance ID anytime to check status.\n\nThank you for using Nyaya! 🙏"
+
+
+def whatsapp_address(phone_number):
+    """Twilio WhatsApp address for a phone number, or "" if it is empty"""
+    phone_number = normalize_phone(phone_number)
+    return f"whatsapp:{phone_number}" if phone_number else ""
+
+
+def excerpt(text, limit):
+    """text cut to limit characters on a word boundary, with an ellipsis"""
+    text = (text or "").strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    if " " in cut:
+        cut = cut.rsplit(None, 1)[0]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def location_summary(location_data):
+    parts = [location_data.get(key) for key in ("area", "place", "city", "state")]
+    return ", ".join(part for part in parts if part) or "Not specified"
+
+
+def image_summary(image_analysis, limit=IMAGE_SUMMARY_CHARS):
+    """The model's description of the photo, else its raw analysis"""
+    analysis = (image_analysis or {}).get("analysis") or {}
+    if isinstance(analysis, dict) and analysis.get("description"):
+        text = analysis["description"]
+        if analysis.get("issue"):
+            text += f" ({analysis['issue']})"
+        return excerpt(text, limit)
+    return excerpt(json.dumps(analysis, ensure_ascii=False), limit)
+
+
+def fit(message):
+    """Keeps a message within the WhatsApp limit"""
+    return excerpt(message, WHATSAPP_MAX_CHARS) if len(message) > WHATSAPP_MAX_CHARS else message
+
+
+# ------------------------
+# Messages
+# ------------------------
+def grievance_registered_message(grievance_id, structured, department, priority, location_data, image_analysis=None):
+    """Confirmation for a grievance submitted through the web form"""
+    message = f"""✅ *Grievance Registered Successfully*
+
+🆔 *Grievance ID:* {grievance_id}
+
+📝 *Summary:*
+{excerpt(structured, SUMMARY_CHARS)}
+
+🏢 *Department:* {department}
+⚠️ *Priority:* {priority}
+
+📍 *Location:*
+{location_summary(location_data or {})}"""
+
+    if image_analysis:
+        message += f"\n\n📷 *Image Analysis:*\n{image_summary(image_analysis)}"
+
+    return fit(message + TRACKING_FOOTER)
+
+
+def whatsapp_registered_message(grievance_id, structured, department, priority, image_analysis=None, cluster_id=None):
+    """Reply to a grievance sent over WhatsApp"""
+    message = f"""✅ *Grievance Registered!*
+
+🆔 *ID:* {grievance_id}
+
+📝 *Summary:*
+{excerpt(structured, 300)}
+
+🏢 *Department:* {department}
+⚠️ *Priority:* {priority}"""
+
+    if image_analysis:
+        message += f"\n\n📷 *Image:* {image_summary(image_analysis, 100)}"
+
+    if cluster_id:
+        message += f"\n\n🔗 Linked to an existing report of the same issue ({cluster_id})."
+
+    message += f"\n\n💬 Send *{grievance_id}* to check status."
+    return fit(message)
+
+
+def processing_failed_message():
+    return "❌ Sorry, error processing your grievance. Please try again."
+
+
+# ------------------------
+# Outbox entries
+# ------------------------
+def grievance_registered(phone_number, grievance_id, structured, department, priority, location_data,
+                         image_analysis=None):
+    """
+    Outbox entry confirming a web submission.
+    Returns (entry, None) or (None, reason it can't be sent).
+    """
+    recipient = whatsapp_address(phone_number)
+    if not recipient:
+        return None, "Phone number missing"
+    body = grievance_registered_message(grievance_id, structured, department, priority, location_data, image_analysis)
+    return notification(recipient, body, "grievance_registered", ref=grievance_id), None
+
+
+def whatsapp_registered(sender, grievance_id, structured, department, priority, image_analysis=None, cluster_id=None):
+    body = whatsapp_registered_message(grievance_id, structured, department, priority, image_analysis, cluster_id)
+    return notification(sender, body, "whatsapp_registered", ref=grievance_id)
@@ -0,0 +1,408 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+import traceback
+
+from llm_scheduler import TokenBucket
+from metrics import stage_outcomes, errors
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+# Twilio queues anything above the sender's throughput (80 msg/s for a
+# WhatsApp Business sender, far less on the sandbox); staying below it
+# keeps a retry storm from filling that queue
+OUTBOX_MESSAGES_PER_SECOND = float(os.getenv("OUTBOX_MESSAGES_PER_SECOND", "10"))
+# Minimum gap between two messages to the same recipient; anything queued
+# for them meanwhile goes out merged into one message
+OUTBOX_RECIPIENT_INTERVAL = float(os.getenv("OUTBOX_RECIPIENT_INTERVAL", "2"))
+OUTBOX_COLLAPSE_MAX = int(os.getenv("OUTBOX_COLLAPSE_MAX", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "5"))
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv("OUTBOX_MAX_RETRY_DELAY", "600"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+# Finished messages (sent, failed or superseded) are deleted this long after
+# their last update; 0 keeps them forever. Delivery callbacks arrive within
+# minutes, so the default only has to cover support lookups
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+OUTBOX_PRUNE_INTERVAL = float(os.getenv("OUTBOX_PRUNE_INTERVAL", "3600"))
+
+# WhatsApp rejects bodies longer than this
+WHATSAPP_MAX_CHARS = 1600
+
+MERGE_SEPARATOR = "\n\n━━━━━━━━━━\n\n"
+
+# Twilio delivery statuses after which no further callback changes the outcome
+FINAL_DELIVERY_STATUSES = ("delivered", "read", "undelivered", "failed")
+
+
+def create_outbox_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            body TEXT NOT NULL,
+            kind TEXT,
+            ref TEXT,
+            collapse_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after REAL NOT NULL,
+            lease_until REAL,
+            sid TEXT,
+            delivery_status TEXT,
+            error TEXT,
+            error_code TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            sent_at REAL,
+            delivered_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_runnable ON notifications(status, run_after)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_recipient ON notifications(recipient, status, sent_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_sid ON notifications(sid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_ref ON notifications(ref)")
+
+
+def notification(recipient, body, kind, ref=None, collapse_key=None):
+    """
+    One outbox entry. recipient is a Twilio address ("whatsapp:+91...").
+    A newer entry with the same collapse_key replaces an unsent older one.
+    """
+    return {"recipient": recipient, "body": body, "kind": kind, "ref": ref, "collapse_key": collapse_key}
+
+
+def insert_notifications(conn, notifications):
+    """
+    Adds entries on an open connection, so they commit in the caller's
+    transaction (e.g. together with the grievance they announce).
+    Returns the new ids.
+    """
+    now = time.time()
+    ids = []
+    for entry in notifications:
+        if entry.get("collapse_key"):
+            conn.execute(
+                "UPDATE notifications SET status = 'superseded', updated_at = ? "
+                "WHERE collapse_key = ? AND status = 'queued'",
+                (now, entry["collapse_key"])
+            )
+        cur = conn.execute(
+            "INSERT INTO notifications (recipient, body, kind, ref, collapse_key, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry["recipient"], entry["body"][:WHATSAPP_MAX_CHARS], entry.get("kind"), entry.get("ref"),
+             entry.get("collapse_key"), now, now, now)
+        )
+        ids.append(cur.lastrowid)
+    return ids
+
+
+class SenderNotConfigured(RuntimeError):
+    """Raised by send() when there is no provider to deliver through; never retried"""
+
+
+def is_retryable(error):
+    """
+    Throttling, server errors and network failures are retried; other
+    4xx answers and a missing provider configuration are final
+    """
+    if isinstance(error, SenderNotConfigured):
+        return False
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    return True
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at OUTBOX_MAX_RETRY_DELAY"""
+    delay = min(OUTBOX_RETRY_DELAY * (2 ** (attempts - 1)), OUTBOX_MAX_RETRY_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class NotificationOutbox:
+    """
+    Transactional outbox for WhatsApp messages on SQLite.
+
+    Producers only insert rows (in the same transaction as the data the
+    message is about); sender threads deliver them. A claim takes every
+    due message for one recipient and sends them as one, paced per
+    recipient and across the sender number. Failures are retried with
+    backoff, and Twilio status callbacks record the delivery outcome.
+    """
+
+    def __init__(self, path, workers=OUTBOX_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.send = None
+        self.sender_bucket = TokenBucket(OUTBOX_MESSAGES_PER_SECOND * 60)
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            create_outbox_table(conn)
+        finally:
+            conn.close()
+
+    # ------------------------
+    # Producer side
+    # ------------------------
+    def enqueue(self, recipient, body, kind, ref=None, collapse_key=None):
+        """Adds a message that isn't tied to another write. Returns its id."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            notification_id, = insert_notifications(conn, [notification(recipient, body, kind, ref, collapse_key)])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._wakeup.set()
+        return notification_id
+
+    def wake(self):
+        """Called after another store committed outbox rows"""
+        self._wakeup.set()
+
+    def get(self, notification_id):
+        return self._fetch_one("SELECT * FROM notifications WHERE id = ?", (notification_id,))
+
+    def get_by_ref(self, ref):
+        """Latest message about a reference such as a grievance ID"""
+        return self._fetch_one("SELECT * FROM notifications WHERE ref = ? ORDER BY id DESC LIMIT 1", (ref,))
+
+    def _fetch_one(self, query, params):
+        conn = self._connect()
+        try:
+            row = conn.execute(query, params).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def counts(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
+
+    def prune(self, older_than):
+        """Deletes sent, failed and superseded messages last updated more than older_than seconds ago"""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "DELETE FROM notifications WHERE status IN ('sent', 'failed', 'superseded') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+        finally:
+            conn.close()
+        if cur.rowcount:
+            print(f"🧹 Pruned {cur.rowcount} finished notifications")
+        return cur.rowcount
+
+    def _maybe_prune(self):
+        # One sender per interval runs the retention sweep
+        if OUTBOX_RETENTION_DAYS <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + OUTBOX_PRUNE_INTERVAL
+        self.prune(OUTBOX_RETENTION_DAYS * 86400)
+
+    def record_status(self, sid, delivery_status, error_code=None):
+        """
+        Stores a Twilio status callback. Callbacks can arrive out of order,
+        so a final status is never replaced by an earlier one.
+        Returns the number of messages updated.
+        """
+        now = time.time()
+        final = delivery_status in FINAL_DELIVERY_STATUSES
+        placeholders = ", ".join("?" for _ in FINAL_DELIVERY_STATUSES)
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE notifications SET delivery_status = ?, error_code = COALESCE(?, error_code), "
+                "delivered_at = CASE WHEN ? IN ('delivered', 'read') THEN COALESCE(delivered_at, ?) "
+                "ELSE delivered_at END, updated_at = ? "
+                f"WHERE sid = ? AND (? OR delivery_status IS NULL OR delivery_status NOT IN ({placeholders}))",
+                (delivery_status, error_code, delivery_status, now, now, sid, final, *FINAL_DELIVERY_STATUSES)
+            )
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    # ------------------------
+    # Sender side
+    # ------------------------
+    def claim(self):
+        """
+        Atomically takes the oldest due message whose recipient may be
+        messaged now, plus whatever else is due for that recipient (up to
+        OUTBOX_COLLAPSE_MAX and the WhatsApp length limit). Returns
+        {"ids", "recipient", "body", "attempts"} or None.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            first = conn.execute(
+                "SELECT * FROM notifications n WHERE "
+                "((status = 'queued' AND run_after <= ?) OR (status = 'sending' AND lease_until < ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM notifications s WHERE s.recipient = n.recipient "
+                "AND s.status = 'sending' AND s.lease_until >= ?) "
+                "AND NOT EXISTS (SELECT 1 FROM notifications s WHERE s.recipient = n.recipient "
+                "AND s.status = 'sent' AND s.sent_at > ?) "
+                "ORDER BY id LIMIT 1",
+                (now, now, now, now - OUTBOX_RECIPIENT_INTERVAL)
+            ).fetchone()
+            if first is None:
+                conn.execute("COMMIT")
+                return None
+
+            rows = [first]
+            length = len(first["body"])
+            for row in conn.execute(
+                "SELECT * FROM notifications WHERE recipient = ? AND id != ? AND "
+                "((status = 'queued' AND run_after <= ?) OR (status = 'sending' AND lease_until < ?)) "
+                "ORDER BY id LIMIT ?",
+                (first["recipient"], first["id"], now, now, OUTBOX_COLLAPSE_MAX - 1)
+            ):
+                length += len(MERGE_SEPARATOR) + len(row["body"])
+                if length > WHATSAPP_MAX_CHARS:
+                    break
+                rows.append(row)
+
+            ids = [row["id"] for row in rows]
+            conn.execute(
+                f"UPDATE notifications SET status = 'sending', attempts = attempts + 1, lease_until = ?, "
+                f"updated_at = ? WHERE id IN ({', '.join('?' for _ in ids)})",
+                (now + OUTBOX_LEASE_SECONDS, now, *ids)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return {
+            "ids": ids,
+            "recipient": first["recipient"],
+            "body": MERGE_SEPARATOR.join(row["body"] for row in rows),
+            "attempts": {row["id"]: row["attempts"] + 1 for row in rows}
+        }
+
+    def complete(self, batch, sid):
+        now = time.time()
+        ids = batch["ids"]
+        self._execute(
+            f"UPDATE notifications SET status = 'sent', sid = ?, error = NULL, lease_until = NULL, "
+            f"sent_at = ?, updated_at = ? WHERE id IN ({', '.join('?' for _ in ids)})",
+            (sid, now, now, *ids)
+        )
+
+    def fail(self, batch, error):
+        now = time.time()
+        retryable = is_retryable(error)
+        error_code = getattr(error, "code", None)
+        for notification_id, attempts in batch["attempts"].items():
+            if retryable and attempts < OUTBOX_MAX_ATTEMPTS:
+                self._execute(
+                    "UPDATE notifications SET status = 'queued', error = ?, error_code = ?, run_after = ?, "
+                    "lease_until = NULL, updated_at = ? WHERE id = ?",
+                    (str(error), error_code, now + retry_delay(attempts), now, notification_id)
+                )
+            else:
+                self._execute(
+                    "UPDATE notifications SET status = 'failed', error = ?, error_code = ?, lease_until = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (str(error), error_code, now, notification_id)
+                )
+
+    def _execute(self, query, params):
+        conn = self._connect()
+        try:
+            conn.execute(query, params)
+        finally:
+            conn.close()
+
+    def deliver(self, batch):
+        wait = self.sender_bucket.reserve(1)
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            sid = self.send(batch["recipient"], batch["body"])
+        except Exception as e:
+            errors.inc(component="outbox", type=type(e).__name__)
+            stage_outcomes.inc(stage="notification", outcome="error")
+            retry = "will retry" if is_retryable(e) else "not retryable"
+            print(f"❌ Notification {batch['ids']} to {batch['recipient']} failed ({retry}): {e}")
+            if getattr(e, "status", None) == 429:
+                self.sender_bucket.block(OUTBOX_RETRY_DELAY)
+            self.fail(batch, e)
+            return
+        stage_outcomes.inc(stage="notification", outcome="ok")
+        if len(batch["ids"]) > 1:
+            print(f"📦 Sent {len(batch['ids'])} notifications to {batch['recipient']} as one message")
+        self.complete(batch, sid)
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                batch = self.claim()
+                if batch is None:
+                    self._maybe_prune()
+            except Exception as e:
+                print(f"❌ Outbox error: {e}")
+                batch = None
+            if batch is None:
+                self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            try:
+                self.deliver(batch)
+            except Exception:
+                # The lease expires and another worker retries the batch
+                traceback.print_exc()
+
+    def start(self, send):
+        """
+        Starts the sender threads (idempotent). send(recipient, body)
+        delivers one message and returns its provider SID.
+        """
+        self.send = send
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"outbox-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"✅ Notification outbox started with {self.workers} senders ({self.path})")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
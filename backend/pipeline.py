@@ -0,0 +1,352 @@
+import os
+import time
+import asyncio
+import inspect
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ai_service import (
+    PIPELINE_MODE,
+    structure_grievance,
+    classify_department,
+    department_from_rules,
+    assign_priority,
+    fallback_priority,
+    process_grievance_fused,
+    analyze_image,
+    analyze_image_basic,
+    astructure_grievance,
+    aclassify_department,
+    aassign_priority,
+    aprocess_grievance_fused,
+    aanalyze_image
+)
+from rule_classifier import classify_department_rules
+from metrics import stage_seconds, stage_outcomes, errors
+from llm_scheduler import llm_deadline
+
+# Shared pool for AI stages. Stages never submit work to the pool
+# themselves, so a fixed size can't deadlock.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+
+# Per-stage timeouts in seconds, e.g. STAGE_TIMEOUT_VISION=20
+STAGE_TIMEOUTS = {
+    "structure": float(os.getenv("STAGE_TIMEOUT_STRUCTURE", "20")),
+    "department": float(os.getenv("STAGE_TIMEOUT_DEPARTMENT", "10")),
+    "priority": float(os.getenv("STAGE_TIMEOUT_PRIORITY", "10")),
+    "fused": float(os.getenv("STAGE_TIMEOUT_FUSED", "25")),
+    "image": float(os.getenv("STAGE_TIMEOUT_IMAGE", "30")),
+}
+
+executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="ai-stage")
+
+
+class Stage:
+    """
+    One node of the stage graph.
+
+    fn receives the results of its dependencies as keyword arguments.
+    fallback receives the same arguments and is used when the stage
+    raises or runs past its timeout.
+    """
+
+    def __init__(self, name, fn, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout if timeout is not None else STAGE_TIMEOUTS.get(name, 30)
+        self.fallback = fallback
+
+
+def run_stages(stages):
+    """
+    Runs a stage graph on the shared pool. A stage is submitted as soon
+    as all of its dependencies have a result, so independent stages run
+    concurrently and total latency follows the critical path.
+
+    Returns (results, report) where report holds per-stage timings and
+    the outcome ("ok", "error" or "timeout").
+    """
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    results = {}
+    report = {}
+
+    def finish(stage, outcome, value, started):
+        _finish(results, report, stage, outcome, value, started)
+
+    def resolve_fallback(stage, kwargs):
+        if stage.fallback is None:
+            return None
+        try:
+            return stage.fallback(**kwargs)
+        except Exception as e:
+            print(f"❌ Fallback for stage '{stage.name}' failed: {e}")
+            return None
+
+    while pending or running:
+        # Submit every stage whose dependencies are satisfied
+        for stage, kwargs in _ready(pending, results):
+            started = time.monotonic()
+            # Stages inherit the caller's context (e.g. its LLM lane)
+            context = contextvars.copy_context()
+            deadline = started + stage.timeout
+            future = executor.submit(context.run, _run_until, deadline, stage.fn, kwargs)
+            running[future] = (stage, kwargs, started, deadline)
+
+        if not running:
+            # Unsatisfiable dependency - nothing left that can run
+            for stage in pending.values():
+                finish(stage, "error", None, time.monotonic())
+            break
+
+        next_deadline = min(deadline for _, _, _, deadline in running.values())
+        done, _ = wait(
+            list(running),
+            timeout=max(0, next_deadline - time.monotonic()),
+            return_when=FIRST_COMPLETED
+        )
+
+        for future in done:
+            stage, kwargs, started, _ = running.pop(future)
+            try:
+                finish(stage, "ok", future.result(), started)
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed: {e}")
+                errors.inc(component="pipeline", type=type(e).__name__)
+                finish(stage, "error", resolve_fallback(stage, kwargs), started)
+
+        now = time.monotonic()
+        for future in [f for f, entry in running.items() if entry[3] <= now]:
+            stage, kwargs, started, _ = running.pop(future)
+            # Not-yet-started work is dropped; a running call gives up at
+            # the same deadline (its client timeout) and is ignored.
+            future.cancel()
+            print(f"⏱️ Stage '{stage.name}' timed out after {stage.timeout}s")
+            errors.inc(component="pipeline", type="StageTimeout")
+            finish(stage, "timeout", resolve_fallback(stage, kwargs), started)
+
+    return results, report
+
+
+async def arun_stages(stages):
+    """
+    run_stages() on the event loop. Stage functions may return
+    awaitables; a stage that times out is cancelled rather than
+    abandoned, since nothing is left holding a thread.
+    """
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    results = {}
+    report = {}
+
+    async def resolve_fallback(stage, kwargs):
+        if stage.fallback is None:
+            return None
+        try:
+            return await _resolve(stage.fallback(**kwargs))
+        except Exception as e:
+            print(f"❌ Fallback for stage '{stage.name}' failed: {e}")
+            return None
+
+    while pending or running:
+        for stage, kwargs in _ready(pending, results):
+            started = time.monotonic()
+            # Tasks copy the caller's context (e.g. its LLM lane)
+            task = asyncio.ensure_future(_resolve(stage.fn(**kwargs)))
+            running[task] = (stage, kwargs, started, started + stage.timeout)
+
+        if not running:
+            for stage in pending.values():
+                _finish(results, report, stage, "error", None, time.monotonic())
+            break
+
+        next_deadline = min(deadline for _, _, _, deadline in running.values())
+        done, _ = await asyncio.wait(
+            list(running),
+            timeout=max(0, next_deadline - time.monotonic()),
+            return_when=asyncio.FIRST_COMPLETED
+        )
+
+        for task in done:
+            stage, kwargs, started, _ = running.pop(task)
+            try:
+                _finish(results, report, stage, "ok", task.result(), started)
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed: {e}")
+                errors.inc(component="pipeline", type=type(e).__name__)
+                _finish(results, report, stage, "error", await resolve_fallback(stage, kwargs), started)
+
+        now = time.monotonic()
+        for task in [t for t, entry in running.items() if entry[3] <= now]:
+            stage, kwargs, started, _ = running.pop(task)
+            task.cancel()
+            print(f"⏱️ Stage '{stage.name}' timed out after {stage.timeout}s")
+            errors.inc(component="pipeline", type="StageTimeout")
+            _finish(results, report, stage, "timeout", await resolve_fallback(stage, kwargs), started)
+
+    return results, report
+
+
+def _run_until(deadline, fn, kwargs):
+    """Runs a sync stage with its LLM calls bounded by the stage deadline"""
+    with llm_deadline(deadline):
+        return fn(**kwargs)
+
+
+def _ready(pending, results):
+    """Removes and yields (stage, kwargs) for every stage whose dependencies are satisfied"""
+    for name in list(pending):
+        stage = pending[name]
+        if all(dep in results for dep in stage.deps):
+            del pending[name]
+            yield stage, {dep: results[dep] for dep in stage.deps}
+
+
+def _finish(results, report, stage, outcome, value, started):
+    results[stage.name] = value
+    stage_outcomes.inc(stage=stage.name, outcome=outcome)
+    report[stage.name] = {
+        "outcome": outcome,
+        "seconds": round(time.monotonic() - started, 3)
+    }
+
+
+async def _resolve(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def build_stages(informal_text, location_data=None, image_path=None, fetch_image=None, mode=None, on_delta=None,
+                 use_async=False):
+    """
+    Builds the stage graph for one grievance.
+
+    sequential: structure → department, with priority and image in parallel
+    fused:      fused, with image in parallel
+
+    fetch_image is an optional callable returning a local image path; it
+    runs inside the image stage so downloads overlap with the text stages.
+    on_delta streams the structured report as it is generated (sequential
+    mode only). use_async builds coroutine stages for arun_stages().
+    """
+    mode = mode or PIPELINE_MODE
+    if use_async:
+        fused, structure, classify, priority = (aprocess_grievance_fused, astructure_grievance,
+                                                aclassify_department, aassign_priority)
+    else:
+        fused, structure, classify, priority = (process_grievance_fused, structure_grievance,
+                                                classify_department, assign_priority)
+
+    if mode == "fused":
+        stages = [
+            Stage(
+                "fused",
+                lambda: fused(informal_text, location_data),
+                fallback=lambda: {
+                    "structured": informal_text,
+                    "department": "Other",
+                    "priority": fallback_priority(informal_text),
+                    "mode": "fused"
+                }
+            )
+        ]
+    else:
+        # A confident keyword match doesn't need to wait for structuring;
+        # otherwise the model's answer is checked against the same match
+        rule_match = classify_department_rules(informal_text)
+        rule_department = department_from_rules(informal_text, rule_match)
+        if rule_department:
+            department_stage = Stage("department", lambda: rule_department, fallback=lambda: "Other")
+        else:
+            department_stage = Stage(
+                "department",
+                lambda structure: classify(informal_text, structure, use_rules=False, rule_match=rule_match),
+                deps=("structure",),
+                fallback=lambda structure: "Other"
+            )
+
+        stages = [
+            Stage(
+                "structure",
+                lambda: structure(informal_text, location_data, on_delta=on_delta),
+                fallback=lambda: informal_text
+            ),
+            department_stage,
+            Stage(
+                "priority",
+                lambda: priority(informal_text, location_data),
+                fallback=lambda: fallback_priority(informal_text)
+            ),
+        ]
+
+    if (image_path or fetch_image) and use_async:
+        state = {"path": image_path}
+
+        # Downloads and the PIL fallback block, so they run in threads
+        async def aimage_stage():
+            if not state["path"]:
+                state["path"] = await asyncio.to_thread(fetch_image)
+            return await aanalyze_image(state["path"], informal_text)
+
+        async def aimage_fallback():
+            return await asyncio.to_thread(analyze_image_basic, state["path"]) if state["path"] else None
+
+        stages.append(Stage("image", aimage_stage, fallback=aimage_fallback))
+
+    elif image_path or fetch_image:
+        state = {"path": image_path}
+
+        def image_stage():
+            if not state["path"]:
+                state["path"] = fetch_image()
+            return analyze_image(state["path"], informal_text)
+
+        def image_fallback():
+            return analyze_image_basic(state["path"]) if state["path"] else None
+
+        stages.append(Stage("image", image_stage, fallback=image_fallback))
+
+    return stages
+
+
+def run_grievance_stages(informal_text, location_data=None, image_path=None, fetch_image=None, mode=None,
+                         on_delta=None):
+    """
+    Runs all AI stages for one grievance concurrently.
+
+    Returns a dict with structured, department, priority, image_analysis,
+    mode and a per-stage timing report.
+    """
+    mode = mode or PIPELINE_MODE
+    stages = build_stages(informal_text, location_data, image_path, fetch_image, mode, on_delta)
+    with stage_seconds.time(stage="pipeline"):
+        results, report = run_stages(stages)
+    return _stage_output(results, report, mode)
+
+
+async def arun_grievance_stages(informal_text, location_data=None, image_path=None, fetch_image=None, mode=None,
+                                on_delta=None):
+    """run_grievance_stages() for the async serving path"""
+    mode = mode or PIPELINE_MODE
+    stages = build_stages(informal_text, location_data, image_path, fetch_image, mode, on_delta, use_async=True)
+    with stage_seconds.time(stage="pipeline"):
+        results, report = await arun_stages(stages)
+    return _stage_output(results, report, mode)
+
+
+def _stage_output(results, report, mode):
+    if mode == "fused":
+        output = dict(results["fused"])
+    else:
+        output = {
+            "structured": results["structure"],
+            "department": results["department"],
+            "priority": results["priority"],
+            "mode": "sequential"
+        }
+
+    output["image_analysis"] = results.get("image")
+    output["stages"] = report
+    return output
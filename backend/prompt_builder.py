@@ -0,0 +1,135 @@
+import os
+import re
+from string import Formatter
+
+try:
+    import tiktoken
+    # Closest public encoding to the Llama 3 tokenizer
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Token budgets for text we don't control
+CITIZEN_TEXT_TOKENS = int(os.getenv("PROMPT_CITIZEN_TEXT_TOKENS", "600"))
+RESOLUTION_TEXT_TOKENS = int(os.getenv("PROMPT_RESOLUTION_TEXT_TOKENS", "400"))
+REPORT_DIGEST_TOKENS = int(os.getenv("PROMPT_REPORT_DIGEST_TOKENS", "250"))
+
+# Completion caps per task; labels only need a few tokens
+TASK_MAX_TOKENS = {
+    "structure": int(os.getenv("MAX_TOKENS_STRUCTURE", "600")),
+    "department": int(os.getenv("MAX_TOKENS_DEPARTMENT", "10")),
+    "priority": int(os.getenv("MAX_TOKENS_PRIORITY", "5")),
+    "verify_closure": int(os.getenv("MAX_TOKENS_VERIFY_CLOSURE", "150")),
+    "fused": int(os.getenv("MAX_TOKENS_FUSED", "900")),
+    "vision": int(os.getenv("MAX_TOKENS_VISION", "500")),
+}
+
+TRUNCATION_MARKER = " [...] "
+
+# Report sections kept in a digest, in order
+DIGEST_SECTIONS = ("Issue Summary", "Detailed Description", "Location Details", "Expected Resolution")
+
+_SECTION = re.compile(r"^([A-Z][A-Za-z ]+):\s*$", re.MULTILINE)
+
+
+def count_tokens(text):
+    """
+    Token count with tiktoken when installed, otherwise an estimate:
+    ~4 characters per token for Latin script, ~2 for Devanagari and other
+    scripts, which tokenizers split much more finely.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def truncate_to_budget(text, max_tokens):
+    """
+    Shortens text to about max_tokens, keeping the opening (where citizens
+    state the problem) and the end (where they add locations / dates).
+    """
+    text = (text or "").strip()
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        head = max_tokens * 3 // 4
+        tail = max_tokens - head
+        return _encoding.decode(tokens[:head]) + TRUNCATION_MARKER + _encoding.decode(tokens[-tail:] if tail else [])
+
+    # Scale by the observed characters-per-token of this text
+    chars = int(len(text) * max_tokens / count_tokens(text))
+    head = chars * 3 // 4
+    tail = chars - head
+    # Cut on whitespace so no word is split
+    start = text[:head].rsplit(None, 1)[0] if " " in text[:head] else text[:head]
+    end = text[-tail:].split(None, 1)[-1] if tail and " " in text[-tail:] else text[-tail:] if tail else ""
+    return start.rstrip() + TRUNCATION_MARKER + end.lstrip()
+
+
+def report_digest(report, max_tokens=REPORT_DIGEST_TOKENS):
+    """
+    The parts of a structured report a reviewer needs (what, where, what
+    should be done), within max_tokens. Text that isn't a structured
+    report is just truncated.
+    """
+    report = (report or "").strip()
+    headers = list(_SECTION.finditer(report))
+    if not headers:
+        return truncate_to_budget(report, max_tokens)
+
+    sections = {}
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(report)
+        sections[header.group(1).strip()] = report[header.end():end].strip()
+
+    def build(description_budget=None):
+        lines = []
+        for name in DIGEST_SECTIONS:
+            body = sections.get(name)
+            if not body:
+                continue
+            if name == "Detailed Description" and description_budget is not None:
+                body = truncate_to_budget(body, description_budget)
+            lines.append(f"{name}: {body}")
+        return "\n".join(lines)
+
+    digest = build()
+    if not digest:
+        return truncate_to_budget(report, max_tokens)
+
+    # Over budget: the description is the longest and least essential part
+    if count_tokens(digest) > max_tokens and sections.get("Detailed Description"):
+        rest = count_tokens(digest) - count_tokens(sections["Detailed Description"])
+        digest = build(max(max_tokens - rest, 20))
+    return truncate_to_budget(digest, max_tokens)
+
+
+class PromptTemplate:
+    """
+    A prompt parsed once at import into literal and field pieces, so a
+    render is a single join. Fields use str.format syntax ({name}, with
+    literal braces doubled). Static instructions should come first and
+    the per-grievance fields last, which keeps the shared prefix stable.
+    """
+
+    def __init__(self, task, text):
+        self.task = task
+        self.max_tokens = TASK_MAX_TOKENS.get(task)
+        self._pieces = []
+        literal_text = []
+        for literal, field, _, _ in Formatter().parse(text.strip()):
+            if literal:
+                self._pieces.append((True, literal))
+                literal_text.append(literal)
+            if field is not None:
+                self._pieces.append((False, field))
+        self.fields = tuple(value for is_literal, value in self._pieces if not is_literal)
+        self.static_tokens = count_tokens("".join(literal_text))
+
+    def render(self, **values):
+        return "".join(value if is_literal else str(values.get(value, "")) for is_literal, value in self._pieces)
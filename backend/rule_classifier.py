@@ -0,0 +1,204 @@
+import os
+import unicodedata
+from collections import deque, defaultdict
+
+# Rule answers at or above this confidence skip the LLM call
+RULE_CONFIDENCE_THRESHOLD = float(os.getenv("RULE_CONFIDENCE_THRESHOLD", "0.75"))
+
+# term: weight. Terms are matched case-insensitively on word boundaries
+# and may be English, Hinglish, Hindi or Marathi.
+DEPARTMENT_LEXICON = {
+    "Health": {
+        "hospital": 3, "ventilator": 4, "ventilators": 4, "doctor": 3, "doctors": 3,
+        "nurse": 2, "medicine": 3, "medicines": 3, "ambulance": 4, "patient": 3,
+        "patients": 3, "clinic": 3, "dispensary": 3, "oxygen": 3, "vaccine": 3,
+        "phc": 3, "icu": 4, "dengue": 3, "malaria": 3, "covid": 3,
+        "aspatal": 3, "dawai": 3, "davai": 3,
+        "अस्पताल": 3, "डॉक्टर": 3, "दवाई": 3, "दवा": 3, "रुग्णालय": 3, "दवाखाना": 3,
+    },
+    "Infrastructure": {
+        "pothole": 4, "potholes": 4, "road": 2, "roads": 2, "bridge": 3, "flyover": 3,
+        "footpath": 3, "pavement": 3, "divider": 2, "construction": 2, "crack": 2,
+        "cracks": 2, "collapsed": 2, "building": 1, "wall": 1, "speed breaker": 3,
+        "gaddha": 4, "gadda": 4, "sadak": 2,
+        "गड्ढा": 4, "सड़क": 2, "पुल": 3, "खड्डा": 4, "रस्ता": 2,
+    },
+    "Electricity": {
+        "electricity": 4, "power cut": 4, "power outage": 4, "no power": 4,
+        "transformer": 4, "electric": 3, "current": 2, "voltage": 4, "meter": 2,
+        "live wire": 4, "wire": 2, "wires": 2, "electrocution": 4, "light bill": 3,
+        "bijli": 4, "light nahi": 4, "streetlight": 3, "street light": 3,
+        "light not working": 3, "taar": 3,
+        "बिजली": 4, "लाइट": 2, "वीज": 4, "ट्रांसफार्मर": 4,
+    },
+    "Water Supply": {
+        "no water": 4, "water supply": 4, "water": 2, "tanker": 3, "pipeline": 3,
+        "tap": 2, "taps": 2, "drinking water": 4, "water pressure": 4,
+        "contaminated water": 4, "dirty water": 3, "leakage": 2, "borewell": 3,
+        "pani": 3, "paani": 3, "nal": 2,
+        "पानी": 3, "नल": 2, "पाणी": 3, "टैंकर": 3,
+    },
+    "Sanitation": {
+        "garbage": 4, "waste": 3, "trash": 3, "dustbin": 3, "sewage": 4, "sewer": 4,
+        "drain": 3, "drainage": 3, "gutter": 3, "toilet": 3, "toilets": 3,
+        "mosquito": 2, "stink": 2, "smell": 2, "dump": 2, "litter": 3,
+        "kachra": 4, "kachra gadi": 4, "nali": 3,
+        "कचरा": 4, "नाली": 3, "गटर": 3, "शौचालय": 3, "सफाई": 3,
+    },
+    "Transport": {
+        "bus": 3, "buses": 3, "bus stop": 3, "train": 3, "metro": 3, "station": 1,
+        "traffic": 3, "signal": 2, "auto": 2, "rickshaw": 2, "parking": 2,
+        "conductor": 3, "timetable": 2, "route": 2,
+        "बस": 3, "ट्रेन": 3, "ट्रैफिक": 3,
+    },
+    "Police": {
+        "police": 4, "theft": 4, "stolen": 4, "robbery": 4, "crime": 4, "harassment": 4,
+        "assault": 4, "fight": 2, "drunk": 2, "chain snatching": 4, "eve teasing": 4,
+        "fir": 4, "murder": 4, "threat": 3, "gambling": 3, "illegal": 2,
+        "chori": 4, "पुलिस": 4, "चोरी": 4, "छेड़छाड़": 4, "पोलीस": 4,
+    },
+    "Municipal Services": {
+        "encroachment": 4, "stray dogs": 4, "stray dog": 4, "stray cattle": 4,
+        "park": 1, "garden": 2, "tree": 2, "trees": 2, "property tax": 4,
+        "birth certificate": 4, "death certificate": 4, "hawkers": 3, "noise": 2,
+        "municipal": 2, "corporation": 2, "ward office": 3,
+        "आवारा कुत्ते": 4, "अतिक्रमण": 4,
+    },
+    "Education": {
+        "school": 3, "schools": 3, "teacher": 4, "teachers": 4, "student": 3,
+        "students": 3, "classroom": 3, "college": 3, "mid day meal": 4,
+        "mid-day meal": 4, "scholarship": 4, "textbook": 3, "textbooks": 3,
+        "exam": 2, "principal": 3, "anganwadi": 3,
+        "स्कूल": 3, "शिक्षक": 4, "शाळा": 3, "विद्यार्थी": 3,
+    },
+}
+
+PRIORITY_LEXICON = {
+    "high": {
+        "urgent": 3, "emergency": 4, "danger": 3, "dangerous": 3, "critical": 4,
+        "accident": 4, "accidents": 4, "injured": 4, "injury": 4, "death": 4,
+        "died": 4, "dead": 4, "fire": 4, "electrocution": 4, "live wire": 4,
+        "collapsed": 4, "collapse": 4, "ventilator": 4, "ventilators": 4,
+        "icu": 4, "bleeding": 4, "unsafe": 2, "flood": 3, "flooding": 3,
+        "gas leak": 4, "suffering": 2, "life threatening": 4, "children at risk": 3,
+        "turned away": 3, "no medicines": 2, "not responding": 2, "families affected": 4,
+        "people affected": 3, "trapped": 4, "stranded": 3, "overflowing": 2,
+        "khatra": 3, "khatarnak": 3, "turant": 3,
+        "खतरा": 3, "खतरनाक": 3, "तुरंत": 3, "आपातकाल": 4, "धोका": 3,
+    },
+    "medium": {
+        "delay": 2, "delayed": 2, "not working": 2, "irregular": 2, "pending": 2,
+        "weeks": 1, "days": 1, "broken": 1, "shortage": 2, "not collected": 2,
+        "week": 1, "month": 1, "months": 1, "many days": 2, "leaking": 2, "badly": 1,
+        "no response": 2, "complained": 1, "not repaired": 2, "not cleaned": 2,
+        "band hai": 2, "kharab": 2, "खराब": 2, "बंद": 1, "हफ्ते": 1, "सुनवाई नहीं": 2,
+    },
+    "low": {
+        "minor": 3, "cosmetic": 3, "paint": 2, "painting": 2, "suggestion": 3,
+        "request": 1, "beautification": 3, "small": 1, "faded": 2,
+    },
+}
+
+# Total weight of the winning label at which evidence counts as conclusive
+EVIDENCE_SATURATION = 4.0
+
+
+
+def _is_word_char(char):
+    # Devanagari vowel signs are combining marks, not alphanumerics
+    return char.isalnum() or char == "_" or unicodedata.category(char).startswith("M")
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a fixed lexicon: finds every term in one
+    pass over the text, however many terms there are.
+    """
+
+    def __init__(self, lexicon):
+        # lexicon: {label: {term: weight}}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for label, terms in lexicon.items():
+            for term, weight in terms.items():
+                self._add(term.lower(), (label, term, weight))
+        self._build()
+
+    def _add(self, term, payload):
+        state = 0
+        for char in term:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(payload)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def find(self, text):
+        """Yields (label, term, weight) for each whole-word occurrence"""
+        text = text.lower()
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for label, term, weight in self._output[state]:
+                start = i - len(term) + 1
+                before = text[start - 1] if start > 0 else " "
+                after = text[i + 1] if i + 1 < len(text) else " "
+                if not _is_word_char(before) and not _is_word_char(after):
+                    yield label, term, weight
+
+
+def _score(automaton, text):
+    """
+    Returns (label, confidence, matched_terms). Confidence combines how
+    dominant the winning label is with how much evidence there is, so a
+    single weak keyword never clears the threshold on its own.
+    """
+    totals = defaultdict(float)
+    matched = defaultdict(list)
+    for label, term, weight in automaton.find(text or ""):
+        if term in matched[label]:
+            continue
+        totals[label] += weight
+        matched[label].append(term)
+
+    if not totals:
+        return None, 0.0, []
+
+    label = max(totals, key=totals.get)
+    top = totals[label]
+    dominance = top / sum(totals.values())
+    evidence = min(1.0, top / EVIDENCE_SATURATION)
+    return label, round(dominance * evidence, 3), matched[label]
+
+
+_department_automaton = KeywordAutomaton(DEPARTMENT_LEXICON)
+_priority_automaton = KeywordAutomaton(PRIORITY_LEXICON)
+
+
+def classify_department_rules(text):
+    """(department, confidence, matched_terms) from the keyword lexicon"""
+    return _score(_department_automaton, text)
+
+
+def assign_priority_rules(text):
+    """(priority, confidence, matched_terms) from the keyword lexicon"""
+    return _score(_priority_automaton, text)
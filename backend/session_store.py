@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# "memory" (default) or "sqlite" (shared by every worker process on the host)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+# Idle seconds before a conversation is forgotten
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+
+
+class MemorySessions:
+    """In-process tier: LRU-bounded, entries expire after the TTL"""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < now:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return value
+
+    def _store(self, key, value, now):
+        if value is None:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (value, now + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value, time.time())
+
+    def update(self, key, fn):
+        with self._lock:
+            now = time.time()
+            value = fn(self._live(key, now))
+            self._store(key, value, now)
+            return value
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._data)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class SQLiteSessions:
+    """
+    On-disk tier shared by every worker process, so a conversation
+    continues whichever worker Twilio's next webhook lands on. Updates
+    run in an IMMEDIATE transaction, which serializes them across
+    processes.
+    """
+
+    def __init__(self, path=SESSION_DB, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._writes = 0
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    @staticmethod
+    def _read(conn, key, now):
+        row = conn.execute("SELECT value, expires_at FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        return json.loads(row[0])
+
+    def _write(self, conn, key, value, now):
+        if value is None:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+        )
+        self._writes += 1
+        # Trimming needs a count, so only do it every so often
+        if self._writes % 100 == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        count = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM sessions WHERE key IN (SELECT key FROM sessions ORDER BY updated_at LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            return self._read(conn, key, time.time())
+        finally:
+            conn.close()
+
+    def set(self, key, value):
+        conn = self._connect()
+        try:
+            self._write(conn, key, value, time.time())
+        finally:
+            conn.close()
+
+    def update(self, key, fn):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            value = fn(self._read(conn, key, now))
+            self._write(conn, key, value, now)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "entries": count,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "path": self.path
+        }
+
+
+class SessionStore:
+    """
+    Conversation state keyed by sender. Values are JSON-serializable
+    dicts; writing None deletes.
+
+    With a shared tier, it is authoritative and the memory tier is a
+    write-through copy that answers only while the shared tier fails.
+    Without one, the memory tier is the store.
+    """
+
+    def __init__(self, memory, shared=None):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key):
+        if self.shared:
+            try:
+                return self.shared.get(key)
+            except Exception as e:
+                print(f"⚠️ Session read failed, using memory tier: {e}")
+        return self.memory.get(key)
+
+    def set(self, key, value):
+        self.update(key, lambda current: value)
+
+    def delete(self, key):
+        self.set(key, None)
+
+    def update(self, key, fn):
+        """
+        Atomically replaces the session with fn(current session or None)
+        and returns the new value. fn may run again on the fallback tier,
+        so it must not have side effects beyond its result.
+        """
+        if self.shared:
+            try:
+                value = self.shared.update(key, fn)
+                self.memory.set(key, value)
+                return value
+            except Exception as e:
+                print(f"⚠️ Session write failed, using memory tier: {e}")
+        return self.memory.update(key, fn)
+
+    def stats(self):
+        stats = {"ttl": SESSION_TTL, "tiers": {type(self.memory).__name__: self.memory.stats()}}
+        if self.shared:
+            try:
+                stats["tiers"][type(self.shared).__name__] = self.shared.stats()
+            except Exception as e:
+                stats["tiers"][type(self.shared).__name__] = {"error": str(e)}
+        return stats
+
+
+def create_session_store(mode=SESSION_STORE):
+    """Builds the store configured by SESSION_STORE"""
+    shared = None
+    if mode == "sqlite":
+        try:
+            shared = SQLiteSessions()
+        except Exception as e:
+            print(f"⚠️ SQLite session store unavailable, using memory only: {e}")
+    return SessionStore(MemorySessions(), shared)
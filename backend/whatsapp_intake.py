@@ -0,0 +1,284 @@
+"""
+Multi-turn WhatsApp intake: collects the description, location and an
+optional photo over several messages, then asks for confirmation before
+anything reaches the AI pipeline. Every step is a regex / keyword check;
+the draft lives in a SessionStore keyed by sender.
+"""
+import os
+import copy
+import time
+
+from message_router import NEW_GRIEVANCE, GREETING
+from geo_index import PINCODE_PATTERN
+from notification_messages import excerpt
+
+# "guided" collects the grievance over several messages,
+# "direct" submits every message as a grievance on its own
+WHATSAPP_INTAKE = os.getenv("WHATSAPP_INTAKE", "guided")
+INTAKE_ASK_PHOTO = os.getenv("INTAKE_ASK_PHOTO", "true").lower() == "true"
+INTAKE_CONFIRM = os.getenv("INTAKE_CONFIRM", "true").lower() == "true"
+
+# The pipeline analyzes a single image per grievance
+MAX_PHOTOS = 1
+# MessageSids remembered per draft, so Twilio retries aren't applied twice
+SEEN_SIDS = 20
+
+DESCRIPTION = "description"
+LOCATION = "location"
+PHOTO = "photo"
+CONFIRM = "confirm"
+
+CONFIRM_WORDS = {"yes", "y", "confirm", "submit", "send", "ok", "okay", "haan", "han", "ha", "हाँ", "हां"}
+EDIT_WORDS = {"edit", "no", "n", "change", "nahi", "nahin", "नहीं"}
+SKIP_WORDS = {"skip", "no", "n", "none", "no photo", "nahi", "nahin", "नहीं"}
+# STOP is left out: Twilio handles it as an opt-out before the webhook
+CANCEL_WORDS = {"cancel", "discard", "reset", "restart", "रद्द"}
+
+DESCRIPTION_PROMPT = "📝 Please describe the problem: what is wrong, and since when?"
+LOCATION_PROMPT = """📍 *Where is this?*
+Send the area or landmark with its 6-digit pincode, or share a location pin (📎 → Location).
+Reply *SKIP* if your message already says where."""
+PHOTO_PROMPT = "📷 Send one photo of the problem if you can, or reply *SKIP*."
+EDIT_PROMPT = "✏️ OK, please send the corrected description."
+SUBMITTED_MESSAGE = "⏳ Thanks! Registering your grievance - you'll receive its ID shortly."
+CANCELLED_MESSAGE = "🗑️ Draft discarded. Describe a new issue anytime."
+NOTHING_TO_CANCEL = "ℹ️ There is no grievance in progress. Describe your issue to start one."
+EXPIRED_MESSAGE = "⌛ There is no grievance waiting for confirmation - it may have expired. Please describe your issue again."
+
+
+def _command(body):
+    return " ".join((body or "").lower().strip(" .!").split())
+
+
+def inbound_message(form):
+    """The parts of a Twilio webhook form the intake uses"""
+    num_media = int(form.get("NumMedia", 0) or 0)
+    return {
+        "sid": form.get("MessageSid", ""),
+        "body": form.get("Body", "").strip(),
+        "media_urls": [form.get(f"MediaUrl{i}") for i in range(num_media) if form.get(f"MediaUrl{i}")],
+        # Set when the sender shares a location pin
+        "latitude": form.get("Latitude"),
+        "longitude": form.get("Longitude"),
+        "address": form.get("Address") or form.get("Label") or ""
+    }
+
+
+def has_location_pin(message):
+    return bool(message.get("latitude") and message.get("longitude"))
+
+
+def new_session(now):
+    return {
+        "started_at": now,
+        "awaiting": None,
+        "description": "",
+        "location": {},
+        "media_urls": [],
+        "photo_skipped": False,
+        "seen": []
+    }
+
+
+# ------------------------
+# Steps
+# ------------------------
+def extract_pincode(text):
+    """(pincode or "", text with the pincode removed)"""
+    match = PINCODE_PATTERN.search(text or "")
+    if not match:
+        return "", text
+    rest = (text[:match.start()] + text[match.end():]).strip(" ,.-")
+    return match.group(1) + match.group(2), " ".join(rest.split())
+
+
+def absorb(session, message, intent):
+    """Merges one inbound message into the draft"""
+    step = session["awaiting"]
+    location = session["location"]
+
+    for url in message["media_urls"]:
+        if len(session["media_urls"]) < MAX_PHOTOS:
+            session["media_urls"].append(url)
+        else:
+            session["photos_dropped"] = True
+
+    if has_location_pin(message):
+        location["latitude"] = message["latitude"]
+        location["longitude"] = message["longitude"]
+        if message["address"]:
+            location["address"] = message["address"]
+
+    text = message["body"]
+    command = _command(text)
+    if not text or (intent == GREETING and session["description"]):
+        return
+
+    if step == LOCATION:
+        if command == "skip":
+            location["from_description"] = True
+            return
+        pincode, rest = extract_pincode(text)
+        if pincode:
+            location["pincode"] = pincode
+        if rest:
+            location["specificLocation"] = rest[:200]
+        return
+
+    if step == PHOTO and command in SKIP_WORDS:
+        session["photo_skipped"] = True
+        return
+
+    session["description"] = f"{session['description']}\n{text}".strip()
+    if not location.get("pincode"):
+        pincode, _ = extract_pincode(text)
+        if pincode:
+            location["pincode"] = pincode
+
+
+def has_location(session):
+    location = session["location"]
+    return any(location.get(key) for key in ("pincode", "specificLocation", "latitude", "from_description"))
+
+
+def next_step(session):
+    """The next thing to ask for, or None when the draft is ready to submit"""
+    if not session["description"]:
+        return DESCRIPTION
+    if not has_location(session):
+        return LOCATION
+    if INTAKE_ASK_PHOTO and not session["media_urls"] and not session["photo_skipped"]:
+        return PHOTO
+    if INTAKE_CONFIRM:
+        return CONFIRM
+    return None
+
+
+def location_data(session):
+    """location_data for the pipeline, in the web form's shape"""
+    location = session["location"]
+    data = {
+        "city": "",
+        "state": "",
+        "area": "",
+        "place": "",
+        "pincode": location.get("pincode", ""),
+        "specificLocation": (
+            location.get("specificLocation") or location.get("address") or session["description"][:100]
+        )
+    }
+    if location.get("latitude"):
+        data["latitude"] = location["latitude"]
+        data["longitude"] = location["longitude"]
+    return data
+
+
+def location_line(session):
+    location = session["location"]
+    parts = [location.get("specificLocation") or location.get("address")]
+    if location.get("pincode"):
+        parts.append(location["pincode"])
+    if location.get("latitude") and not location.get("address"):
+        parts.append(f"{location['latitude']}, {location['longitude']}")
+    return ", ".join(part for part in parts if part) or "As described"
+
+
+def photo_line(session):
+    if not session["media_urls"]:
+        return "No photo"
+    if session.get("photos_dropped"):
+        return "1 photo (only the first photo you sent is attached)"
+    return "1 photo"
+
+
+def confirm_prompt(session):
+    return f"""📋 *Please confirm your grievance*
+
+📝 {excerpt(session['description'], 300)}
+
+📍 {location_line(session)}
+📷 {photo_line(session)}
+
+Reply *YES* to submit, *EDIT* to rewrite the description or *CANCEL* to discard."""
+
+
+def prompt(step, session):
+    if step == DESCRIPTION:
+        return DESCRIPTION_PROMPT
+    if step == LOCATION:
+        return LOCATION_PROMPT
+    if step == PHOTO:
+        return PHOTO_PROMPT
+    return confirm_prompt(session)
+
+
+def submission(session, message):
+    """Payload of the "whatsapp" job for a completed draft"""
+    return {
+        "body": session["description"],
+        "media_url": session["media_urls"][0] if session["media_urls"] else None,
+        "message_sid": message["sid"],
+        "location_data": location_data(session)
+    }
+
+
+def advance(session, message, intent, now=None):
+    """
+    Applies one inbound message to a sender's draft.
+
+    Returns (session, reply, submission): session is the new draft (None
+    deletes it), reply is the TwiML text ("" for none, None when the
+    message isn't part of an intake and deserves the welcome) and
+    submission is the job payload once the grievance is confirmed.
+    """
+    now = now or time.time()
+    # The memory tier hands out its stored dict; leave it untouched until the update commits
+    session = copy.deepcopy(session)
+    sid = message["sid"]
+    if session and sid and sid in session["seen"]:
+        # A Twilio retry of a message that was already applied
+        return session, "", None
+
+    command = _command(message["body"])
+    if command in CANCEL_WORDS:
+        return None, CANCELLED_MESSAGE if session else NOTHING_TO_CANCEL, None
+
+    if session is None:
+        if command in CONFIRM_WORDS - {"ok", "okay"}:
+            return None, EXPIRED_MESSAGE, None
+        if intent != NEW_GRIEVANCE and not has_location_pin(message):
+            return None, None, None
+        session = new_session(now)
+
+    if sid:
+        session["seen"] = (session["seen"] + [sid])[-SEEN_SIDS:]
+
+    if session["awaiting"] == CONFIRM and not message["media_urls"] and not has_location_pin(message):
+        if command in CONFIRM_WORDS:
+            return None, SUBMITTED_MESSAGE, submission(session, message)
+        if command in EDIT_WORDS:
+            session["description"] = ""
+            session["awaiting"] = DESCRIPTION
+            return session, EDIT_PROMPT, None
+
+    absorb(session, message, intent)
+    step = next_step(session)
+    if step is None:
+        return None, SUBMITTED_MESSAGE, submission(session, message)
+    session["awaiting"] = step
+    return session, prompt(step, session), None
+
+
+def receive(store, sender, message, intent):
+    """
+    Runs advance() atomically against the sender's stored draft.
+    Returns (reply, submission).
+    """
+    outcome = {}
+
+    def apply(session):
+        session, outcome["reply"], outcome["submission"] = advance(session, message, intent)
+        return session
+
+    store.update(sender, apply)
+    return outcome["reply"], outcome["submission"]
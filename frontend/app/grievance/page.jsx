@@ -89,19 +89,19 @@ export default function GrievancePage() {
           department: result.department,
           priority: result.priority,
           image_analysis: result.image_analysis,
-          whatsapp_sent: result.whatsapp_sent,
+          whatsapp_status: result.whatsapp_status,
         };
 
         sessionStorage.setItem("grievanceData", JSON.stringify(formWithAddress));
 
         // Show success alert
-        if (result.whatsapp_sent) {
+        if (result.whatsapp_status === "queued") {
           alert(
             `✅ Grievance Submitted Successfully!\n\n` +
             `🆔 Grievance ID: ${result.grievance_id}\n` +
             `🏢 Department: ${result.department}\n` +
             `⚠️ Priority: ${result.priority}\n\n` +
-            `📱 WhatsApp confirmation sent to ${result.phone_number}`
+            `📱 WhatsApp confirmation on its way to ${result.phone_number}`
           );
         } else {
           alert(
@@ -109,7 +109,7 @@ export default function GrievancePage() {
             `🆔 Grievance ID: ${result.grievance_id}\n` +
             `🏢 Department: ${result.department}\n` +
             `⚠️ Priority: ${result.priority}\n\n` +
-            `⚠️ WhatsApp notification failed: ${result.whatsapp_error || "Unknown error"}`
+            `⚠️ WhatsApp notification not sent: ${result.whatsapp_error || "Unknown error"}`
           );
         }
 
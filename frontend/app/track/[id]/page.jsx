@@ -9,24 +9,56 @@ export default function GrievanceDetailsPage() {
   const { id } = useParams();
   const [grievance, setGrievance] = useState(null);
 
-  /* ---------- DUMMY DATA FOR UI ---------- */
+  const [error, setError] = useState("");
+
   useEffect(() => {
-    const dummy = {
-      id: id,
-      category: "Water & Sanitation",
-      address: "SV Road, Andheri West, Mumbai, Maharashtra",
-      date: "23 Jan 2026",
-      status: "In Progress",
-      urgency: "High",
-      description:
-        "There is continuous water leakage from the main pipeline causing road damage and hygiene issues.",
-      officerNote:
-        "Team has inspected the site. Repair work scheduled within 2 days.",
+    const loadGrievance = async () => {
+      try {
+        const response = await fetch(`http://localhost:5000/grievance/${id}`);
+        const result = await response.json();
+
+        if (!response.ok || result.status !== "success") {
+          setError(result.message || "Grievance not found");
+          return;
+        }
+
+        const g = result.grievance;
+        const priority = g.priority || "medium";
+
+        setGrievance({
+          id: g.grievance_id,
+          category: g.department,
+          address: [g.area, g.city, g.state].filter(Boolean).join(", ") || "Not specified",
+          date: new Date(g.created_at).toLocaleDateString("en-IN", {
+            day: "numeric",
+            month: "short",
+            year: "numeric",
+          }),
+          status: g.status,
+          urgency: priority.charAt(0).toUpperCase() + priority.slice(1),
+          description: g.grievance_text,
+        });
+      } catch (err) {
+        console.error("❌ Failed to load grievance:", err);
+        setError("Unable to reach the server. Please try again later.");
+      }
     };
 
-    setGrievance(dummy);
+    loadGrievance();
   }, [id]);
 
+  if (error) {
+    return (
+      <div className="min-h-screen bg-gray-100 flex flex-col">
+        <Navbar />
+        <div className="max-w-4xl mx-auto px-6 py-10 flex-1">
+          <p className="text-red-600">{error}</p>
+        </div>
+        <Footer />
+      </div>
+    );
+  }
+
   if (!grievance) return null;
 
   return (